@@ -13,14 +13,20 @@ try:
     from modules.sulfur import sulfur_ui, sulfur_server
     from modules.micronutrients import micronutrients_ui, micronutrients_server
     from modules.lime import lime_ui, lime_server
+    from modules.history import history_ui, history_server
+    from modules.batch import batch_ui, batch_server
 
 except ImportError as e:
     print(f"Import error: {e}")
     raise
 
+from engine import profiling
+from modules import resume
+
 app_ui = ui.page_fluid(
     ui.tags.head(
         ui.include_css("www/styles.css"),
+        resume.TOKEN_SCRIPT,
         ui.tags.style("""
             .btn {
                 background-color: #000000 !important;
@@ -33,6 +39,7 @@ app_ui = ui.page_fluid(
         """)
     ),
     ui.h1("Kansas Fertilizer Recommendation Tool"),
+    ui.input_text("field_id", "Field ID (optional, saved with each recommendation):", value=""),
     ui.navset_tab(
         ui.nav_panel("Home", home_ui("home")),
         ui.nav_panel("General Guide", general_guide_ui("general")),
@@ -43,6 +50,8 @@ app_ui = ui.page_fluid(
         ui.nav_panel("Sulfur", sulfur_ui("s")),
         ui.nav_panel("Micronutrients", micronutrients_ui("micro")),
         ui.nav_panel("Lime", lime_ui("lime")),
+        ui.nav_panel("Batch", batch_ui("batch")),
+        ui.nav_panel("History", history_ui("history")),
     ),
     ui.div(
         {
@@ -64,15 +73,20 @@ app_ui = ui.page_fluid(
 )
 
 def server(input, output, session):
+    profiling.start(session)
     home_server("home")
     general_guide_server("general", input, output, session)
-    nitrogen_server("nitro")
-    phosphorus_server("p")
-    potassium_server("k")
-    crop_removal_server("removal")
-    sulfur_server("s")
-    micronutrients_server("micro")
-    lime_server("lime")
+    token = input[resume.TOKEN_INPUT]
+    resume.track("app", input, {"field_id": "text"}, token)
+    nitrogen_server("nitro", field_id=input.field_id, resume_token=token)
+    phosphorus_server("p", field_id=input.field_id, resume_token=token)
+    potassium_server("k", field_id=input.field_id, resume_token=token)
+    crop_removal_server("removal", field_id=input.field_id, resume_token=token)
+    sulfur_server("s", field_id=input.field_id, resume_token=token)
+    micronutrients_server("micro", field_id=input.field_id, resume_token=token)
+    lime_server("lime", field_id=input.field_id, resume_token=token)
+    batch_server("batch", resume_token=token)
+    history_server("history")
 
 from pathlib import Path
 
@@ -0,0 +1,158 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from engine.batch import CALCULATORS
+from engine.blend import RATE_COLUMNS
+from engine.soil_tests import normalize_soil_tests
+from engine.validation import _text_array
+
+# Quantile sketch: log-spaced buckets with 1% relative accuracy from 0.1 to ~7e7 lb/a,
+# plus a bucket for zero (a mergeable fixed-size histogram, like DDSketch)
+ACCURACY = 0.01
+_GAMMA = (1 + ACCURACY) / (1 - ACCURACY)
+_SMALLEST = 0.1
+_BUCKETS = 1024
+
+
+def _buckets(values):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        index = np.ceil(np.log(values / _SMALLEST) / np.log(_GAMMA))
+    return np.where(values > 0, np.clip(index, 1, _BUCKETS - 1), 0).astype(np.intp)
+
+
+def _bucket_values():
+    # Each bucket stands for the value with the smallest relative error to everything in it
+    index = np.arange(_BUCKETS)
+    return np.where(index == 0, 0.0, _SMALLEST * 2 * _GAMMA ** index / (_GAMMA + 1))
+
+
+class DemandAggregator:
+    """Running group-by totals of nutrient demand over chunks of batch results.
+
+    ``update(chunk)`` takes a chunk with the ``by`` columns and any rate
+    columns (``n_rate``, ``p2o5_rate``, ``k2o_rate``, ``s_rate``,
+    ``ecc_rate``, ...), plus ``acres`` if fields are not one acre each.
+    Only per-group state is kept: totals, acres, field counts and a
+    quantile sketch per nutrient, so a statewide run never holds its rows.
+    """
+
+    def __init__(self, by=("region", "crop"), quantiles=(0.5, 0.9)):
+        self.by = list(by)
+        self.quantiles = list(quantiles)
+        self.nutrients = []
+        self.groups = {}
+        self.totals = np.zeros((0, 0))
+        self.acres = np.zeros((0, 0))
+        self.fields = np.zeros((0, 0), dtype=np.int64)
+        self.sketch = np.zeros((0, 0, _BUCKETS), dtype=np.int32)
+
+    def _group_ids(self, chunk):
+        # Keys are factorized per column and combined, so the Python work is per distinct group
+        codes = np.zeros(len(chunk), dtype=np.int64)
+        uniques = []
+        for name in self.by:
+            column = chunk[name] if name in chunk else pd.Series(np.nan, index=chunk.index)
+            column_codes, column_uniques = pd.factorize(_text_array(column), use_na_sentinel=False)
+            codes = codes * len(column_uniques) + column_codes
+            uniques.append(np.asarray(column_uniques, dtype=object))
+        combos, inverse = np.unique(codes, return_inverse=True)
+        ids = []
+        for combo in combos:
+            key = []
+            for column_uniques in reversed(uniques):
+                combo, code = divmod(combo, len(column_uniques))
+                value = column_uniques[code]
+                key.append(None if isinstance(value, float) and np.isnan(value) else value)
+            key = tuple(reversed(key))
+            ids.append(self.groups.setdefault(key, len(self.groups)))
+        return np.array(ids, dtype=np.intp)[inverse]
+
+    def _grow(self, groups, nutrients):
+        g, v = self.totals.shape
+        if groups <= g and nutrients <= v:
+            return
+        size = (g if groups <= g else max(groups, 2 * g), nutrients)
+        for name in ("totals", "acres", "fields", "sketch"):
+            old = getattr(self, name)
+            new = np.zeros(size + old.shape[2:], dtype=old.dtype)
+            new[:old.shape[0], :old.shape[1]] = old
+            setattr(self, name, new)
+
+    def update(self, chunk):
+        for nutrient, column in RATE_COLUMNS.items():
+            if column in chunk and nutrient not in self.nutrients:
+                self.nutrients.append(nutrient)
+        ids = self._group_ids(chunk)
+        self._grow(len(self.groups), len(self.nutrients))
+        acres = pd.to_numeric(chunk["acres"], errors="coerce").to_numpy(dtype=float) if "acres" in chunk \
+            else np.ones(len(chunk))
+        groups = len(self.totals)
+        for j, nutrient in enumerate(self.nutrients):
+            if RATE_COLUMNS[nutrient] not in chunk:
+                continue
+            rate = pd.to_numeric(chunk[RATE_COLUMNS[nutrient]], errors="coerce").to_numpy(dtype=float)
+            # Invalid rows have no rate and are left out of every statistic
+            valid = ~np.isnan(rate) & ~np.isnan(acres)
+            g = ids[valid]
+            self.totals[:, j] += np.bincount(g, weights=rate[valid] * acres[valid], minlength=groups)
+            self.acres[:, j] += np.bincount(g, weights=acres[valid], minlength=groups)
+            self.fields[:, j] += np.bincount(g, minlength=groups)
+            cells = g * _BUCKETS + _buckets(rate[valid])
+            self.sketch[:, j] += np.bincount(cells, minlength=groups * _BUCKETS).reshape(groups, _BUCKETS) \
+                .astype(np.int32)
+        return self
+
+    def result(self):
+        """One row per group: fields, total lb, mean lb/a (per acre) and rate quantiles per nutrient."""
+        n = len(self.groups)
+        index = pd.MultiIndex.from_tuples(list(self.groups), names=self.by) if n else \
+            pd.MultiIndex.from_arrays([[]] * len(self.by), names=self.by)
+        columns = {}
+        values = _bucket_values()
+        for j, nutrient in enumerate(self.nutrients):
+            fields = self.fields[:n, j]
+            columns[f"{nutrient}_fields"] = fields
+            columns[f"{nutrient}_total_lb"] = np.round(self.totals[:n, j], 1)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                columns[f"{nutrient}_mean"] = np.round(self.totals[:n, j] / self.acres[:n, j], 1)
+            cumulative = np.cumsum(self.sketch[:n, j], axis=1)
+            for q in self.quantiles:
+                # Rank of the q-quantile among each group's fields, found in its cumulative counts
+                rank = np.floor(q * np.maximum(fields - 1, 0))
+                bucket = (cumulative <= rank[:, None]).sum(axis=1)
+                columns[f"{nutrient}_p{round(q * 100):g}"] = np.where(
+                    fields > 0, np.round(values[np.minimum(bucket, _BUCKETS - 1)], 1), np.nan)
+        return pd.DataFrame(columns, index=index).sort_index()
+
+
+def aggregate_csv(path, by, calculator=None, chunk_rows=200000, quantiles=(0.5, 0.9)):
+    """Aggregate a CSV chunk by chunk: batch results, or inputs run through ``calculator`` on the way."""
+    aggregator = DemandAggregator(by, quantiles)
+    for chunk in pd.read_csv(path, chunksize=chunk_rows):
+        if calculator is not None:
+            chunk = normalize_soil_tests(chunk)
+            # Build-up programs apply their yearly rate
+            result = CALCULATORS[calculator][0](chunk).rename(columns={"p2o5_yearly": "p2o5_rate",
+                                                                        "k2o_yearly": "k2o_rate"})
+            chunk = pd.concat([chunk[[c for c in chunk if c not in result]], result], axis=1)
+        aggregator.update(chunk)
+    return aggregator.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Regional totals of nutrient demand from batch results.")
+    parser.add_argument("input", help="batch results, or calculator inputs with --calculator")
+    parser.add_argument("output")
+    parser.add_argument("--by", nargs="+", default=["region", "crop"], help="grouping columns (default: region crop)")
+    parser.add_argument("--calculator", choices=sorted(CALCULATORS),
+                        help="run this calculator on each chunk instead of reading rate columns")
+    parser.add_argument("--chunk-rows", type=int, default=200000)
+    parser.add_argument("--quantiles", type=float, nargs="+", default=[0.5, 0.9])
+    args = parser.parse_args(argv)
+    aggregate_csv(args.input, args.by, args.calculator, args.chunk_rows, args.quantiles).to_csv(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Arrow record batches and tables in and out of the batch calculators.
+
+Needs pyarrow (pip install pyarrow). Numeric input columns without nulls
+become NumPy views of the Arrow buffers, and text columns stay in Arrow
+and are dictionary-encoded there, so no input is copied or iterated by
+row (integer columns with nulls are the exception: they are converted
+to floats). Result columns go back the same way: the NumPy buffers of the rates
+and codes are wrapped, not copied, with NaN rates marked as nulls, and
+categorical columns become dictionary arrays.
+
+    from engine import arrow
+    result = arrow.run("phosphorus", record_batch)       # a pyarrow.RecordBatch
+    everything = arrow.run("all", table)                 # all calculators in one pass
+"""
+
+import numpy as np
+import pandas as pd
+
+from engine.batch import CALCULATORS
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise RuntimeError("Arrow input and output need pyarrow (pip install pyarrow)") from None
+    return pyarrow
+
+
+def _column(values):
+    # NumPy view where Arrow's layout allows one (primitive numbers, no nulls, one chunk)
+    pa = _pyarrow()
+    if isinstance(values, pa.ChunkedArray):
+        values = values.chunk(0) if values.num_chunks == 1 else values.combine_chunks()
+    kind = values.type
+    if (pa.types.is_integer(kind) or pa.types.is_floating(kind)) and values.null_count == 0:
+        return values.to_numpy(zero_copy_only=True)
+    if pa.types.is_floating(kind):
+        return values.to_numpy(zero_copy_only=False)  # nulls become NaN
+    if pa.types.is_integer(kind):
+        return values.cast(pa.float64()).to_numpy(zero_copy_only=False)
+    return pd.arrays.ArrowExtensionArray(values)
+
+
+def to_frame(data):
+    """A DataFrame over an Arrow RecordBatch or Table (or a DataFrame with Arrow-backed columns)."""
+    pa = _pyarrow()
+    if isinstance(data, pd.DataFrame):
+        columns = {name: _column(pa.array(column.array)) if isinstance(column.dtype, pd.ArrowDtype) else column
+                   for name, column in data.items()}
+        return pd.DataFrame(columns, index=data.index, copy=False)
+    if isinstance(data, (pa.RecordBatch, pa.Table)):
+        return pd.DataFrame({name: _column(data.column(name)) for name in data.column_names}, copy=False)
+    raise TypeError(f"expected a pyarrow RecordBatch or Table or a DataFrame, got {type(data).__name__}")
+
+
+def to_arrow(frame):
+    """A RecordBatch of a result frame, sharing the frame's NumPy buffers."""
+    pa = _pyarrow()
+    arrays = []
+    for name, column in frame.items():
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            codes = column.cat.codes.to_numpy()
+            arrays.append(pa.DictionaryArray.from_arrays(pa.array(codes, mask=codes < 0),
+                                                         pa.array(column.cat.categories.to_numpy(dtype=str))))
+        else:
+            # NaN (an invalid row or a blank nutrient) is stored as null; the values are not copied
+            arrays.append(pa.array(column.to_numpy(), from_pandas=True))
+    return pa.RecordBatch.from_arrays(arrays, names=[str(name) for name in frame.columns])
+
+
+def run(calculator, data):
+    """Run a batch calculator (or "all" for the fused pass) on Arrow data and return Arrow.
+
+    ``data`` is a RecordBatch, a Table or a DataFrame; the result is a
+    RecordBatch, or a Table with one result batch per input batch when a
+    Table was given.
+    """
+    pa = _pyarrow()
+    if calculator == "all":
+        from engine.fused import evaluate as compute
+    else:
+        compute = CALCULATORS[calculator][0]
+    if isinstance(data, pa.Table):
+        # Batch by batch, so columns split over several chunks are still read in place
+        batches = data.to_batches() or [data]
+        return pa.Table.from_batches([to_arrow(compute(to_frame(batch))) for batch in batches])
+    return to_arrow(compute(to_frame(data)))
+
@@ -0,0 +1,359 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from engine import shared
+from engine import tables
+from engine import validation
+from engine.credits import credit_inputs, n_credits
+from engine.results import RATE_FLAGS, STARTER_ONLY
+from engine.soil_tests import normalize_soil_tests
+
+
+def _lookup(column, table, default=np.nan, width=None, factorized=None):
+    # Per-row table lookup done once per distinct value
+    codes, uniques = factorized or pd.factorize(column, use_na_sentinel=True)
+    if isinstance(table, shared.SharedTable):
+        positions = np.array([table.index.get(u, -1) for u in uniques] + [-1], dtype=np.intp)
+        rows = np.asarray(table.values)[positions]
+        rows[positions < 0] = default
+        return (rows if width is not None else rows[:, 0])[codes]
+    fill = default if width is None else (default,) * width
+    rows = [table.get(u, fill) for u in uniques] + [fill]
+    values = np.array([[np.nan if v is None else v for v in row] for row in rows], dtype=float) \
+        if width is not None else np.array(rows, dtype=float)
+    return values[codes]
+
+
+def _rounded(values, codes):
+    # Round half to even like round(), clip at zero and blank out invalid rows
+    rate = np.maximum(np.round(values), 0)
+    rate[codes != 0] = np.nan
+    return rate
+
+
+def _isin(column, choices, factorized=None):
+    # Membership worked out on the distinct values when the column was factorized
+    if factorized is None:
+        return np.array(column.isin(choices))
+    return validation._known(factorized, choices)
+
+
+def _previous_crop_adjustments(crop, previous_crop, condition, factorized=None):
+    # Adjustment grid over the distinct (previous crop, condition) pairs
+    factorized = factorized or {}
+    main_codes, mains = factorized.get("previous_crop") or pd.factorize(previous_crop, use_na_sentinel=True)
+    cond_codes, conds = factorized.get("previous_crop_condition") or pd.factorize(condition, use_na_sentinel=True)
+    grid = np.zeros((2, len(mains) + 1, len(conds) + 1))
+    for i, main in enumerate(mains):
+        for j, cond in enumerate(conds):
+            grid[0, i, j] = tables.previous_crop_adjustment("Wheat", main, cond)
+            grid[1, i, j] = tables.previous_crop_adjustment("Corn", main, cond)
+    small_grain = _isin(crop, tables.SMALL_GRAIN_CROPS, factorized.get("crop"))
+    return np.where(small_grain, grid[0, main_codes, cond_codes], grid[1, main_codes, cond_codes])
+
+
+def _result(columns, checked):
+    return pd.DataFrame({**columns, "code": checked.codes}, index=checked.values.index)
+
+
+def _nitrogen_inputs(frame):
+    # Credit columns the table does not have are not validated
+    return {**validation.NITROGEN_INPUTS, **credit_inputs(frame)}
+
+
+def _nitrogen(checked):
+    values = checked.values
+    crop = values["crop"]
+    # Manured rows use the credit of their analysis; irrigation water N counts as another credit
+    manure_credit, irrigation_n = n_credits(values, checked.factorized)
+    manure_n = values["manure_n"].to_numpy()
+    if manure_credit is not None:
+        manure_n = np.where(np.isnan(manure_credit), manure_n, manure_credit)
+    other_n = values["other_n"].to_numpy()
+    if irrigation_n is not None:
+        other_n = other_n + irrigation_n
+
+    factors = _lookup(crop, shared.table("nitrogen_factors"), width=4, factorized=checked.factorized.get("crop"))
+    yield_factor, om_factor, manure, tillage = factors.T
+    efficiency = np.isnan(yield_factor)
+    ie = values["ie"].to_numpy()
+    yield_factor = np.where(efficiency, ie / values["fe"].to_numpy(), yield_factor)
+    se = np.where(efficiency, values["se"].to_numpy(), 1.0)
+
+    n = (
+        yield_factor * values["yield"].to_numpy()
+        - se * values["profile_n"].to_numpy()
+        - om_factor * values["om"].to_numpy()
+        - manure * manure_n
+        - other_n
+        + _previous_crop_adjustments(crop, values["previous_crop"], values["previous_crop_condition"],
+                                     checked.factorized)
+        + tillage * values["tillage"].to_numpy()
+    )
+
+    forage = _isin(crop, tables.FORAGE_CROPS, checked.factorized.get("crop"))
+    forage_n = _lookup(values["forage_yield"], shared.table("forage_n"), default=0) \
+        + tables.NEW_SEEDING_N * values["new_seeding"].astype(bool).to_numpy()
+    n = np.where(forage, forage_n, n)
+    return {"n_rate": _rounded(n, checked.codes)}
+
+
+def nitrogen_batch(frame):
+    checked = validation.validate(_nitrogen_inputs(frame), frame)
+    return _result(_nitrogen(checked), checked)
+
+
+def _sufficiency(coefficients, cstv_levels, test_column, rate_column, checked, starter_flag=False):
+    values = checked.values
+    crop = values["crop"]
+    y = values["yield"].to_numpy()
+    test = values[test_column].to_numpy()
+
+    a, b, c, d = _lookup(crop, coefficients, width=4, factorized=checked.factorized.get("crop")).T
+    rec = a + (y * b) + (test * c) + (y * test * d)
+    low_cstv, high_cstv = cstv_levels
+    cstv = np.where(_isin(crop, tables.HIGH_CSTV_CROPS, checked.factorized.get("crop")), high_cstv, low_cstv)
+    starter_only = (test >= cstv) & (checked.codes == 0)
+    rec = np.where(starter_only, 0, rec)
+    result = {rate_column: _rounded(rec, checked.codes)}
+    if starter_flag:
+        result["starter_only"] = starter_only
+    return result
+
+
+def _phosphorus(checked):
+    # Only phosphorus is flagged as starter fertilizer only, as in the guide
+    return _sufficiency(shared.table("p_sufficiency"), tables.P_CSTV, "mehlich", "p2o5_rate", checked,
+                        starter_flag=True)
+
+
+def _potassium(checked):
+    return _sufficiency(shared.table("k_sufficiency"), tables.K_CSTV, "mehlich_k", "k2o_rate", checked)
+
+
+def phosphorus_batch(frame):
+    checked = validation.validate(validation.PHOSPHORUS_INPUTS, frame)
+    return _result(_phosphorus(checked), checked)
+
+
+def potassium_batch(frame):
+    checked = validation.validate(validation.POTASSIUM_INPUTS, frame)
+    return _result(_potassium(checked), checked)
+
+
+def _build(cstv_levels, factor, prefix, frame):
+    checked = validation.validate(validation.BUILD_INPUTS, frame)
+    values = checked.values
+    low_cstv, high_cstv = cstv_levels
+    cstv = np.where(values["crop"] == "Alfalfa and Clover", high_cstv, low_cstv)
+    years = values["years"].to_numpy()
+
+    total = _rounded((cstv - values["current"].to_numpy()) * factor + values["removal"].to_numpy() * years,
+                     checked.codes)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        yearly = np.where(years > 0, np.round(total / years), total)
+    return pd.DataFrame({f"{prefix}_total": total, f"{prefix}_yearly": yearly, "code": checked.codes},
+                        index=values.index)
+
+
+def phosphorus_build_batch(frame):
+    return _build(tables.P_CSTV, tables.P_BUILD_FACTOR, "p2o5", frame)
+
+
+def potassium_build_batch(frame):
+    return _build(tables.K_CSTV, tables.K_BUILD_FACTOR, "k2o", frame)
+
+
+def _sulfur(checked):
+    values = checked.values
+    factor = _lookup(values["crop"], shared.table("sulfur_factors"), default=0, factorized=checked.factorized.get("crop"))
+    s = (
+        factor * values["expected_yield"].to_numpy()
+        - tables.SULFUR_OM_FACTOR * values["om"].to_numpy()
+        - values["profile_s"].to_numpy()
+        - values["other_s"].to_numpy()
+    )
+    return {"s_rate": _rounded(s, checked.codes)}
+
+
+def sulfur_batch(frame):
+    checked = validation.validate(validation.SULFUR_INPUTS, frame)
+    return _result(_sulfur(checked), checked)
+
+
+def _classes(ppm, limits):
+    # Class index per row; an included upper limit moves to the next float so digitize keeps it in its class
+    bins = np.array([np.nextafter(limit, np.inf) if included else limit for limit, included in limits])
+    return np.digitize(ppm, bins)
+
+
+def _micronutrients(checked):
+    values = checked.values
+    invalid = checked.codes != 0
+
+    result = {}
+    for column, (levels, limits, rates) in tables.MICRONUTRIENT_CLASSES.items():
+        ppm = values[column].to_numpy()
+        blank = np.isnan(ppm) | invalid
+        level = _classes(ppm, limits)
+        if rates is not None:
+            intercept, slope, minimum = np.array(rates, dtype=float)[level].T
+            rate = np.maximum(minimum, np.round(intercept + slope * ppm))
+            rate[blank] = np.nan
+            result[column.replace("_ppm", "_rate")] = rate
+        result[column.replace("_ppm", "_level")] = pd.Categorical.from_codes(np.where(blank, -1, level),
+                                                                             categories=levels)
+    return result
+
+
+def micronutrients_batch(frame):
+    """Rates (lb/a) for Cl, B and Zn and soil test classes for all of them and Fe.
+
+    Each column is classified with one digitize call over its threshold
+    table, and the class picks the row's rate equation, so blank columns
+    cost nothing and any number of rows take a few array passes.
+    """
+    checked = validation.validate(validation.MICRONUTRIENT_INPUTS, frame)
+    return _result(_micronutrients(checked), checked)
+
+
+def _lime(checked):
+    values = checked.values
+    a, b, c = _lookup(values["target"], shared.table("lime_equations"), width=3, factorized=checked.factorized.get("target")).T
+    bph = values["buffer_ph"].to_numpy()
+    ecc = (a + (b * bph) + (bph * bph * c)) * values["depth"].to_numpy()
+    return {"ecc_rate": _rounded(ecc, checked.codes)}
+
+
+def lime_batch(frame):
+    checked = validation.validate(validation.LIME_INPUTS, frame)
+    return _result(_lime(checked), checked)
+
+
+def _lime_column(target):
+    # "Target pH 6.8" -> "ecc_ph68"
+    return "ecc_ph" + target.split()[-1].replace(".", "")
+
+
+def lime_layers_batch(frame, layers=tables.LIME_SAMPLE_LAYERS):
+    """Lime for fields sampled in layers, at every target pH at once.
+
+    Each layer has a ``buffer_ph_<k>`` and ``depth_<k>`` (inches) column;
+    layers after the first may be blank. The three target equations are
+    evaluated together by broadcasting (targets × layers × rows), giving
+    ``ecc_ph68_1``, ``ecc_ph68_2``, ... per layer and ``ecc_ph68`` for the
+    whole profile. A layer already above the target needs no lime and adds
+    nothing to the total. Rows with a ``target`` also get its total as
+    ``ecc_rate``.
+    """
+    spec = validation.LIME_LAYER_INPUTS if layers == tables.LIME_SAMPLE_LAYERS \
+        else validation.lime_layer_inputs(layers)
+    checked = validation.validate(spec, frame)
+    values = checked.values
+    # Layers × rows, so each result column is a contiguous slice
+    bph = np.stack([values[f"buffer_ph_{k}"].to_numpy() for k in range(1, layers + 1)])
+    depth = np.stack([values[f"depth_{k}"].to_numpy() for k in range(1, layers + 1)])
+    # A layer needs both its buffer pH and its depth
+    codes = checked.codes | np.where((np.isnan(bph) != np.isnan(depth)).any(axis=0),
+                                     validation.MISSING, validation.OK).astype(np.uint8)
+
+    a, b, c = np.array(list(tables.LIME_EQUATIONS.values()), dtype=float).T[:, :, None, None]
+    ecc = np.maximum(np.round((a + b * bph + c * bph * bph) * depth), 0)
+    total = np.nansum(ecc, axis=1)
+    invalid = codes != 0
+    ecc[:, :, invalid] = np.nan
+    total[:, invalid] = np.nan
+
+    result = {}
+    for t, target in enumerate(tables.LIME_EQUATIONS):
+        column = _lime_column(target)
+        for k in range(layers):
+            result[f"{column}_{k + 1}"] = ecc[t, k]
+        result[column] = total[t]
+    index = _lookup(values["target"], {target: t for t, target in enumerate(tables.LIME_EQUATIONS)},
+                    factorized=checked.factorized.get("target"))
+    chosen = ~np.isnan(index)
+    result["ecc_rate"] = np.full(len(values), np.nan)
+    result["ecc_rate"][chosen] = total[index[chosen].astype(np.intp), np.flatnonzero(chosen)]
+    result["code"] = codes
+    return pd.DataFrame(result, index=values.index)
+
+
+# Batch removal reports both nutrients, so the nutrient selector is not an input
+REMOVAL_INPUTS = {name: spec for name, spec in validation.CROP_REMOVAL_INPUTS.items() if name != "nutrient"}
+
+
+def _crop_removal(checked):
+    values = checked.values
+    removal = _lookup(values["crop"], shared.table("crop_removal"), width=2,
+                      factorized=checked.factorized.get("crop"))
+    y = values["yield"].to_numpy()
+    return {"p2o5_removal": _rounded(y * removal[:, 0], checked.codes),
+            "k2o_removal": _rounded(y * removal[:, 1], checked.codes)}
+
+
+def crop_removal_batch(frame):
+    checked = validation.validate(REMOVAL_INPUTS, frame)
+    return _result(_crop_removal(checked), checked)
+
+
+def flag_masks(calculator, column, result):
+    """Row masks of the Recommendation flags for one rate column of a batch result."""
+    rate = result[column].to_numpy(dtype=float)
+    masks = {flag: applies(rate) for flag, applies in RATE_FLAGS.get(calculator, ())}
+    if "starter_only" in result:
+        masks[STARTER_ONLY] = result["starter_only"].to_numpy(dtype=bool)
+    return masks
+
+
+CALCULATORS = {
+    "nitrogen": (nitrogen_batch, validation.NITROGEN_BATCH_INPUTS),
+    "phosphorus": (phosphorus_batch, validation.PHOSPHORUS_INPUTS),
+    "phosphorus_build": (phosphorus_build_batch, validation.BUILD_INPUTS),
+    "potassium": (potassium_batch, validation.POTASSIUM_INPUTS),
+    "potassium_build": (potassium_build_batch, validation.BUILD_INPUTS),
+    "sulfur": (sulfur_batch, validation.SULFUR_INPUTS),
+    "micronutrients": (micronutrients_batch, validation.MICRONUTRIENT_INPUTS),
+    "lime": (lime_batch, validation.LIME_INPUTS),
+    "lime_layers": (lime_layers_batch, validation.LIME_LAYER_INPUTS),
+    "crop_removal": (crop_removal_batch, REMOVAL_INPUTS),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a FertRecKS calculator over a CSV file.")
+    parser.add_argument("calculator", choices=sorted(CALCULATORS))
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--incremental", metavar="STORE_DIR",
+                        help="reuse results stored in STORE_DIR for rows seen before")
+    parser.add_argument("--record", action="store_true",
+                        help="save the recommendations to the local history database ($FERTRECKS_DB)")
+    parser.add_argument("--yield-history", metavar="RECORDS",
+                        help="fill blank yields with 105%% of each field's 3-5 year average in RECORDS "
+                             "(field_id, crop, year, yield)")
+    parser.add_argument("--before", type=int, help="with --yield-history, only use years before this one")
+    args = parser.parse_args(argv)
+
+    frame = normalize_soil_tests(pd.read_csv(args.input))
+    if args.yield_history:
+        from engine.yields import YIELD_COLUMNS, expected_yields, fill_expected_yields
+        if args.calculator not in YIELD_COLUMNS:
+            parser.error(f"the {args.calculator} calculator takes no yield")
+        frame = fill_expected_yields(frame, expected_yields(args.yield_history, before=args.before), args.calculator)
+    if args.incremental:
+        from engine.incremental import run_incremental
+        result, stats = run_incremental(args.calculator, frame, args.incremental)
+        print(f"{stats['rows']} rows: {stats['computed']} computed, {stats['reused']} reused")
+    else:
+        result = CALCULATORS[args.calculator][0](frame)
+    if args.record:
+        from engine.store import get_store
+        print(f"{get_store().record_batch(args.calculator, frame, result)} recommendations saved")
+    pd.concat([frame, result], axis=1).to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
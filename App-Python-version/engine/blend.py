@@ -0,0 +1,170 @@
+import argparse
+import itertools
+import math
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from engine import tables
+
+# Result column of the calculators holding each nutrient's rate (lb/a)
+RATE_COLUMNS = {
+    "n": "n_rate", "p2o5": "p2o5_rate", "k2o": "k2o_rate", "s": "s_rate",
+    "zn": "zn_rate", "cl": "cl_rate", "b": "b_rate", "ecc": "ecc_rate",
+}
+
+# analysis: lb of each nutrient (rows, BLEND_NUTRIENTS order) per lb of each product (columns)
+Catalog = namedtuple("Catalog", ["products", "analysis", "prices"])
+# bases: (basis columns, inverse basis matrix) of every basis that can be optimal
+Plan = namedtuple("Plan", ["nutrients", "unmet", "bases"])
+
+_TOLERANCE = 1e-9
+# Candidate bases listed per plan, C(products + nutrients, nutrients): with all eight
+# nutrients that allows eleven products, with four nutrients thirty-six
+MAX_BASES = 100000
+
+
+def load_catalog(path=None):
+    """Product catalog from a CSV (product, price_per_ton and a % column per nutrient), or the default."""
+    if path is None:
+        products = tables.FERTILIZER_PRODUCTS
+    else:
+        frame = pd.read_csv(path)
+        products = {row["product"]: ({n: row[n] for n in tables.BLEND_NUTRIENTS if n in frame and row[n] > 0},
+                                     row["price_per_ton"])
+                    for row in frame.fillna(0).to_dict("records")}
+    names = list(products)
+    analysis = np.array([[products[p][0].get(n, 0) / 100 for p in names] for n in tables.BLEND_NUTRIENTS], dtype=float)
+    prices = np.array([products[p][1] for p in names], dtype=float)
+    if (analysis < 0).any() or (prices <= 0).any():
+        raise ValueError("Product analyses must be non-negative and prices positive")
+    return Catalog(names, analysis, prices)
+
+
+def _plan(catalog, nutrients):
+    """Every basis of min price·x s.t. analysis·x ≥ rate, x ≥ 0 that is optimal for some rates.
+
+    The problem has few nutrients and products, so its bases can be listed.
+    Whether a basis is dual feasible (no product is cheaper than the mix the
+    basis prices it at) does not depend on the rates, so only those bases
+    are kept: for any rates, one of them is also primal feasible (its
+    solution is non-negative), and that solution is a least-cost blend.
+    """
+    rows = [tables.BLEND_NUTRIENTS.index(n) for n in nutrients]
+    supplied = catalog.analysis[rows].max(axis=1) > 0
+    unmet = [n for n, ok in zip(nutrients, supplied) if not ok]
+    nutrients = [n for n, ok in zip(nutrients, supplied) if ok]
+    a = catalog.analysis[[tables.BLEND_NUTRIENTS.index(n) for n in nutrients]]
+    m, n = a.shape
+    if math.comb(n + m, m) > MAX_BASES:
+        raise ValueError(f"A catalog of {n} products is too large to blend {m} nutrients: "
+                         f"over {MAX_BASES} candidate bases. Use fewer products or rate columns.")
+    # Products, then one surplus column per nutrient (analysis·x − surplus = rate)
+    columns = np.hstack([a, -np.eye(m)])
+    costs = np.append(catalog.prices / 2000, np.zeros(m))
+
+    bases = []
+    for basis in itertools.combinations(range(n + m), m):
+        matrix = columns[:, basis]
+        if m and abs(np.linalg.det(matrix)) < _TOLERANCE:
+            continue
+        inverse = np.linalg.inv(matrix) if m else np.zeros((0, 0))
+        duals = costs[list(basis)] @ inverse
+        if (costs - duals @ columns >= -_TOLERANCE).all():
+            bases.append((np.array(basis, dtype=np.intp), inverse))
+    return Plan(nutrients, unmet, bases)
+
+
+_plans = {}
+
+
+def blend(frame, catalog=None, chunk_rows=100000):
+    """Least-cost product quantities (lb/a) meeting each row's nutrient rates.
+
+    ``frame`` holds rate columns named as in the calculators' results
+    (``n_rate``, ``p2o5_rate``, ...); missing or blank rates count as zero.
+    Returns one ``<product>_lb`` column per catalog product, the blend's
+    ``cost`` in $/a, ``unmet``, the nutrients with a rate that no product
+    supplies, and ``solved``, False for a row no candidate basis solved
+    within tolerance (its amounts and cost are blank). Rows are solved
+    together: each candidate basis solves all remaining rows with one
+    matrix product, and the bases that solved most rows in a chunk are
+    tried first in the next one. The bases are listed per catalog, so a
+    catalog may have at most ``MAX_BASES`` of them (ValueError otherwise).
+    """
+    catalog = catalog or load_catalog()
+    if not isinstance(frame, pd.DataFrame):
+        frame = pd.DataFrame(frame)
+    wanted = [n for n in tables.BLEND_NUTRIENTS if RATE_COLUMNS[n] in frame]
+    key = (tuple(catalog.products), catalog.analysis.tobytes(), catalog.prices.tobytes(), tuple(wanted))
+    if key not in _plans:
+        _plans[key] = _plan(catalog, wanted)
+    plan = _plans[key]
+    bases = list(plan.bases)
+
+    def rates(nutrients):
+        if not nutrients:
+            return np.zeros((len(frame), 0))
+        values = np.column_stack([pd.to_numeric(frame[RATE_COLUMNS[n]], errors="coerce").to_numpy(dtype=float)
+                                  for n in nutrients])
+        return np.maximum(np.nan_to_num(values, nan=0.0), 0)
+
+    demand = rates(plan.nutrients)
+    products = len(catalog.products)
+    amounts = np.zeros((len(frame), products))
+    solved = np.ones(len(frame), dtype=bool)
+    for start in range(0, len(frame), chunk_rows):
+        chunk = demand[start:start + chunk_rows]
+        solution = amounts[start:start + chunk_rows]
+        open_rows = np.arange(len(chunk))
+        hits = []
+        for basis, inverse in bases:
+            x = chunk[open_rows] @ inverse.T
+            feasible = (x >= -_TOLERANCE).all(axis=1)
+            hits.append(int(feasible.sum()))
+            in_basis = basis < products
+            solution[np.ix_(open_rows[feasible], basis[in_basis])] = np.maximum(x[feasible][:, in_basis], 0)
+            open_rows = open_rows[~feasible]
+            if not len(open_rows):
+                break
+        solved[start + open_rows] = False
+        # Warm start: the bases that fitted these fields will most likely fit the next ones
+        order = np.argsort(-np.array(hits + [0] * (len(bases) - len(hits))), kind="stable")
+        bases = [bases[i] for i in order]
+
+    # Rounded up to 0.1 lb so no rate is missed by rounding
+    amounts = np.ceil(np.round(amounts * 10, 6)) / 10
+    amounts[~solved] = np.nan
+    result = {f"{product}_lb": amounts[:, i] for i, product in enumerate(catalog.products)}
+    result["cost"] = np.round(amounts @ catalog.prices / 2000, 2)
+    result["unmet"] = _unmet(rates(plan.unmet), plan.unmet)
+    result["solved"] = solved
+    return pd.DataFrame(result, index=frame.index)
+
+
+def _unmet(demand, nutrients):
+    # Comma separated names, built once per distinct combination
+    if not nutrients:
+        return np.full(len(demand), "", dtype=object)
+    mask = (demand > 0) @ (1 << np.arange(len(nutrients)))
+    combos, inverse = np.unique(mask, return_inverse=True)
+    names = [", ".join(n for i, n in enumerate(nutrients) if combo >> i & 1) for combo in combos]
+    return np.array(names, dtype=object)[inverse]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Least-cost fertilizer products for batch recommendations.")
+    parser.add_argument("input", help="CSV with rate columns (n_rate, p2o5_rate, k2o_rate, s_rate, ...)")
+    parser.add_argument("output")
+    parser.add_argument("--catalog", help="product CSV: product, price_per_ton and % columns "
+                                          f"({', '.join(tables.BLEND_NUTRIENTS)})")
+    args = parser.parse_args(argv)
+
+    frame = pd.read_csv(args.input)
+    result = blend(frame, load_catalog(args.catalog))
+    pd.concat([frame, result], axis=1).to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# Single-recommendation calculators behind the interactive modules. Each one
+# takes the raw widget values, validates them with the batch rules and
+# returns a Recommendation; turning it into text is left to the UI.
+
+from engine import tables
+from engine.results import STARTER_ONLY, Recommendation, failed, rate_flags
+from engine.validation import (BORON_INPUTS, BUILD_INPUTS, CHLORIDE_INPUTS, CROP_REMOVAL_INPUTS,
+                               LIME_INPUTS, NITROGEN_INPUTS, PHOSPHORUS_INPUTS, POTASSIUM_INPUTS,
+                               SULFUR_INPUTS, ZINC_INPUTS, check_inputs)
+
+MICRONUTRIENT_SYMBOLS = {"Chloride": "Cl", "Boron": "B", "Zinc": "Zn"}
+MICRONUTRIENT_SPECS = {"Chloride": CHLORIDE_INPUTS, "Boron": BORON_INPUTS, "Zinc": ZINC_INPUTS}
+REMOVAL_SYMBOLS = {"Phosphorus (P₂O₅)": "P2O5", "Potassium (K₂O)": "K2O"}
+
+
+def nitrogen(inputs):
+    values, error = check_inputs(NITROGEN_INPUTS, inputs)
+    if error is not None:
+        return failed("nitrogen", "N", error)
+
+    crop = values["crop"]
+    if crop in tables.NITROGEN_FACTORS:
+        # The same factors and order of terms as the batch calculator
+        yield_factor, om_factor, manure, tillage = tables.NITROGEN_FACTORS[crop]
+        se = 1.0
+        if yield_factor is None:
+            # Crops without a yield factor use ie / fe and the soil nitrate efficiency
+            yield_factor, se = values["ie"] / values["fe"], values["se"]
+        prev_crop_adj = tables.previous_crop_adjustment(crop, values["previous_crop"],
+                                                        values["previous_crop_condition"])
+        n = (
+            yield_factor * values["yield"]
+            - se * values["profile_n"]
+            - om_factor * values["om"]
+            - manure * values["manure_n"]
+            - values["other_n"]
+            + prev_crop_adj
+            + tillage * values["tillage"]
+        )
+    else:
+        forage_n_base = tables.FORAGE_N.get(int(values["forage_yield"] or 0), 0)
+        forage_n_extra = tables.NEW_SEEDING_N if values["new_seeding"] else 0
+        n = forage_n_base + forage_n_extra
+
+    n_final = max(0, round(n))
+    return Recommendation("nitrogen", "N", n_final, crop=crop, flags=rate_flags("nitrogen", n_final))
+
+
+def _sufficiency(calculator, nutrient, spec, test, coefficients, cstv_levels, inputs, starter_only=False):
+    values, error = check_inputs(spec, inputs)
+    if error is not None:
+        return failed(calculator, nutrient, error)
+
+    crop = values["crop"]
+    yield_val = values["yield"]
+    stp = values[test]
+
+    low_cstv, high_cstv = cstv_levels
+    cstv = high_cstv if crop in tables.HIGH_CSTV_CROPS else low_cstv
+
+    if stp >= cstv:
+        return Recommendation(calculator, nutrient, 0, crop=crop, flags=(STARTER_ONLY,) if starter_only else ())
+    a, b, c, d = coefficients[crop]
+    rec = a + (yield_val * b) + (stp * c) + (yield_val * stp * d)
+    return Recommendation(calculator, nutrient, max(round(rec), 0), crop=crop)
+
+
+def phosphorus(inputs):
+    # The guide suggests only starter fertilizer above the P critical level, not for K
+    return _sufficiency("phosphorus", "P2O5", PHOSPHORUS_INPUTS, "mehlich", tables.P_SUFFICIENCY,
+                        tables.P_CSTV, inputs, starter_only=True)
+
+
+def potassium(inputs):
+    return _sufficiency("potassium", "K2O", POTASSIUM_INPUTS, "mehlich_k", tables.K_SUFFICIENCY,
+                        tables.K_CSTV, inputs)
+
+
+def _build(calculator, nutrient, cstv_levels, factor, inputs):
+    values, error = check_inputs(BUILD_INPUTS, inputs)
+    if error is not None:
+        return failed(calculator, nutrient, error)
+
+    crop = values["crop"]
+    years = values["years"]
+    low_cstv, high_cstv = cstv_levels
+    cstv = high_cstv if crop == "Alfalfa and Clover" else low_cstv
+    build_amt = (cstv - values["current"]) * factor
+    total = max(round(build_amt + (values["removal"] * years)), 0)
+    yearly = round(total / years) if years > 0 else total
+    return Recommendation(calculator, nutrient, yearly, crop=crop, details={"total": total, "years": years})
+
+
+def phosphorus_build(inputs):
+    return _build("phosphorus_build", "P2O5", tables.P_CSTV, tables.P_BUILD_FACTOR, inputs)
+
+
+def potassium_build(inputs):
+    return _build("potassium_build", "K2O", tables.K_CSTV, tables.K_BUILD_FACTOR, inputs)
+
+
+def sulfur(inputs):
+    values, error = check_inputs(SULFUR_INPUTS, inputs)
+    if error is not None:
+        return failed("sulfur", "S", error)
+
+    crop = values["crop"]
+    s_rec = (tables.SULFUR_FACTORS.get(crop, 0) * values["expected_yield"] - tables.SULFUR_OM_FACTOR * values["om"]
+             - values["profile_s"] - values["other_s"])
+    return Recommendation("sulfur", "S", max(int(round(s_rec)), 0), crop=crop)
+
+
+def micronutrient(nutrient, inputs):
+    """Chloride, boron or zinc rate from the matching soil test (ppm)."""
+    symbol = MICRONUTRIENT_SYMBOLS[nutrient]
+    (name,) = MICRONUTRIENT_SPECS[nutrient]
+    values, error = check_inputs(MICRONUTRIENT_SPECS[nutrient], inputs)
+    if error is not None:
+        return failed("micronutrients", symbol, error)
+    ppm = values[name]
+
+    _, limits, rates = tables.MICRONUTRIENT_CLASSES[name]
+    level = sum(ppm > limit if included else ppm >= limit for limit, included in limits)
+    intercept, slope, minimum = rates[level]
+    rate = max(minimum, int(round(intercept + slope * ppm)))
+    return Recommendation("micronutrients", symbol, rate, flags=rate_flags("micronutrients", rate),
+                          details={"ppm": ppm})
+
+
+def lime(inputs):
+    values, error = check_inputs(LIME_INPUTS, inputs)
+    if error is not None:
+        return failed("lime", "ECC", error)
+
+    target = values["target"]
+    buffer_ph = values["buffer_ph"]
+    depth = values["depth"]
+    a, b, c = tables.LIME_EQUATIONS[target]
+    lime_rec = max(int(round((a + (b * buffer_ph) + (buffer_ph * buffer_ph * c)) * depth)), 0)
+    return Recommendation("lime", "ECC", lime_rec, flags=rate_flags("lime", lime_rec),
+                          details={"target": target, "buffer_ph": buffer_ph, "depth": depth})
+
+
+def crop_removal(inputs):
+    values, error = check_inputs(CROP_REMOVAL_INPUTS, inputs)
+    if error is not None:
+        return failed("crop_removal", REMOVAL_SYMBOLS.get(inputs.get("nutrient")), error)
+
+    crop = values["crop"]
+    nutrient = REMOVAL_SYMBOLS[values["nutrient"]]
+    unit, moisture, p2o5, k2o = tables.CROP_REMOVAL[crop]
+    coeff = p2o5 if nutrient == "P2O5" else k2o
+    removal = max(int(round(values["yield"] * coeff)), 0)
+    return Recommendation("crop_removal", nutrient, removal, crop=crop,
+                          details={"yield_unit": unit, "moisture": moisture})
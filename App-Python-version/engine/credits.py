@@ -0,0 +1,87 @@
+"""Manure and irrigation-water nitrogen credits for the nitrogen calculator.
+
+Rows with a ``manure_type`` are credited with the first-year available N of
+their manure analysis:
+
+    manure N = rate × (NH4-N × retention + (total N − NH4-N) × availability)
+
+where the ammonium retention depends on ``manure_application`` and the
+organic N availability on the manure type (or ``manure_availability``).
+Irrigation water adds 0.226 lb N/a per ppm nitrate-N per inch applied.
+An analysis with more ammonium N than total N is rejected (OUT_OF_RANGE).
+``nitrogen_batch`` uses these in place of the ``manure_n`` of manured rows
+and adds the irrigation credit to ``other_n``, so a livestock operation's
+field table needs no credits worked out by hand. Crops whose N equation has
+no manure term (Oats, and the forage crops) ignore the manure credit, as
+they ignore ``manure_n``; ``credits_batch`` still reports it.
+
+    python -m engine.credits fields.csv credits.csv
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from engine import tables
+from engine import validation
+
+
+def _retention(application, factorized=None):
+    codes, uniques = factorized or pd.factorize(application, use_na_sentinel=True)
+    return np.array([tables.MANURE_AMMONIUM_RETENTION.get(u, np.nan) for u in uniques] + [np.nan])[codes]
+
+
+def credit_inputs(frame):
+    """The credit inputs worth validating: the manure or irrigation ones only if ``frame`` has any of them."""
+    spec = {}
+    for inputs in (validation.MANURE_INPUTS, validation.IRRIGATION_INPUTS):
+        if any(name in frame for name in inputs):
+            spec.update(inputs)
+    return spec
+
+
+def n_credits(values, factorized=None):
+    """(manure N, or NaN for rows without manure; irrigation N) in lb/a, from validated credit inputs.
+
+    Either is None when ``values`` has none of its columns.
+    """
+    manure = _manure(values, factorized) if "manure_type" in values else None
+    irrigation = np.round(tables.IRRIGATION_N_FACTOR * values["irrigation_no3_n"].to_numpy(dtype=float)
+                          * values["irrigation_inches"].to_numpy(dtype=float), 1) \
+        if "irrigation_no3_n" in values else None
+    return manure, irrigation
+
+
+def _manure(values, factorized):
+    manured = values["manure_type"].notna().to_numpy()
+    total = values["manure_total_n"].to_numpy(dtype=float)
+    nh4 = values["manure_nh4_n"].to_numpy(dtype=float)
+    retention = _retention(values["manure_application"], (factorized or {}).get("manure_application"))
+    available = nh4 * retention + np.maximum(total - nh4, 0) * values["manure_availability"].to_numpy(dtype=float)
+    return np.where(manured, np.round(values["manure_rate"].to_numpy(dtype=float) * available, 1), np.nan)
+
+
+def credits_batch(frame):
+    """Manure and irrigation N credits (lb/a) per row, with the validation code of their inputs."""
+    checked = validation.validate(validation.N_CREDIT_INPUTS, frame)
+    manure, irrigation = n_credits(checked.values, checked.factorized)
+    invalid = checked.codes != 0
+    manure[invalid] = np.nan
+    irrigation[invalid] = np.nan
+    return pd.DataFrame({"manure_n": manure, "irrigation_n": irrigation, "code": checked.codes},
+                        index=checked.values.index)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manure and irrigation-water N credits for a CSV of fields.")
+    parser.add_argument("input")
+    parser.add_argument("output")
+    args = parser.parse_args(argv)
+    frame = pd.read_csv(args.input)
+    result = credits_batch(frame)
+    pd.concat([frame.drop(columns=[c for c in result if c in frame]), result], axis=1).to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import argparse
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from engine import batch, tables, validation
+from engine.batch import CALCULATORS
+
+# Calculators evaluated together, and where each batch result column goes in the fused result
+FUSED = {
+    "nitrogen": {"n_rate": "n_rate"},
+    "phosphorus": {"p2o5_rate": "p2o5_rate", "starter_only": "p2o5_starter_only"},
+    "potassium": {"k2o_rate": "k2o_rate"},
+    "sulfur": {"s_rate": "s_rate"},
+    "micronutrients": {f"{column.replace('_ppm', '')}_{kind}": f"{column.replace('_ppm', '')}_{kind}"
+                       for column, (_, _, rates) in tables.MICRONUTRIENT_CLASSES.items()
+                       for kind in (("rate", "level") if rates is not None else ("level",))},
+    "lime": {"ecc_rate": "ecc_rate"},
+    "crop_removal": {"p2o5_removal": "p2o5_removal", "k2o_removal": "k2o_removal"},
+}
+
+# Batch helper that works out each calculator's result columns from a validated chunk
+COLUMNS = {
+    "nitrogen": batch._nitrogen,
+    "phosphorus": batch._phosphorus,
+    "potassium": batch._potassium,
+    "sulfur": batch._sulfur,
+    "micronutrients": batch._micronutrients,
+    "lime": batch._lime,
+    "crop_removal": batch._crop_removal,
+}
+
+
+def evaluate(frame, chunk_rows=131072):
+    """Every calculator's recommendation for a table of fields, in one chunked pass.
+
+    ``frame`` has one row per field with the inputs of any of the
+    calculators (crop, yield, om, profile_n, mehlich, mehlich_k,
+    expected_yield, profile_s, cl_ppm, ..., target, buffer_ph, depth).
+    The table is read once, ``chunk_rows`` rows at a time: each chunk is
+    validated and run through all the calculators before the next is
+    read, an input column shared by several calculators is parsed once
+    per chunk, and the arrays the formulas make are chunk-sized rather
+    than full-length. Results are copied into preallocated result columns.
+    The result has the columns of the separate batch calculators
+    (``p2o5_starter_only`` for the phosphorus soil test flag) and a
+    ``<calculator>_code`` validation code per calculator; a row invalid
+    for one calculator still gets the others.
+    """
+    if not isinstance(frame, pd.DataFrame):
+        frame = pd.DataFrame(frame)
+    specs = {name: CALCULATORS[name][1] for name in FUSED}
+    specs["nitrogen"] = batch._nitrogen_inputs(frame)
+    n = len(frame)
+
+    out = {}
+    for name, columns in FUSED.items():
+        for column in columns.values():
+            if column.endswith("_starter_only"):
+                out[column] = np.empty(n, dtype=bool)
+            elif column.endswith("_level"):
+                out[column] = np.empty(n, dtype=np.int8)
+            else:
+                out[column] = np.empty(n)
+        out[f"{name}_code"] = np.empty(n, dtype=np.uint8)
+
+    for start in range(0, n, max(1, chunk_rows)):
+        rows = slice(start, min(start + chunk_rows, n))
+        chunk = frame.iloc[rows]
+        parsed = {}
+        for name, columns in FUSED.items():
+            checked = validation.validate(specs[name], chunk, parsed)
+            result = COLUMNS[name](checked)
+            for column, target in columns.items():
+                values = result[column]
+                out[target][rows] = values.codes if isinstance(values, pd.Categorical) else values
+            out[f"{name}_code"][rows] = checked.codes
+
+    result = {}
+    for name, columns in FUSED.items():
+        for column in columns.values():
+            if column.endswith("_level"):
+                levels = tables.MICRONUTRIENT_CLASSES[column.replace("_level", "_ppm")][0]
+                result[column] = pd.Categorical.from_codes(out[column], categories=levels)
+            else:
+                result[column] = out[column]
+        result[f"{name}_code"] = out[f"{name}_code"]
+    return pd.DataFrame(result, index=frame.index, copy=False)
+
+
+def sequential(frame):
+    """The same result from the separate batch calculators, run one after another."""
+    parts = []
+    for name, columns in FUSED.items():
+        result = CALCULATORS[name][0](frame)
+        parts.append(result[list(columns)].rename(columns=columns))
+        parts.append(result["code"].rename(f"{name}_code"))
+    return pd.concat(parts, axis=1)
+
+
+def sample_fields(rows, seed=0):
+    """A table of fields with inputs for every calculator, for benchmarks."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "crop": rng.choice(["Corn", "Wheat", "Soybean", "Grain Sorghum", "Alfalfa"], rows),
+        "yield": rng.uniform(40, 200, rows).round(), "expected_yield": rng.uniform(40, 200, rows).round(),
+        "om": rng.uniform(1, 4, rows).round(1), "profile_n": rng.uniform(0, 60, rows).round(),
+        "mehlich": rng.uniform(2, 40, rows).round(), "mehlich_k": rng.uniform(60, 250, rows).round(),
+        "profile_s": rng.uniform(0, 20, rows).round(),
+        "cl_ppm": rng.uniform(0, 10, rows).round(1), "b_ppm": rng.uniform(0, 2, rows).round(2),
+        "zn_ppm": rng.uniform(0, 2, rows).round(2), "fe_ppm": rng.uniform(0, 10, rows).round(1),
+        "target": rng.choice(tables.LIME_TARGETS, rows), "buffer_ph": rng.uniform(5.8, 7, rows).round(2),
+        "depth": 6.0,
+    })
+
+
+def _memory(run, frame):
+    # Peak and total MB allocated during the run. tracemalloc only keeps the peak, so the
+    # total adds up how far each bytecode step rose above the memory in use when it started.
+    # Arrays made and freed within one C call count once, at that call's peak, and steps
+    # under 1 KiB (mostly the tracer's own objects) are left out.
+    total = highest = last = 0
+
+    def trace(frame_, event, arg):
+        nonlocal total, highest, last
+        frame_.f_trace_opcodes = True
+        current, peak = tracemalloc.get_traced_memory()
+        if peak - last >= 1024:
+            total += peak - last
+        highest = max(highest, peak)
+        tracemalloc.reset_peak()
+        last = current
+        return trace
+
+    tracemalloc.start()
+    sys.settrace(trace)
+    try:
+        run(frame)
+    finally:
+        sys.settrace(None)
+        highest = max(highest, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return highest / 2 ** 20, total / 2 ** 20
+
+
+def benchmark(rows, repeat=3):
+    frame = sample_fields(rows)
+    print(f"{rows} fields, {len(FUSED)} calculators")
+    results = {}
+    for label, run in (("sequential", sequential), ("fused", evaluate)):
+        seconds = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results[label] = run(frame)
+            seconds.append(time.perf_counter() - start)
+        peak, total = _memory(run, frame)
+        print(f"{label:>10}: {min(seconds):.3f} s, peak {peak:.0f} MB, {total:.0f} MB allocated in all")
+    pd.testing.assert_frame_equal(results["fused"], results["sequential"])
+    print("results identical")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run every calculator over a table of fields in one pass.")
+    parser.add_argument("input", nargs="?")
+    parser.add_argument("output", nargs="?")
+    parser.add_argument("--benchmark", type=int, metavar="ROWS",
+                        help="compare with the separate batch calculators on ROWS generated fields")
+    args = parser.parse_args(argv)
+    if args.benchmark:
+        benchmark(args.benchmark)
+        return
+    if not (args.input and args.output):
+        parser.error("input and output are required unless --benchmark is given")
+    frame = pd.read_csv(args.input)
+    pd.concat([frame, evaluate(frame)], axis=1).to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
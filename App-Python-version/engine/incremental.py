@@ -0,0 +1,328 @@
+import hashlib
+import json
+import os
+import sys
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from types import ModuleType
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single writer per store is assumed
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+
+from engine import batch
+from engine.batch import CALCULATORS
+from engine.validation import _text_array
+
+
+def _engine_version():
+    # Results depend on the batch formulas and every engine module they import (coefficient
+    # tables, validation rules, manure and irrigation N credits, ...)
+    modules = {batch}
+    for value in vars(batch).values():
+        module = value if isinstance(value, ModuleType) else sys.modules.get(getattr(value, "__module__", None))
+        if module is not None and module.__name__.startswith("engine."):
+            modules.add(module)
+    digest = hashlib.sha256()
+    for path in sorted(Path(module.__file__).name for module in modules):
+        digest.update((Path(__file__).parent / path).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+VERSION = _engine_version()
+
+_NAN = np.float64(np.nan).view(np.uint64)
+
+
+def _mix(x):
+    # splitmix64 finalizer; uint64 arithmetic wraps around
+    with np.errstate(over="ignore"):
+        x = x ^ (x >> np.uint64(30))
+        x = x * np.uint64(0xBF58476D1CE4E5B9)
+        x = x ^ (x >> np.uint64(27))
+        x = x * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+
+def _float_bits(values):
+    # -0.0 and 0.0 hash alike; every NaN (blank) becomes one value
+    bits = (values + 0.0).view(np.uint64)
+    bits[np.isnan(values)] = _NAN
+    return bits
+
+
+def _normalized_bits(raw, kind):
+    """uint64 per row standing for the value the validator will see."""
+    if kind == "number" and (pd.api.types.is_numeric_dtype(raw.dtype) or pd.api.types.is_bool_dtype(raw.dtype)):
+        return _float_bits(raw.to_numpy(dtype=float, na_value=np.nan))
+
+    # Text columns: normalize each distinct value once, then broadcast
+    codes, uniques = pd.factorize(_text_array(raw), use_na_sentinel=True)
+    uniques = pd.Series(uniques, dtype=object)
+    text = uniques.map(lambda u: u.strip() if isinstance(u, str) else u)
+    blank = text.map(lambda u: u == "").to_numpy(dtype=bool)
+    if kind == "number":
+        numbers = pd.to_numeric(text, errors="coerce").to_numpy(dtype=float)
+    else:
+        numbers = np.full(len(uniques), np.nan)
+    # Values that are not numbers hash as their type and (case-folded) text
+    labels = [f"{type(u).__name__}:{t.lower() if isinstance(t, str) else t}" for u, t in zip(uniques, text)]
+    bits = np.where(np.isnan(numbers), pd.util.hash_array(np.array(labels, dtype=object)), _float_bits(numbers))
+    bits[blank] = _NAN
+    return np.append(bits, _NAN)[codes]
+
+
+def _tags(count):
+    # One odd constant per input column, so equal values in different columns hash apart
+    return [np.uint64(((i + 1) * 0x9E3779B97F4A7C15) % 2 ** 64 | 1) for i in range(count)]
+
+
+def row_hashes(spec, frame, seed=VERSION):
+    """64-bit hash of each row's normalized calculator inputs.
+
+    Numbers hash by their float64 value and text by its stripped, case-folded
+    form, so ``150`` and ``150.0``, ``" Corn"`` and ``"Corn"``, or a file that
+    went through a CSV round trip hash the same. Blank and absent columns
+    hash alike, as they validate alike. ``seed`` ties the hash to the engine
+    version, so changed coefficient tables never reuse old results.
+    """
+    columns = [(name, field["kind"]) for name, field in spec.items()] + \
+              [(f"{name}_unit", "choice") for name, field in spec.items() if field.get("units")]
+    h = np.full(len(frame), np.frombuffer(hashlib.sha256(str(seed).encode()).digest()[:8], dtype=np.uint64)[0])
+    for (name, kind), tag in zip(columns, _tags(len(columns))):
+        if name in frame:
+            h ^= _mix(_normalized_bits(frame[name], kind) ^ tag)
+        else:
+            h ^= _mix(_NAN ^ tag)
+    return _mix(h)
+
+
+class ResultCache:
+    """On-disk results for one calculator, keyed by row hash.
+
+    The store is a list of immutable segments, each a sorted hash array plus
+    a float result matrix (``.npy``), named in ``manifest.json``. A lookup is
+    a memory-mapped binary search per segment; new results are appended as
+    a new segment, and neighbouring segments of similar size are merged, so
+    a write costs about the size of the new rows and there are only
+    O(log rows) segments to search.
+
+    The hashes and results of the last file are also kept in file order:
+    a corrected re-send mostly lines up with it row for row, and those rows
+    are copied across without a search.
+    """
+
+    def __init__(self, directory, calculator):
+        self.path = Path(directory) / calculator
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.segments = []
+        self.previous = None
+        self._stamp = None
+        self.refresh()
+
+    def _current_stamp(self):
+        try:
+            stat = os.stat(self.path / "manifest.json")
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _read_manifest(self):
+        try:
+            return json.loads((self.path / "manifest.json").read_text())
+        except FileNotFoundError:
+            return {"segments": [], "previous": None}
+
+    def refresh(self):
+        """Map the segments again if another process has changed the manifest."""
+        while self._current_stamp() != self._stamp:
+            stamp = self._current_stamp()
+            manifest = self._read_manifest()
+            previous = manifest.get("previous")
+            try:
+                self.segments = [self._open(entry) for entry in manifest["segments"]
+                                 if entry["version"] == VERSION]
+                self.previous = self._open(previous) if previous and previous["version"] == VERSION else None
+            except FileNotFoundError:
+                continue  # a writer replaced these files since the manifest was read
+            self._stamp = stamp
+
+    def _open(self, entry):
+        name = entry["name"]
+        return dict(entry, hashes=np.load(self.path / f"{name}.hashes.npy", mmap_mode="r"),
+                    values=np.load(self.path / f"{name}.values.npy", mmap_mode="r"))
+
+    def gather(self, hashes, columns):
+        """Return (found mask, stored values for the found rows)."""
+        self.refresh()
+        found = np.zeros(len(hashes), dtype=bool)
+        values = np.full((len(hashes), len(columns)), np.nan)
+
+        previous = self.previous
+        if previous is not None and previous["columns"] == columns:
+            m = min(len(hashes), previous["rows"])
+            found[:m] = hashes[:m] == previous["hashes"][:m]
+            # One sequential copy, then blank the few rows that changed
+            values[:m] = previous["values"][:m]
+            values[:m][~found[:m]] = np.nan
+
+        segments = [s for s in self.segments if s["columns"] == columns and len(s["hashes"])]
+        rows = np.flatnonzero(~found)
+        if not segments or not len(rows):
+            return found, values
+        # Probing in sorted order keeps the binary searches cache friendly
+        rows = rows[np.argsort(hashes[rows])]
+        probes = hashes[rows]
+        for segment in reversed(segments):
+            stored = segment["hashes"]
+            positions = np.minimum(np.searchsorted(stored, probes), len(stored) - 1)
+            hit = stored[positions] == probes
+            found[rows[hit]] = True
+            values[rows[hit]] = segment["values"][positions[hit]]
+            probes, rows = probes[~hit], rows[~hit]
+            if not len(probes):
+                break
+        return found, values
+
+    def append(self, hashes, values, columns, previous=None):
+        """Add results for ``hashes`` (unique, not yet stored) as a new segment.
+
+        ``previous`` is the ``(hashes, values)`` of the whole file in row
+        order, kept for the next re-send.
+        """
+        with _locked(self.path / "lock"):
+            manifest = self._read_manifest()
+            # Results of other engine versions can never be reused again
+            keep = [e for e in manifest["segments"] if e["version"] == VERSION and e["columns"] == columns]
+            dropped = [e for e in manifest["segments"] if e not in keep]
+
+            if len(hashes):
+                order = np.argsort(hashes)
+                keep.append(self._write(hashes[order], values[order], columns))
+                while len(keep) > 1 and keep[-2]["rows"] <= 2 * keep[-1]["rows"]:
+                    older, newer = keep[-2], keep.pop()
+                    keep[-1] = self._merge(older, newer)
+                    dropped += [older, newer]
+
+            last = manifest.get("previous")
+            if previous is not None:
+                if last:
+                    dropped.append(last)
+                last = self._write(*previous, columns)
+
+            tmp = self.path / "manifest.tmp.json"
+            tmp.write_text(json.dumps({"segments": keep, "previous": last}))
+            os.replace(tmp, self.path / "manifest.json")
+            # Readers that still map a dropped file keep their pages until they refresh
+            for entry in dropped:
+                for part in ("hashes", "values"):
+                    (self.path / f"{entry['name']}.{part}.npy").unlink(missing_ok=True)
+        self.refresh()
+
+    def _merge(self, older, newer):
+        a, b = self._open(older), self._open(newer)
+        hashes = np.concatenate([a["hashes"], b["hashes"]])
+        values = np.concatenate([a["values"], b["values"]])
+        # Two workers may have stored the same row; keep one copy
+        hashes, first = np.unique(hashes, return_index=True)
+        return self._write(hashes, values[first], older["columns"])
+
+    def _write(self, hashes, values, columns):
+        name = uuid.uuid4().hex
+        for part, array in (("values", values), ("hashes", hashes)):
+            with open(self.path / f"{name}.{part}.npy", "wb") as f:
+                np.save(f, np.ascontiguousarray(array))
+        return {"name": name, "rows": len(hashes), "version": VERSION, "columns": columns}
+
+
+@contextmanager
+def _locked(path):
+    # Only writers lock: data files never change once written and the manifest is swapped atomically
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _dtypes(calculator):
+    # Result columns and their types, from a run on no rows
+    return CALCULATORS[calculator][0](pd.DataFrame(columns=list(CALCULATORS[calculator][1]))).dtypes.to_dict()
+
+
+_caches = {}
+
+
+def open_cache(directory, calculator):
+    """The process's ResultCache for ``directory``, kept mapped between runs.
+
+    The segments are read-only memory maps, so every worker process using
+    the same directory shares their pages, and a result stored by one worker
+    is found by the others.
+    """
+    key = (str(Path(directory).resolve()), calculator, VERSION)
+    if key not in _caches:
+        _caches[key] = ResultCache(directory, calculator)
+    return _caches[key]
+
+
+class IncrementalRun:
+    """A batch split into rows already in the store and rows still to compute.
+
+    ``pending`` holds one row per distinct new input; compute it any way you
+    like (in this process or on a pool) and pass the result to ``finish()``.
+    """
+
+    def __init__(self, calculator, frame, store_dir):
+        if not isinstance(frame, pd.DataFrame):
+            frame = pd.DataFrame(frame)
+        self.frame = frame
+        self.dtypes = _dtypes(calculator)
+        self.columns = list(self.dtypes)
+        self.cache = open_cache(store_dir, calculator)
+        self.hashes = row_hashes(CALCULATORS[calculator][1], frame)
+        found, self.values = self.cache.gather(self.hashes, self.columns)
+
+        # Duplicate rows inside the file are computed once
+        self.missing = np.flatnonzero(~found)
+        self.new_hashes, first, self.inverse = np.unique(self.hashes[self.missing], return_index=True,
+                                                         return_inverse=True)
+        self.pending = frame.iloc[self.missing[first]]
+        self.reused = int(len(frame) - len(self.missing))
+
+    def finish(self, computed):
+        """Store ``computed`` (the result for ``pending``) and return ``(result, stats)``."""
+        if self.frame.empty:
+            return computed, {"rows": 0, "computed": 0, "reused": 0}
+        # Categorical columns are stored by their codes
+        computed = np.column_stack([computed[c].cat.codes if isinstance(self.dtypes[c], pd.CategoricalDtype)
+                                    else computed[c] for c in self.columns]).astype(float)
+        self.values[self.missing] = computed[self.inverse]
+        previous = self.cache.previous
+        if len(self.missing) or previous is None or not np.array_equal(previous["hashes"], self.hashes):
+            self.cache.append(self.new_hashes, computed, self.columns, previous=(self.hashes, self.values))
+
+        result = pd.DataFrame({c: pd.Categorical.from_codes(self.values[:, i].astype(int), dtype=self.dtypes[c])
+                               if isinstance(self.dtypes[c], pd.CategoricalDtype) else self.values[:, i]
+                               for i, c in enumerate(self.columns)}, index=self.frame.index).astype(self.dtypes)
+        stats = {"rows": len(self.frame), "computed": len(computed), "reused": self.reused}
+        return result, stats
+
+
+def run_incremental(calculator, frame, store_dir):
+    """Run a batch calculator, recomputing only rows not already in the store.
+
+    Returns ``(result, stats)`` where stats counts rows, computed and reused.
+    Hashing and the store lookup are linear in the file size; validation and
+    calculation run on new or changed rows alone.
+    """
+    run = IncrementalRun(calculator, frame, store_dir)
+    return run.finish(CALCULATORS[calculator][0](run.pending))
@@ -0,0 +1,375 @@
+"""Local queue of batch jobs, kept in SQLite so queued work survives restarts.
+
+A job is a calculator and an input CSV. ``JobQueue.submit`` copies the file
+into the queue directory and refuses new jobs with ``QueueFull`` once
+``capacity`` jobs are queued or running, so a flood of uploads is turned
+away instead of piling up. Workers (the app's own, or ``python -m
+engine.jobs worker``) claim jobs one at a time, run them on the task pool
+and write their progress and results back. A job left running by a
+worker process that died goes back to the queue when a worker starts.
+
+    python -m engine.jobs submit nitrogen fields.csv
+    python -m engine.jobs status
+    python -m engine.jobs result 12 n_results.csv
+    python -m engine.jobs worker --concurrency 2
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE = (QUEUED, RUNNING)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    calculator TEXT NOT NULL,
+    name TEXT,
+    owner TEXT,
+    status TEXT NOT NULL,
+    rows INTEGER,
+    done_rows INTEGER NOT NULL DEFAULT 0,
+    invalid_rows INTEGER,
+    submitted TEXT NOT NULL,
+    started TEXT,
+    finished TEXT,
+    worker INTEGER,
+    cancel INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+CREATE INDEX IF NOT EXISTS jobs_owner ON jobs (owner, id);
+"""
+
+JOB_COLUMNS = ["id", "calculator", "name", "owner", "status", "rows", "done_rows", "invalid_rows", "submitted",
+               "started", "finished", "worker", "cancel", "error"]
+Job = namedtuple("Job", JOB_COLUMNS)
+
+
+class QueueFull(RuntimeError):
+    """The queue already holds its capacity of queued and running jobs."""
+
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """Batch jobs in ``directory``: jobs.db, and the input and result CSV of each job."""
+
+    def __init__(self, directory, capacity=20):
+        self.directory = Path(directory)
+        self.capacity = capacity
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.directory / "jobs.db", check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def input_path(self, job_id):
+        return self.directory / f"{job_id}.csv"
+
+    def result_path(self, job_id):
+        return self.directory / f"{job_id}.results.csv"
+
+    def submit(self, calculator, path, name=None, owner=None):
+        """Queue a copy of the CSV at ``path``; returns the job id or raises QueueFull."""
+        staged = Path(tempfile.mkstemp(dir=self.directory, suffix=".part")[1])
+        try:
+            shutil.copyfile(path, staged)
+            with self._lock, self._db:
+                # BEGIN IMMEDIATE: the count and the insert are one step for every process
+                self._db.execute("BEGIN IMMEDIATE")
+                active = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", ACTIVE).fetchone()[0]
+                if active >= self.capacity:
+                    raise QueueFull(f"The job queue is full ({active} jobs waiting or running); try again later.")
+                job_id = self._db.execute(
+                    "INSERT INTO jobs (calculator, name, owner, status, submitted) VALUES (?, ?, ?, ?, ?)",
+                    (calculator, name or Path(path).name, owner, QUEUED, _now())).lastrowid
+                staged.replace(self.input_path(job_id))
+            return job_id
+        finally:
+            staged.unlink(missing_ok=True)
+
+    def claim(self):
+        """Mark the oldest queued job as running in this process and return it, or None."""
+        with self._lock, self._db:
+            row = self._db.execute(
+                f"UPDATE jobs SET status = ?, started = ?, worker = ?, done_rows = 0 "
+                f"WHERE id = (SELECT id FROM jobs WHERE status = ? ORDER BY id LIMIT 1) "
+                f"RETURNING {', '.join(JOB_COLUMNS)}", (RUNNING, _now(), os.getpid(), QUEUED)).fetchone()
+        return Job(*row) if row else None
+
+    def progress(self, job_id, done, rows):
+        with self._lock, self._db:
+            self._db.execute("UPDATE jobs SET done_rows = ?, rows = ? WHERE id = ?", (done, rows, job_id))
+
+    def finish(self, job_id, status, invalid_rows=None, error=None):
+        with self._lock, self._db:
+            self._db.execute("UPDATE jobs SET status = ?, finished = ?, invalid_rows = ?, error = ? WHERE id = ?",
+                             (status, _now(), invalid_rows, error, job_id))
+
+    def cancel(self, job_id):
+        """Cancel a queued job at once, or ask its worker to stop a running one."""
+        with self._lock, self._db:
+            self._db.execute("UPDATE jobs SET status = ?, finished = ? WHERE id = ? AND status = ?",
+                             (CANCELLED, _now(), job_id, QUEUED))
+            self._db.execute("UPDATE jobs SET cancel = 1 WHERE id = ? AND status = ?", (job_id, RUNNING))
+
+    def cancel_requested(self, job_ids):
+        if not job_ids:
+            return []
+        with self._lock:
+            rows = self._db.execute(f"SELECT id FROM jobs WHERE cancel = 1 AND id IN ({', '.join('?' * len(job_ids))})",
+                                    list(job_ids)).fetchall()
+        return [row[0] for row in rows]
+
+    def release(self, job_id):
+        """Give a running job back to the queue (its worker is shutting down)."""
+        with self._lock, self._db:
+            self._db.execute("UPDATE jobs SET status = ?, worker = NULL, done_rows = 0 WHERE id = ? AND status = ?",
+                             (QUEUED, job_id, RUNNING))
+
+    def requeue_orphans(self):
+        """Put jobs whose worker process is gone back in the queue; returns how many."""
+        with self._lock, self._db:
+            running = self._db.execute("SELECT id, worker FROM jobs WHERE status = ?", (RUNNING,)).fetchall()
+            orphans = [job_id for job_id, pid in running if pid is None or not _alive(pid)]
+            self._db.executemany("UPDATE jobs SET status = ?, worker = NULL, done_rows = 0 WHERE id = ?",
+                                 [(QUEUED, job_id) for job_id in orphans])
+        return len(orphans)
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._db.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job(*row) if row else None
+
+    def jobs(self, owner=None, limit=20):
+        """Latest jobs first, all or one owner's."""
+        query = f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs"
+        params = []
+        if owner is not None:
+            query += " WHERE owner = ?"
+            params.append(owner)
+        query += f" ORDER BY id DESC LIMIT {int(limit)}"
+        with self._lock:
+            return [Job(*row) for row in self._db.execute(query, params).fetchall()]
+
+    def ahead(self, job_id):
+        """Number of queued jobs that will start before ``job_id``."""
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = ? AND id < ?",
+                                    (QUEUED, job_id)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def describe(queue, job):
+    """One line of status for a job, as shown in the app and the CLI."""
+    label = f"Job {job.id} ({job.calculator}, {job.name})"
+    if job.status == QUEUED:
+        ahead = queue.ahead(job.id)
+        return f"{label}: queued" + (f", {ahead} job{'s' if ahead != 1 else ''} ahead" if ahead else ", next")
+    if job.status == RUNNING:
+        if job.cancel:
+            return f"{label}: cancelling"
+        if job.rows:
+            return f"{label}: running, {job.done_rows:,} of {job.rows:,} rows"
+        return f"{label}: starting"
+    if job.status == DONE:
+        return (f"{label}: {job.rows:,} rows calculated: {job.rows - job.invalid_rows:,} valid, "
+                f"{job.invalid_rows:,} with missing or invalid inputs (see the code column).")
+    if job.status == FAILED:
+        return f"{label}: failed: {job.error}"
+    return f"{label}: cancelled"
+
+
+async def _run(queue, job, progress):
+    from engine import tasks
+    from engine.soil_tests import normalize_soil_tests
+    from engine.store import record_batch_in_background
+
+    frame = await asyncio.to_thread(lambda: normalize_soil_tests(pd.read_csv(queue.input_path(job.id))))
+    progress[job.id] = (0, len(frame))
+    result = await tasks.run_batch(job.calculator, frame,
+                                   on_progress=lambda done, total: progress.__setitem__(job.id, (done, total)))
+    path = queue.result_path(job.id)
+    staged = path.with_suffix(".part")
+    await asyncio.to_thread(lambda: pd.concat([frame, result], axis=1).to_csv(staged, index=False))
+    staged.replace(path)
+    record_batch_in_background(job.calculator, frame, result)
+    return len(frame), int((result["code"] != 0).sum())
+
+
+async def work(queue, concurrency=1, poll=0.5, until_empty=False):
+    """Run queued jobs, ``concurrency`` at a time, until cancelled (or the queue is empty).
+
+    Progress is written to the queue every ``poll`` seconds, and all queue
+    writes run off the event loop, so the worker can share a loop with the app.
+    """
+    await asyncio.to_thread(queue.requeue_orphans)
+    running = {}
+    progress = {}
+    stopped = set()
+
+    async def run(job):
+        try:
+            rows, invalid = await _run(queue, job, progress)
+        except asyncio.CancelledError:
+            # Cancelled by its owner, or unfinished because the worker is stopping
+            if job.id in stopped:
+                await asyncio.shield(asyncio.to_thread(queue.finish, job.id, CANCELLED))
+            else:
+                await asyncio.shield(asyncio.to_thread(queue.release, job.id))
+            raise
+        except Exception as error:
+            await asyncio.to_thread(queue.finish, job.id, FAILED, error=str(error) or type(error).__name__)
+        else:
+            await asyncio.to_thread(queue.progress, job.id, rows, rows)
+            await asyncio.to_thread(queue.finish, job.id, DONE, invalid_rows=invalid)
+        finally:
+            progress.pop(job.id, None)
+            stopped.discard(job.id)
+
+    try:
+        while True:
+            for job_id, task in list(running.items()):
+                if task.done():
+                    running.pop(job_id)
+            for job_id, (done, rows) in list(progress.items()):
+                await asyncio.to_thread(queue.progress, job_id, done, rows)
+            for job_id in await asyncio.to_thread(queue.cancel_requested, list(running)):
+                stopped.add(job_id)
+                running[job_id].cancel()
+            while len(running) < concurrency:
+                job = await asyncio.to_thread(queue.claim)
+                if job is None:
+                    break
+                running[job.id] = asyncio.create_task(run(job))
+            if until_empty and not running:
+                return
+            await asyncio.sleep(poll)
+    finally:
+        for task in running.values():
+            task.cancel()
+        await asyncio.gather(*running.values(), return_exceptions=True)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+_worker = None
+
+
+def get_queue():
+    """Process-wide queue in $FERTRECKS_JOBS_DIR (default ``fertrecks-jobs``).
+
+    At most $FERTRECKS_JOB_CAPACITY (default 20) jobs are queued or running.
+    """
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue(os.environ.get("FERTRECKS_JOBS_DIR", "fertrecks-jobs"),
+                              capacity=int(os.environ.get("FERTRECKS_JOB_CAPACITY", 20)))
+        return _queue
+
+
+def ensure_worker():
+    """Start this process's worker on the running event loop, once.
+
+    It runs $FERTRECKS_JOB_CONCURRENCY (default 1) jobs at a time. Set it to
+    0 to leave the jobs to separate ``python -m engine.jobs worker`` processes.
+    """
+    global _worker
+    concurrency = int(os.environ.get("FERTRECKS_JOB_CONCURRENCY", 1))
+    if concurrency > 0 and (_worker is None or _worker.done()):
+        _worker = asyncio.get_running_loop().create_task(work(get_queue(), concurrency))
+    return _worker
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Queue batch calculations and follow their progress.")
+    parser.add_argument("--dir", default=os.environ.get("FERTRECKS_JOBS_DIR", "fertrecks-jobs"),
+                        help="queue directory (default: $FERTRECKS_JOBS_DIR or fertrecks-jobs)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    submit = commands.add_parser("submit", help="queue a CSV for a calculator")
+    submit.add_argument("calculator")
+    submit.add_argument("input")
+    submit.add_argument("--wait", action="store_true", help="print progress until the job ends")
+    status = commands.add_parser("status", help="show recent jobs, or one job")
+    status.add_argument("job", type=int, nargs="?")
+    cancel = commands.add_parser("cancel", help="cancel a queued or running job")
+    cancel.add_argument("job", type=int)
+    result = commands.add_parser("result", help="copy a finished job's results")
+    result.add_argument("job", type=int)
+    result.add_argument("output")
+    worker = commands.add_parser("worker", help="run queued jobs until interrupted")
+    worker.add_argument("--concurrency", type=int, default=1)
+    worker.add_argument("--until-empty", action="store_true", help="exit once no job is queued or running")
+    args = parser.parse_args(argv)
+
+    from engine.batch import CALCULATORS
+
+    queue = JobQueue(args.dir, capacity=int(os.environ.get("FERTRECKS_JOB_CAPACITY", 20)))
+    if args.command == "submit":
+        if args.calculator not in CALCULATORS:
+            parser.error(f"unknown calculator {args.calculator!r} (choose from {', '.join(sorted(CALCULATORS))})")
+        try:
+            job_id = queue.submit(args.calculator, args.input)
+        except QueueFull as error:
+            print(error, file=sys.stderr)
+            sys.exit(2)
+        print(f"Job {job_id} queued")
+        while args.wait:
+            job = queue.get(job_id)
+            print(describe(queue, job), flush=True)
+            if job.status not in ACTIVE:
+                break
+            time.sleep(1)
+    elif args.command == "status":
+        for job in [queue.get(args.job)] if args.job else queue.jobs():
+            print(describe(queue, job) if job else f"No job {args.job}")
+    elif args.command == "cancel":
+        queue.cancel(args.job)
+        print(describe(queue, queue.get(args.job)))
+    elif args.command == "result":
+        job = queue.get(args.job)
+        if job is None or job.status != DONE:
+            parser.error(f"job {args.job} has no results" + (f" ({job.status})" if job else ""))
+        shutil.copyfile(queue.result_path(job.id), args.output)
+    else:
+        try:
+            asyncio.run(work(queue, args.concurrency, until_empty=args.until_empty))
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
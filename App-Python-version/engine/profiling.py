@@ -0,0 +1,212 @@
+"""Opt-in profiling of individual app sessions.
+
+Profiling is only possible when the server starts with $FERTRECKS_PROFILE_DIR
+set; without it nothing is installed and sessions run exactly as before.
+With it, an admin switches profiling on and off while the server runs:
+
+    python -m engine.profiling on       # sessions started from now on are profiled
+    python -m engine.profiling off
+    python -m engine.profiling report   # slowest reactive nodes over the saved sessions
+
+Each reactive effect, calc and output of a profiled session runs under its
+own cProfile profiler (a node that triggers another hands over to it, so
+times are per node). When the session ends, its directory gets
+``<session>.pstats`` (for pstats / snakeviz), ``<session>.folded``
+(collapsed stacks for flamegraph.pl or speedscope) and ``<session>.csv``
+(runs, total, mean and max seconds per node). Unprofiled sessions only pay
+one dictionary lookup per reactive node created, never per run.
+
+Python allows one active profiler per thread, so a node that awaits while
+another profiled session runs loses the rest of its call detail; its
+wall time in the .csv is still complete.
+"""
+
+import argparse
+import cProfile
+import csv
+import os
+import pstats
+import time
+import weakref
+from datetime import datetime
+from pathlib import Path
+
+ENV = "FERTRECKS_PROFILE_DIR"
+
+_sessions = weakref.WeakKeyDictionary()
+_installed = False
+
+
+def profile_dir():
+    return Path(os.environ[ENV]) if os.environ.get(ENV) else None
+
+
+class SessionProfile:
+    """Per-node profilers and timings of one session."""
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.started = datetime.now()
+        self.profilers = {}
+        self.timings = {}
+        self.stack = []
+
+    def wrap(self, label, fn):
+        async def profiled():
+            profiler = self.profilers.setdefault(label, cProfile.Profile())
+            if self.stack:
+                self.stack[-1].disable()
+            self.stack.append(profiler)
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                return await fn()
+            finally:
+                profiler.disable()
+                seconds = time.perf_counter() - start
+                self.stack.pop()
+                if self.stack:
+                    self.stack[-1].enable()
+                runs, total, longest = self.timings.get(label, (0, 0.0, 0.0))
+                self.timings[label] = (runs + 1, total + seconds, max(longest, seconds))
+        return profiled
+
+    def save(self, directory):
+        """Write the session's .pstats, .folded and .csv files; returns their common stem."""
+        directory.mkdir(parents=True, exist_ok=True)
+        stem = directory / f"{self.started:%Y%m%d-%H%M%S}-{self.session_id}"
+        profiled = [p for p in self.profilers.values() if p.getstats()]
+        if profiled:
+            pstats.Stats(*profiled).dump_stats(f"{stem}.pstats")
+        with open(f"{stem}.folded", "w") as f:
+            for label, profiler in self.profilers.items():
+                if profiler.getstats():
+                    for stack, seconds in _folded(pstats.Stats(profiler).stats):
+                        f.write(f"{label};{stack} {round(seconds * 1e6)}\n")
+        with open(f"{stem}.csv", "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["node", "runs", "total_s", "mean_s", "max_s"])
+            for label, (runs, total, longest) in sorted(self.timings.items(), key=lambda item: -item[1][1]):
+                writer.writerow([label, runs, f"{total:.6f}", f"{total / runs:.6f}", f"{longest:.6f}"])
+        return stem
+
+
+def _name(func):
+    filename, line, name = func
+    return f"{name} ({Path(filename).name}:{line})" if line else name
+
+
+def _folded(stats, depth=64, smallest=5e-7):
+    """Collapsed stacks (stack, seconds) from a cProfile call graph.
+
+    cProfile keeps callers, not stacks, so each function's time is split
+    between its callers in proportion to the time each spent in it.
+    Branches worth less than ``smallest`` seconds are left out.
+    """
+    callees = {}
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, (_, _, _, cumulative) in callers.items():
+            callees.setdefault(caller, []).append((func, cumulative))
+    roots = [func for func, (_, _, _, _, callers) in stats.items() if not callers]
+
+    def walk(func, path, share):
+        own = stats[func][2]
+        names = path + [_name(func)]
+        if own * share >= smallest:
+            yield ";".join(names), own * share
+        if len(names) >= depth:
+            return
+        for callee, edge in callees.get(func, ()):
+            if share * edge < smallest or _name(callee) in names:
+                continue
+            yield from walk(callee, names, share * edge / stats[callee][3])
+
+    for root in roots:
+        yield from walk(root, [], 1.0)
+
+
+def _label(effect):
+    fn = effect._fn
+    # Output observers are closures over the output's name
+    if fn.__name__ == "output_obs" and fn.__closure__:
+        cells = dict(zip(fn.__code__.co_freevars, (cell.cell_contents for cell in fn.__closure__)))
+        if "output_name" in cells:
+            return f"output {cells['output_name']}"
+    session = effect._session
+    name = effect.__name__
+    return session.ns(name) if hasattr(session, "ns") else name
+
+
+def _root(session):
+    return session.root_scope() if hasattr(session, "root_scope") else session
+
+
+def _install():
+    # Wrap nodes as they are created, and only those of profiled sessions
+    global _installed
+    if _installed:
+        return
+    from shiny.reactive import _reactives
+
+    for cls in (_reactives.Effect_, _reactives.Calc_):
+        original = cls.__init__
+
+        def __init__(self, *args, _original=original, **kwargs):
+            _original(self, *args, **kwargs)
+            session = getattr(self, "_session", None)
+            profile = _sessions.get(_root(session)) if session is not None else None
+            if profile is not None:
+                self._fn = profile.wrap(_label(self), self._fn)
+
+        cls.__init__ = __init__
+    _installed = True
+
+
+def start(session):
+    """Profile ``session`` if profiling is available and switched on; call first in the app's server."""
+    directory = profile_dir()
+    if directory is None or not (directory / "enabled").exists():
+        return None
+    _install()
+    profile = _sessions[session] = SessionProfile(session.id)
+    session.on_ended(lambda: profile.save(directory))
+    return profile
+
+
+def report(directory, top=20):
+    """Nodes with the most total time across the saved sessions' .csv files."""
+    totals = {}
+    for path in sorted(Path(directory).glob("*.csv")):
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                runs, total, longest = totals.get(row["node"], (0, 0.0, 0.0))
+                totals[row["node"]] = (runs + int(row["runs"]), total + float(row["total_s"]),
+                                       max(longest, float(row["max_s"])))
+    ranked = sorted(totals.items(), key=lambda item: -item[1][1])[:top]
+    lines = [f"{'node':<40} {'runs':>7} {'total s':>9} {'mean ms':>9} {'max ms':>9}"]
+    for node, (runs, total, longest) in ranked:
+        lines.append(f"{node:<40} {runs:>7} {total:>9.3f} {total / runs * 1000:>9.1f} {longest * 1000:>9.1f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Switch session profiling on or off, or summarize it.")
+    parser.add_argument("action", choices=["on", "off", "report"])
+    parser.add_argument("--dir", default=os.environ.get(ENV), help=f"profile directory (default: ${ENV})")
+    args = parser.parse_args(argv)
+    if not args.dir:
+        parser.error(f"set ${ENV} (as for the server) or pass --dir")
+    directory = Path(args.dir)
+    if args.action == "on":
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / "enabled").touch()
+        print(f"Profiling new sessions into {directory}")
+    elif args.action == "off":
+        (directory / "enabled").unlink(missing_ok=True)
+        print("Profiling off for new sessions")
+    else:
+        print(report(directory))
+
+
+if __name__ == "__main__":
+    main()
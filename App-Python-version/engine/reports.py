@@ -0,0 +1,269 @@
+import argparse
+import hashlib
+import html
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from string import Template
+
+import numpy as np
+import pandas as pd
+
+from engine import validation
+from engine.batch import CALCULATORS, flag_masks
+from engine.results import NOT_NEEDED, NOTES, NUTRIENT_NAMES
+from engine.store import RATE_COLUMNS
+
+TEMPLATE = Path(__file__).parent / "templates" / "field_report.html"
+WWW = Path(__file__).resolve().parent.parent / "www"
+
+# Report sections, in page order
+SECTIONS = {
+    "nitrogen": "Nitrogen",
+    "phosphorus": "Phosphorus (Sufficiency)",
+    "phosphorus_build": "Phosphorus (Build & Maintenance)",
+    "potassium": "Potassium (Sufficiency)",
+    "potassium_build": "Potassium (Build & Maintenance)",
+    "sulfur": "Sulfur",
+    "micronutrients": "Micronutrients",
+    "lime": "Lime",
+    "crop_removal": "Crop Removal",
+}
+
+# The reference tables shown in the app, added under the matching sections
+FIGURES = {
+    "lime": ("lime_table.png", "Lime Recommendation Table"),
+    "crop_removal": ("crop_removal_table.png", "Crop Removal Table"),
+}
+
+SECTION = Template(
+    '<h2>$title</h2>\n<table>\n<tr><th>Crop</th><th>Nutrient</th><th>Rate</th><th>Notes</th></tr>\n$rows</table>\n'
+)
+ROW = Template('<tr><td>$crop</td><td>$nutrient</td><td class="rate">$rate</td><td>$notes</td></tr>\n')
+INVALID_ROW = Template('<tr><td>$crop</td><td>$nutrient</td><td class="rate">&mdash;</td>'
+                       '<td class="invalid">$notes</td></tr>\n')
+FIGURE = Template('<h3>$title</h3>\n<img src="assets/$image" alt="$title">\n')
+
+# Report notes per Recommendation flag, as the app shows them
+FLAG_NOTES = dict(NOTES, **{NOT_NEEDED: "Not needed"})
+
+
+def _rates(calculator, frame):
+    # Batch output files already carry the results; plain input files (or
+    # outputs missing newer columns) are calculated here
+    columns = CALCULATORS[calculator][0](frame.iloc[:0]).columns
+    if all(column in frame for column in columns):
+        return frame
+    result = CALCULATORS[calculator][0](frame)
+    return pd.concat([frame.drop(columns=[c for c in result if c in frame]), result], axis=1)
+
+
+PROBLEMS = {
+    validation.MISSING: "missing values",
+    validation.NOT_NUMERIC: "values that are not numbers",
+    validation.OUT_OF_RANGE: "values out of range",
+    validation.UNKNOWN_CATEGORY: "unknown choices",
+    validation.UNIT_MISMATCH: "units that do not match the crop",
+}
+
+
+def _problems(codes):
+    # Spelled-out validation codes, worked out once per distinct code
+    uniques, inverse = np.unique(codes, return_inverse=True)
+    text = ["Not calculated: " + ", ".join(p for bit, p in PROBLEMS.items() if code & bit) + "." for code in uniques]
+    return np.array(text, dtype=object)[inverse]
+
+
+def _number_text(values):
+    return pd.to_numeric(values, errors="coerce").map("{:g}".format)
+
+
+def collect(results):
+    """Long table of report lines from ``{calculator: frame}``.
+
+    Each frame is a batch input or output file with a ``field_id`` column.
+    Returns one row per field, calculator and nutrient, sorted by field and
+    section.
+    """
+    parts = []
+    for calculator, frame in results.items():
+        if "field_id" not in frame:
+            raise ValueError(f"{calculator}: a field_id column is needed to build per-field reports")
+        frame = _rates(calculator, frame)
+        field_id = frame["field_id"].astype(object).where(frame["field_id"].notna(), "unassigned").astype(str)
+        crop = frame["crop"].astype(object).where(frame["crop"].notna(), "") if "crop" in frame \
+            else pd.Series("", index=frame.index, dtype=object)
+        code = frame["code"].fillna(0).to_numpy(dtype=np.int64)
+
+        for column, (nutrient, unit) in RATE_COLUMNS[calculator].items():
+            rate = frame[column].to_numpy(dtype=float)
+            notes = np.full(len(frame), "", dtype=object)
+            # The same flags the single-field calculators attach, with the app's notes
+            for flag, mask in flag_masks(calculator, column, frame).items():
+                notes[mask] = np.where(notes[mask] == "", FLAG_NOTES[flag], notes[mask] + " " + FLAG_NOTES[flag])
+            if calculator.endswith("_build"):
+                total = _number_text(frame[column.replace("_yearly", "_total")])
+                years = _number_text(frame["years"])
+                notes = ("Total " + total + " lb/a over " + years + " years; rate shown is per year").to_numpy(
+                    dtype=object)
+            # Rows without a soil test value for this nutrient have nothing to report
+            skip = np.isnan(rate) & (code == 0)
+            invalid = code != 0
+            notes[invalid] = _problems(code[invalid])
+            parts.append(pd.DataFrame({
+                "field_id": field_id.to_numpy(), "section": list(SECTIONS).index(calculator),
+                "calculator": calculator, "crop": crop.to_numpy(), "nutrient": nutrient, "unit": unit,
+                "rate": rate, "valid": ~invalid, "notes": notes,
+            })[~skip])
+
+    lines = pd.concat(parts, ignore_index=True)
+    return lines.sort_values(["field_id", "section"], kind="stable", ignore_index=True)
+
+
+def _fields(lines):
+    # (field_id, file name, rows) per field from the sorted line table
+    field_ids = lines["field_id"].to_numpy()
+    bounds = np.flatnonzero(field_ids[1:] != field_ids[:-1]) + 1
+    rows = list(lines[["calculator", "crop", "nutrient", "unit", "rate", "valid", "notes"]].itertuples(
+        index=False, name=None))
+    starts = [0, *bounds.tolist()]
+    ends = [*bounds.tolist(), len(rows)]
+    ids = [field_ids[s] for s in starts] if len(rows) else []
+    names = report_names(ids)
+    return [(field_id, names[field_id], rows[s:e]) for field_id, s, e in zip(ids, starts, ends)]
+
+
+_page = None
+_out_dir = None
+_pdf = False
+
+
+def _init_worker(template_text, out_dir, pdf):
+    # Runs once per worker process: the page template is parsed here, not per report
+    global _page, _out_dir, _pdf
+    _page = Template(template_text)
+    _out_dir = Path(out_dir)
+    _pdf = pdf
+
+
+def _format_rate(rate, unit, nutrient):
+    if nutrient == "ECC":
+        unit = "lb ECC/a"
+    return f"{rate:,.0f} {unit}"
+
+
+def render_field(field_id, rows, generated):
+    """HTML report for one field."""
+    sections = []
+    current, body = None, []
+    for calculator, crop, nutrient, unit, rate, valid, notes in rows + [(None,) * 7]:
+        if calculator != current:
+            if current is not None:
+                sections.append(SECTION.substitute(title=html.escape(SECTIONS[current]), rows="".join(body)))
+                if current in FIGURES:
+                    image, title = FIGURES[current]
+                    sections.append(FIGURE.substitute(title=title, image=image))
+            current, body = calculator, []
+        if calculator is None:
+            break
+        fields = {"crop": html.escape(crop), "nutrient": NUTRIENT_NAMES[nutrient], "notes": html.escape(notes)}
+        if valid:
+            body.append(ROW.substitute(fields, rate=_format_rate(rate, unit, nutrient)))
+        else:
+            body.append(INVALID_ROW.substitute(fields))
+    return _page.substitute(field=html.escape(field_id), sections="".join(sections), generated=generated)
+
+
+def report_name(field_id):
+    return re.sub(r"[^\w.-]+", "_", field_id).strip("._") or "field"
+
+
+def report_names(field_ids):
+    """File name (without extension) per field ID, unique within the run.
+
+    IDs that clean up to the same name (``"A 1"`` and ``"A/1"``, or names
+    differing only in case) get a short hash of the ID appended.
+    """
+    names = {field_id: report_name(field_id) for field_id in field_ids}
+    counts = pd.Series(list(names.values()), dtype=object).str.lower().value_counts()
+    return {
+        field_id: f"{name}-{hashlib.sha1(field_id.encode()).hexdigest()[:8]}" if counts[name.lower()] > 1 else name
+        for field_id, name in names.items()
+    }
+
+
+def _render_chunk(chunk, generated):
+    for field_id, name, rows in chunk:
+        page = render_field(field_id, rows, generated)
+        path = _out_dir / f"{name}.html"
+        path.write_text(page, encoding="utf-8")
+        if _pdf:
+            from weasyprint import HTML
+            HTML(string=page, base_url=str(_out_dir)).write_pdf(path.with_suffix(".pdf"))
+    return len(chunk)
+
+
+def generate_reports(results, out_dir, workers=None, pdf=False, chunksize=64, template=TEMPLATE):
+    """Write one report per field to ``out_dir``.
+
+    ``results`` maps calculator names to batch input or output frames with a
+    ``field_id`` column. Fields are rendered in chunks across ``workers``
+    processes (all CPUs by default; 1 renders in this process). Returns
+    ``{"fields", "seconds", "per_second"}``.
+    """
+    if pdf:
+        try:
+            import weasyprint  # noqa: F401
+        except ImportError:
+            raise RuntimeError("PDF reports need weasyprint (pip install weasyprint)") from None
+
+    start = time.perf_counter()
+    out_dir = Path(out_dir)
+    (out_dir / "assets").mkdir(parents=True, exist_ok=True)
+    for image, _ in FIGURES.values():
+        shutil.copyfile(WWW / image, out_dir / "assets" / image)
+
+    fields = _fields(collect(results))
+    chunks = [fields[i:i + chunksize] for i in range(0, len(fields), chunksize)]
+    generated = datetime.now().strftime("%Y-%m-%d %H:%M")
+    init = (Path(template).read_text(encoding="utf-8"), str(out_dir), pdf)
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or len(chunks) <= 1:
+        _init_worker(*init)
+        done = sum(_render_chunk(chunk, generated) for chunk in chunks)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init) as pool:
+            done = sum(pool.map(_render_chunk, chunks, [generated] * len(chunks)))
+
+    seconds = time.perf_counter() - start
+    return {"fields": done, "seconds": seconds, "per_second": done / seconds if seconds else float("inf")}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write per-field recommendation reports from batch files.")
+    parser.add_argument("output_dir")
+    parser.add_argument("files", nargs="+", metavar="CALCULATOR=FILE.csv",
+                        help=f"batch input or output file per calculator ({', '.join(SECTIONS)})")
+    parser.add_argument("--workers", type=int, help="worker processes (default: all CPUs)")
+    parser.add_argument("--pdf", action="store_true", help="also write a PDF per field (needs weasyprint)")
+    parser.add_argument("--template", default=TEMPLATE, help="HTML page template ($field, $sections, ...)")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for item in args.files:
+        calculator, sep, path = item.partition("=")
+        if not sep or calculator not in SECTIONS:
+            parser.error(f"expected CALCULATOR=FILE.csv, got {item!r}")
+        results[calculator] = pd.read_csv(path)
+
+    stats = generate_reports(results, args.output_dir, workers=args.workers, pdf=args.pdf, template=args.template)
+    print(f"{stats['fields']} reports in {stats['seconds']:.1f}s ({stats['per_second']:.0f} reports/s)")
+
+
+if __name__ == "__main__":
+    main()
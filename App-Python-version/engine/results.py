@@ -0,0 +1,77 @@
+from collections import namedtuple
+
+import pandas as pd
+
+# Flags a recommendation can carry alongside its rate
+MINIMUM_N = "minimum_n"          # zero N: 30 lb N/a is still suggested for early growth
+STARTER_ONLY = "starter_only"    # soil test at or above critical level: starter fertilizer only
+SPLIT_LIME = "split_lime"        # over 10,000 lb ECC/a: apply half, retest in 12 to 18 months
+NOT_NEEDED = "not_needed"        # micronutrient above its critical level
+
+SPLIT_LIME_RATE = 10000
+
+# Flags that follow from the rate alone, shared by the single-field and batch
+# calculators; each test works on a number or on a rate array
+RATE_FLAGS = {
+    "nitrogen": ((MINIMUM_N, lambda rate: rate == 0),),
+    "micronutrients": ((NOT_NEEDED, lambda rate: rate == 0),),
+    "lime": ((SPLIT_LIME, lambda rate: rate > SPLIT_LIME_RATE),),
+    "lime_layers": ((SPLIT_LIME, lambda rate: rate > SPLIT_LIME_RATE),),
+}
+
+
+def rate_flags(calculator, rate):
+    return tuple(flag for flag, applies in RATE_FLAGS.get(calculator, ()) if applies(rate))
+
+
+NUTRIENT_NAMES = {
+    "N": "Nitrogen", "P2O5": "Phosphorus (P₂O₅)", "K2O": "Potassium (K₂O)", "S": "Sulfur",
+    "Cl": "Chloride", "B": "Boron", "Zn": "Zinc", "ECC": "Lime"
+}
+
+NOTES = {
+    MINIMUM_N: "Note: A minimum fertilizer N application of 30 lb N/a is recommended for early crop growth and development.",
+    STARTER_ONLY: "Note: The soil test is at or above the critical level; only starter fertilizer is suggested.",
+    SPLIT_LIME: "Note: Above 10,000 lb ECC/a, apply one-half rate, incorporate, wait 12 to 18 months and then retest.",
+}
+
+# One calculated recommendation. ``rate`` is a plain number (None when the
+# inputs were invalid, with the reason in ``error``); ``details`` holds the
+# calculator-specific extras such as the build total or the lime target.
+Recommendation = namedtuple(
+    "Recommendation",
+    ["calculator", "nutrient", "rate", "unit", "crop", "flags", "details", "error"],
+    defaults=("lb/a", None, (), None, None)
+)
+
+
+def failed(calculator, nutrient, error):
+    return Recommendation(calculator, nutrient, None, error=error)
+
+
+def to_frame(recommendations):
+    """Flatten recommendations into one row each, details as extra columns."""
+    rows = []
+    for rec in recommendations:
+        row = {
+            "calculator": rec.calculator, "nutrient": rec.nutrient, "rate": rec.rate, "unit": rec.unit,
+            "crop": rec.crop, "flags": ",".join(rec.flags), "error": rec.error
+        }
+        row.update(rec.details or {})
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def to_json(rec):
+    """A Recommendation, or a plain status message, as JSON-able data (for session snapshots)."""
+    if rec is None or isinstance(rec, str):
+        return rec
+    data = rec._asdict()
+    data["flags"] = list(rec.flags)
+    return data
+
+
+def from_json(data):
+    if data is None or isinstance(data, str):
+        return data
+    return Recommendation(**dict(data, flags=tuple(data["flags"])))
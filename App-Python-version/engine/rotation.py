@@ -0,0 +1,195 @@
+"""Multi-year nitrogen plans for crop rotations.
+
+A rotation is a repeating sequence of crops such as ``Corn,Soybean`` or
+``Wheat,Alfalfa:Good Stand,Alfalfa:Excellent Stand``, where the condition
+after a colon is the stand (or, for fallow, the profile N test) the crop
+leaves for the next year. Each year's crop becomes the next year's previous
+crop, so soybean, legume and fallow credits carry through the plan, and the
+year's crop decides whether the tillage credit applies and which organic
+matter factor is used. Soybean, fallow, alfalfa and clover years take no N.
+
+``plan`` lays out every field × rotation × year as one table and runs it
+through ``nitrogen_batch`` at once. A field's soil test, credits and tillage
+are assumed to hold every year; year 1 follows the field's own
+``previous_crop``, or the rotation's last crop if the field has none.
+Yields come from an expected-yield table (see ``engine.yields``) or a
+default per crop.
+
+    python -m engine.rotation fields.csv plan.csv --years 6 --rotation corn-soy=Corn,Soybean \\
+        --rotation corn=Corn --yield-history yield_history.csv --summary summary.csv
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from engine import tables
+from engine.batch import nitrogen_batch
+from engine.validation import _is_blank
+from engine.yields import fill_expected_yields
+
+_CROPS = {crop.lower(): crop for crop in tables.ROTATION_CROPS}
+
+
+_PREVIOUS_CROPS = {crop.lower(): crop for crop in tables.PREVIOUS_CROPS}
+
+
+def default_condition(crop):
+    """The condition the Nitrogen tab starts with for ``crop`` as a previous crop ("" if it has none)."""
+    return _previous_crop_default(tables.ROTATION_PREVIOUS_CROPS[crop])
+
+
+def _previous_crop_default(previous_crop):
+    # Default condition of a Nitrogen tab previous crop (e.g. "Alfalfa"), in any spelling
+    name = _PREVIOUS_CROPS.get(str(previous_crop).strip().lower(), previous_crop)
+    options = tables.PREVIOUS_CROP_CONDITIONS.get(name, [])
+    return "Good Stand" if "Good Stand" in options else (options[0] if options else "")
+
+
+def parse_rotation(steps):
+    """A rotation as a tuple of (crop, condition) pairs, from ``"Corn,Soybean"`` or a list of crops.
+
+    Raises ValueError for unknown crops and conditions.
+    """
+    if isinstance(steps, str):
+        steps = steps.split(",")
+    parsed = []
+    for step in steps:
+        crop, _, condition = step.partition(":") if isinstance(step, str) else (step[0], None, step[1])
+        name = _CROPS.get(crop.strip().lower())
+        if name is None:
+            raise ValueError(f"unknown rotation crop {crop.strip()!r}")
+        options = tables.PREVIOUS_CROP_CONDITIONS.get(tables.ROTATION_PREVIOUS_CROPS[name], [])
+        condition = (condition or "").strip()
+        matched = [option for option in options if option.lower() == condition.lower()]
+        if condition and not matched:
+            raise ValueError(f"{name} has no condition {condition!r}")
+        parsed.append((name, matched[0] if matched else default_condition(name)))
+    if not parsed:
+        raise ValueError("a rotation needs at least one crop")
+    return tuple(parsed)
+
+
+def _schedule(rotations, years):
+    # One row per rotation and year: the crop, and the previous crop and condition it follows
+    rows = []
+    for name, steps in rotations.items():
+        for year in range(years):
+            crop = steps[year % len(steps)][0]
+            previous, condition = steps[(year - 1) % len(steps)]
+            rows.append((name, year + 1, crop, tables.ROTATION_PREVIOUS_CROPS[previous], condition))
+    return pd.DataFrame(rows, columns=["rotation", "year", "crop", "previous_crop", "previous_crop_condition"])
+
+
+def plan(fields, rotations, years, expected=None, default_yields=None):
+    """N rate of every field, rotation and year.
+
+    ``rotations`` maps names to rotations (anything ``parse_rotation``
+    takes). Yields are looked up by ``field_id`` and crop in ``expected``,
+    then in ``default_yields`` (crop: yield). Returns one row per field,
+    rotation and year with the crop, its previous crop and condition,
+    ``n_rate`` and the validation ``code``; no-N crops get a rate of 0.
+    """
+    rotations = {name: parse_rotation(steps) for name, steps in rotations.items()}
+    schedule = _schedule(rotations, years)
+    slots = len(schedule)
+    rows = np.repeat(np.arange(len(fields)), slots)
+    slot = np.tile(np.arange(slots), len(fields))
+
+    field_id = fields["field_id"].to_numpy(dtype=object) if "field_id" in fields \
+        else np.arange(len(fields), dtype=object)
+    long = fields.drop(columns=[c for c in ("field_id", "crop", "yield", "previous_crop", "previous_crop_condition")
+                                if c in fields]).iloc[rows].reset_index(drop=True)
+    long.insert(0, "field_id", field_id[rows])
+    long["rotation"] = schedule["rotation"].to_numpy()[slot]
+    long["year"] = schedule["year"].to_numpy()[slot]
+    long["crop"] = schedule["crop"].to_numpy()[slot]
+
+    # Year 1 follows what the field grew last, where the field says
+    given = ~_is_blank(fields["previous_crop"]) if "previous_crop" in fields else np.zeros(len(fields), dtype=bool)
+    own = (long["year"].to_numpy() == 1) & given[rows]
+    previous = fields["previous_crop"].to_numpy(dtype=object) if "previous_crop" in fields \
+        else np.full(len(fields), "", dtype=object)
+    # A field without a condition of its own gets its previous crop's default, as in the Nitrogen tab
+    condition = fields["previous_crop_condition"] if "previous_crop_condition" in fields \
+        else pd.Series("", index=fields.index, dtype=object)
+    blank = _is_blank(condition)
+    condition = condition.to_numpy(dtype=object).copy()
+    condition[blank] = [_previous_crop_default(crop) for crop in previous[blank]]
+    for column, field in (("previous_crop", previous), ("previous_crop_condition", condition)):
+        chained = schedule[column].to_numpy(dtype=object)[slot]
+        long[column] = np.where(own, field[rows], chained)
+
+    long["yield"] = np.nan
+    if expected is not None:
+        long = fill_expected_yields(long, expected, "nitrogen")
+    if default_yields:
+        long["yield"] = long["yield"].fillna(long["crop"].map(default_yields))
+
+    result = nitrogen_batch(long)
+    no_n = long["crop"].isin(tables.NO_N_CROPS).to_numpy()
+    columns = ["field_id", "rotation", "year", "crop", "previous_crop", "previous_crop_condition"]
+    return long[columns].assign(
+        n_rate=np.where(no_n, 0.0, result["n_rate"].to_numpy()),
+        code=np.where(no_n, 0, result["code"].to_numpy()),
+    )
+
+
+def summary(planned):
+    """Total and yearly average N of each field and rotation, for comparing rotations.
+
+    The totals are blank where a year could not be calculated; those years are counted in ``invalid_years``.
+    """
+    grouped = planned.assign(invalid=planned["code"] != 0).groupby(["field_id", "rotation"], sort=False)
+    result = grouped.agg(years=("year", "size"), invalid_years=("invalid", "sum"),
+                         total_n=("n_rate", "sum")).reset_index()
+    result["total_n"] = result["total_n"].where(result["invalid_years"] == 0)
+    result["average_n"] = np.round(result["total_n"] / result["years"], 1)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Nitrogen rates for every year of one or more crop rotations.")
+    parser.add_argument("input", help="CSV of fields with the nitrogen inputs other than crop and yield")
+    parser.add_argument("output")
+    parser.add_argument("--rotation", action="append", required=True, metavar="NAME=CROPS",
+                        help="a rotation, e.g. corn-soy=Corn,Soybean; may be repeated")
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--yield-history", metavar="RECORDS",
+                        help="expected yields from yield records (field_id, crop, year, yield)")
+    parser.add_argument("--yields", metavar="EXPECTED", help="expected yields (field_id, crop, expected_yield)")
+    parser.add_argument("--yield", dest="default_yields", action="append", default=[], metavar="CROP=YIELD",
+                        help="yield for fields without one of their own; may be repeated")
+    parser.add_argument("--summary", metavar="CSV", help="also write the totals per field and rotation")
+    args = parser.parse_args(argv)
+
+    rotations = {}
+    for text in args.rotation:
+        name, _, steps = text.partition("=")
+        if not steps:
+            parser.error(f"--rotation {text}: expected NAME=CROPS")
+        rotations[name] = steps
+    default_yields = {}
+    for text in args.default_yields:
+        crop, _, value = text.partition("=")
+        default_yields[_CROPS.get(crop.strip().lower(), crop.strip())] = float(value)
+    expected = None
+    if args.yield_history:
+        from engine.yields import expected_yields
+        expected = expected_yields(args.yield_history)
+    elif args.yields:
+        expected = pd.read_csv(args.yields, dtype={"field_id": str})
+
+    try:
+        planned = plan(pd.read_csv(args.input, dtype={"field_id": str}), rotations, args.years, expected,
+                       default_yields)
+    except ValueError as error:
+        parser.error(str(error))
+    planned.to_csv(args.output, index=False)
+    if args.summary:
+        summary(planned).to_csv(args.summary, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import uuid
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+from engine import tables
+
+log = logging.getLogger(__name__)
+
+# name: (table, row width); tables map a key to a number or a tuple of numbers
+LOOKUP_TABLES = {
+    "nitrogen_factors": (tables.NITROGEN_FACTORS, 4),
+    "forage_n": (tables.FORAGE_N, 1),
+    "p_sufficiency": (tables.P_SUFFICIENCY, 4),
+    "k_sufficiency": (tables.K_SUFFICIENCY, 4),
+    "sulfur_factors": (tables.SULFUR_FACTORS, 1),
+    "lime_equations": (tables.LIME_EQUATIONS, 3),
+    "crop_removal": ({crop: row[2:] for crop, row in tables.CROP_REMOVAL.items()}, 2),
+}
+
+# index: {key: row}; values: float matrix, one row per key (None stored as NaN)
+SharedTable = namedtuple("SharedTable", ["index", "values"])
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def _version():
+    # The packed content itself, and this file for the pack layout: a change to either
+    # (including a LOOKUP_TABLES entry) starts a new pack
+    digest = hashlib.sha256(Path(__file__).read_bytes())
+    for name, (table, width) in LOOKUP_TABLES.items():
+        keys, values = _rows(table, width)
+        digest.update(repr((name, width, keys)).encode())
+        digest.update(values.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def shared_dir():
+    """Where the packed tables live: $FERTRECKS_SHARED_DIR, else /dev/shm or the temp directory."""
+    base = os.environ.get("FERTRECKS_SHARED_DIR") or ("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+    return Path(base) / f"fertrecks-tables-{_version()}"
+
+
+def _rows(table, width):
+    keys = list(table)
+    values = np.array([[np.nan if v is None else v for v in (table[k] if width > 1 else (table[k],))] for k in keys],
+                      dtype=float).reshape(len(keys), width)
+    return keys, values
+
+
+def _pack(directory):
+    # Written under a unique name and renamed, so workers starting together never see a partial file
+    directory.mkdir(parents=True, exist_ok=True)
+    keys, offset, blocks = {}, 0, []
+    for name, (table, width) in LOOKUP_TABLES.items():
+        names, values = _rows(table, width)
+        keys[name] = {"keys": names, "offset": offset, "rows": len(names), "width": width}
+        blocks.append(values.ravel())
+        offset += values.size
+    tmp = directory / f"{uuid.uuid4().hex}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, np.concatenate(blocks))
+    tmp.with_suffix(".json").write_text(json.dumps(keys))
+    os.replace(tmp.with_suffix(".json"), directory / "tables.json")
+    os.replace(tmp, directory / "tables.npy")
+
+
+def _load():
+    directory = shared_dir()
+    try:
+        if not (directory / "tables.npy").exists():
+            _pack(directory)
+        layout = json.loads((directory / "tables.json").read_text())
+        packed = np.load(directory / "tables.npy", mmap_mode="r")
+    except OSError as error:
+        # Read-only or missing shared directory: every process keeps its own copy
+        log.warning("Could not map the shared coefficient tables (%s); using private copies", error)
+        return {name: SharedTable({k: i for i, k in enumerate(keys)}, values)
+                for name, (keys, values) in ((n, _rows(*spec)) for n, spec in LOOKUP_TABLES.items())}
+    loaded = {}
+    for name, entry in layout.items():
+        start = entry["offset"]
+        values = packed[start:start + entry["rows"] * entry["width"]].reshape(entry["rows"], entry["width"])
+        loaded[name] = SharedTable({k: i for i, k in enumerate(entry["keys"])}, values)
+    return loaded
+
+
+def table(name):
+    """The lookup table ``name`` as a SharedTable over pages shared by every local process."""
+    with _tables_lock:
+        if not _tables:
+            _tables.update(_load())
+        return _tables[name]
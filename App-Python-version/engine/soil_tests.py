@@ -0,0 +1,105 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from engine import tables
+from engine.validation import _factorize, _is_blank
+
+# Method spellings seen in lab files, compared case-folded without spaces or punctuation
+METHOD_ALIASES = {
+    "mehlich3": "Mehlich-3", "mehlich": "Mehlich-3", "m3": "Mehlich-3", "mehlichiii": "Mehlich-3",
+    "brayp1": "Bray P1", "bray1": "Bray P1", "bray": "Bray P1", "brayi": "Bray P1",
+    "olsen": "Olsen", "olsenp": "Olsen", "sodiumbicarbonate": "Olsen", "nahco3": "Olsen",
+    "ammoniumacetate": "Ammonium Acetate", "nh4oac": "Ammonium Acetate", "aa": "Ammonium Acetate",
+    "nh4ac": "Ammonium Acetate",
+}
+
+# nutrient: (calculator column, method tag column, value column of the long layout,
+#            {column of the wide layout: method}, {method: factor to Mehlich-3})
+SOIL_TESTS = {
+    "P": ("mehlich", "p_method", "p_test",
+          {"mehlich_p": "Mehlich-3", "bray_p1": "Bray P1", "olsen_p": "Olsen"}, tables.P_TEST_METHODS),
+    "K": ("mehlich_k", "k_method", "k_test",
+          {"ammonium_acetate_k": "Ammonium Acetate"}, tables.K_TEST_METHODS),
+}
+
+
+def _canonical(method):
+    if not isinstance(method, str):
+        return None
+    return METHOD_ALIASES.get(re.sub(r"[^a-z0-9]", "", method.lower()), method.strip())
+
+
+def _numbers(raw):
+    # (float values, mask of entries that are present but not numbers)
+    if pd.api.types.is_numeric_dtype(raw.dtype) and not pd.api.types.is_bool_dtype(raw.dtype):
+        return raw.to_numpy(dtype=float, na_value=np.nan), np.zeros(len(raw), dtype=bool)
+    codes, uniques = _factorize(raw)
+    parsed = pd.to_numeric(pd.Series(uniques, dtype=object).map(lambda u: u.strip() if isinstance(u, str) else u),
+                           errors="coerce").to_numpy(dtype=float)
+    values = np.append(parsed, np.nan)[codes]
+    return values, np.isnan(values) & ~_is_blank(raw)
+
+
+def normalize_soil_tests(frame):
+    """Fill the P and K calculator columns from mixed-method lab columns.
+
+    A lab file gives each soil test either in the calculator's own column
+    (``mehlich``, ``mehlich_k``), as a value with a method (``p_test`` and
+    ``p_method``, ``k_test`` and ``k_method``), or in one column per method
+    (``bray_p1``, ``olsen_p``, ``ammonium_acetate_k``, ...). For each row the
+    first of these that is filled is converted to the Mehlich-3 scale (Olsen
+    P × 1.6) and its method is recorded in ``p_method`` / ``k_method`` as a
+    categorical. Methods are resolved once per distinct spelling, so the
+    stage is vectorized over any number of rows. Frames without any of
+    these lab columns are returned unchanged.
+    """
+    if not isinstance(frame, pd.DataFrame):
+        frame = pd.DataFrame(frame)
+    added = {}
+    for column, tag, value_column, wide, factors in SOIL_TESTS.values():
+        lab = ([(frame[value_column], frame[tag])] if value_column in frame and tag in frame else []) + \
+              [(frame[name], method) for name, method in wide.items() if name in frame]
+        if not lab:
+            continue
+        sources = ([(frame[column], "Mehlich-3")] if column in frame else []) + lab
+
+        n = len(frame)
+        methods = list(factors)
+        values = np.full(n, np.nan)
+        method_codes = np.full(n, -1)
+        text = np.zeros(n, dtype=bool)
+        raw_text = np.full(n, None, dtype=object)
+        open_rows = np.ones(n, dtype=bool)
+        for raw, method in sources:
+            numbers, not_numbers = _numbers(raw)
+            present = ~np.isnan(numbers) | not_numbers
+            if isinstance(method, str):
+                row_codes = np.full(n, methods.index(method))
+            else:
+                # Per-row methods: resolved on the distinct spellings, unknown ones kept as given
+                codes, uniques = _factorize(method)
+                names = [_canonical(u) for u in uniques]
+                for name in names:
+                    if name is not None and name not in methods:
+                        methods.append(name)
+                row_codes = np.append([-1 if name is None else methods.index(name) for name in names], -1)[codes]
+            factor = np.append([factors.get(m, np.nan) for m in methods], np.nan)[row_codes]
+            # A value without a known method is skipped, but its method is shown if nothing else fills the row
+            unknown = open_rows & present & np.isnan(factor)
+            method_codes[unknown & (method_codes == -1)] = row_codes[unknown & (method_codes == -1)]
+            filled = open_rows & present & ~np.isnan(factor)
+            values[filled] = (numbers * factor)[filled]
+            if np.any(filled & not_numbers):
+                text |= filled & not_numbers
+                raw_text[filled & not_numbers] = np.asarray(raw, dtype=object)[filled & not_numbers]
+            method_codes[filled] = row_codes[filled]
+            open_rows &= ~filled
+
+        # Entries that are not numbers stay as given, so validation reports them
+        added[column] = np.where(text, raw_text, values) if text.any() else values
+        added[tag] = pd.Categorical.from_codes(method_codes, categories=methods)
+    if not added:
+        return frame
+    return frame.assign(**added)
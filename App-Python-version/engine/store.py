@@ -0,0 +1,272 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from itertools import repeat
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from engine.batch import flag_masks
+
+log = logging.getLogger(__name__)
+
+# calculator: {result column: (nutrient, unit)}
+RATE_COLUMNS = {
+    "nitrogen": {"n_rate": ("N", "lb/a")},
+    "phosphorus": {"p2o5_rate": ("P2O5", "lb/a")},
+    "phosphorus_build": {"p2o5_yearly": ("P2O5", "lb/a")},
+    "potassium": {"k2o_rate": ("K2O", "lb/a")},
+    "potassium_build": {"k2o_yearly": ("K2O", "lb/a")},
+    "sulfur": {"s_rate": ("S", "lb/a")},
+    "micronutrients": {"cl_rate": ("Cl", "lb/a"), "b_rate": ("B", "lb/a"), "zn_rate": ("Zn", "lb/a")},
+    "lime": {"ecc_rate": ("ECC", "lb/a")},
+    "lime_layers": {"ecc_rate": ("ECC", "lb/a")},
+    "crop_removal": {"p2o5_removal": ("P2O5", "lb/a"), "k2o_removal": ("K2O", "lb/a")},
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recommendations (
+    id INTEGER PRIMARY KEY,
+    created TEXT NOT NULL,
+    field_id TEXT,
+    crop TEXT,
+    calculator TEXT NOT NULL,
+    nutrient TEXT NOT NULL,
+    rate REAL,
+    unit TEXT,
+    source TEXT NOT NULL,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS recommendations_field ON recommendations (field_id, created);
+CREATE INDEX IF NOT EXISTS recommendations_crop ON recommendations (crop, created);
+CREATE INDEX IF NOT EXISTS recommendations_nutrient ON recommendations (nutrient, created);
+CREATE INDEX IF NOT EXISTS recommendations_created ON recommendations (created);
+CREATE TABLE IF NOT EXISTS snapshots (
+    token TEXT NOT NULL,
+    module TEXT NOT NULL,
+    updated TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (token, module)
+);
+CREATE INDEX IF NOT EXISTS snapshots_updated ON snapshots (updated);
+"""
+
+COLUMNS = ["created", "field_id", "crop", "calculator", "nutrient", "rate", "unit", "source", "details"]
+
+
+class ResultStore:
+    """Local SQLite history of every recommendation, interactive or batch."""
+
+    def __init__(self, path, batch_size=50000):
+        self.path = str(path)
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA cache_size=-65536")
+        self._db.executescript(SCHEMA)
+        # Reads use a read-only connection per thread: in WAL mode they see the last
+        # commit and never wait for the writer lock, held for all of a batch insert
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+
+    def _reader(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(f"{Path(self.path).resolve().as_uri()}?mode=ro", uri=True,
+                                 check_same_thread=False)
+            self._local.db = db
+            with self._readers_lock:
+                self._readers.append(db)
+        return db
+
+    def record(self, calculator, nutrient, rate, unit="lb/a", crop=None, field_id=None,
+               source="interactive", details=None):
+        row = (datetime.now().isoformat(timespec="seconds"), field_id or None, crop, calculator,
+               nutrient, rate, unit, source, json.dumps(details) if details else None)
+        with self._lock, self._db:
+            self._db.execute(f"INSERT INTO recommendations ({', '.join(COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             row)
+
+    def record_result(self, rec, field_id=None, source="interactive"):
+        """Save a Recommendation; failed ones are not recorded."""
+        if rec.error is not None:
+            return
+        details = dict(rec.details or {})
+        if rec.flags:
+            details["flags"] = list(rec.flags)
+        self.record(rec.calculator, rec.nutrient, rec.rate, unit=rec.unit, crop=rec.crop, field_id=field_id,
+                    source=source, details=details)
+
+    def record_batch(self, calculator, inputs, result, source="batch"):
+        """Insert the valid rows of a batch result, ``batch_size`` rows per executemany."""
+        created = datetime.now().isoformat(timespec="seconds")
+        n = len(result)
+        valid = result["code"].to_numpy() == 0
+        field_ids = _column(inputs, "field_id", n)
+        crops = _column(inputs, "crop", n)
+        # Inserting in field order keeps the field index writes mostly sequential
+        order = np.argsort(pd.factorize(field_ids, sort=True)[0], kind="stable")
+
+        rows = 0
+        with self._lock, self._db:
+            for column, (nutrient, unit) in RATE_COLUMNS[calculator].items():
+                rates = result[column].to_numpy(dtype=float)
+                details = _batch_details(calculator, column, inputs, result)
+                keep = order[(valid & ~np.isnan(rates))[order]]
+                for start in range(0, len(keep), self.batch_size):
+                    chunk = keep[start:start + self.batch_size]
+                    self._db.executemany(
+                        f"INSERT INTO recommendations ({', '.join(COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        zip(repeat(created), field_ids[chunk].tolist(), crops[chunk].tolist(), repeat(calculator),
+                            repeat(nutrient), rates[chunk].tolist(), repeat(unit), repeat(source),
+                            details[chunk].tolist())
+                    )
+                rows += len(keep)
+        return rows
+
+    def history(self, field_id=None, crop=None, nutrient=None, since=None, until=None, limit=None):
+        """Recommendations matching the given filters, newest first."""
+        clauses, params = [], []
+        for column, value in (("field_id", field_id), ("crop", crop), ("nutrient", nutrient)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("created >= ?")
+            params.append(str(since))
+        if until is not None:
+            clauses.append("created < ?")
+            params.append(str(until))
+        query = f"SELECT {', '.join(COLUMNS)} FROM recommendations"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY created DESC, id DESC"
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+        return pd.read_sql_query(query, self._reader(), params=params)
+
+    def save_snapshot(self, token, module, state):
+        """Keep a tab's latest state (a JSON-able dict) for the browser holding ``token``."""
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO snapshots (token, module, updated, state) VALUES (?, ?, ?, ?)",
+                             (token, module, datetime.now().isoformat(timespec="seconds"), json.dumps(state)))
+
+    def load_snapshot(self, token, module):
+        row = self._reader().execute("SELECT state FROM snapshots WHERE token = ? AND module = ?",
+                                     (token, module)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def prune_snapshots(self, days=30):
+        """Forget tab states not updated in the last ``days`` days; returns how many."""
+        cutoff = (datetime.now() - timedelta(days=days)).isoformat(timespec="seconds")
+        with self._lock, self._db:
+            return self._db.execute("DELETE FROM snapshots WHERE updated < ?", (cutoff,)).rowcount
+
+    def close(self):
+        with self._readers_lock:
+            for db in self._readers:
+                db.close()
+        with self._lock:
+            self._db.close()
+
+
+def _batch_details(calculator, column, inputs, result):
+    # The details JSON record_result would save for each row (None when empty).
+    # Rows are keyed by their flags and detail values, and each distinct key is
+    # rendered once: a batch has few of them
+    n = len(result)
+    masks = flag_masks(calculator, column, result)
+    key = np.zeros(n, dtype=np.int64)
+    for bit, mask in enumerate(masks.values()):
+        key |= mask.astype(np.int64) << bit
+
+    values = {}
+    if calculator.endswith("_build"):
+        values["total"] = result[column.replace("_yearly", "_total")].to_numpy(dtype=float)
+        values["years"] = pd.to_numeric(pd.Series(_column(inputs, "years", n)), errors="coerce").to_numpy(dtype=float)
+    for array in values.values():
+        codes, uniques = pd.factorize(array, use_na_sentinel=True)
+        key = key * (len(uniques) + 1) + codes + 1
+
+    _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+    texts = []
+    for row in first:
+        details = {name: _plain(array[row]) for name, array in values.items() if not np.isnan(array[row])}
+        flags = [flag for flag, mask in masks.items() if mask[row]]
+        if flags:
+            details = {"flags": flags, **details}
+        texts.append(json.dumps(details) if details else None)
+    return np.array(texts, dtype=object)[inverse]
+
+
+def _plain(value):
+    # 420.0 is saved as 420, like the interactive calculators' whole numbers
+    return int(value) if float(value).is_integer() else value
+
+
+def _column(frame, name, n):
+    if frame is not None and name in frame:
+        values = pd.Series(frame[name]).astype(object)
+        return values.where(values.notna(), None).to_numpy()
+    return np.full(n, None, dtype=object)
+
+
+_store = None
+_store_lock = threading.Lock()
+_writer = None
+
+
+def get_store():
+    """Process-wide store at $FERTRECKS_DB (default ``fertrecks.db``)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ResultStore(os.environ.get("FERTRECKS_DB", "fertrecks.db"))
+        return _store
+
+
+def record_in_background(rec, field_id=None, source="interactive"):
+    """Save a Recommendation on the store's writer thread.
+
+    Sessions call this from the event loop: it never waits for SQLite (which
+    may be busy with a large batch insert), and a failed write is logged
+    instead of failing the calculation.
+    """
+    return _submit(lambda: get_store().record_result(rec, field_id=field_id, source=source))
+
+
+def record_batch_in_background(calculator, inputs, result, source="batch"):
+    """Save the valid rows of a batch result on the store's writer thread."""
+    return _submit(lambda: get_store().record_batch(calculator, inputs, result, source=source))
+
+
+def save_snapshot_in_background(token, module, state):
+    """Save a tab's state on the store's writer thread."""
+    return _submit(lambda: get_store().save_snapshot(token, module, state))
+
+
+def prune_snapshots_in_background(days=30):
+    return _submit(lambda: get_store().prune_snapshots(days))
+
+
+def _submit(write):
+    global _writer
+    with _store_lock:
+        if _writer is None:
+            _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fertrecks-store")
+    future = _writer.submit(write)
+    future.add_done_callback(_log_failure)
+    return future
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        log.error("Could not save results to the history store", exc_info=future.exception())
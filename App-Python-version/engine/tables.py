@@ -0,0 +1,266 @@
+# Crop choices and yield units (MF2586) shared by the interactive modules
+# and the batch engine.
+
+NITROGEN_CROPS = [
+    "Corn", "Grain Sorghum", "Wheat", "Sunflower", "Oats",
+    "Corn Silage", "Sorghum Silage", "Brome", "Fescue", "Bermudagrass"
+]
+EFFICIENCY_CROPS = ["Corn", "Grain Sorghum", "Wheat"]
+FORAGE_CROPS = ["Brome", "Fescue", "Bermudagrass"]
+GRAIN_CROPS = [crop for crop in NITROGEN_CROPS if crop not in FORAGE_CROPS]
+FORAGE_YIELDS = [2, 4, 6, 8, 10]
+TILLAGE_CREDITS = [0, 20]
+
+PREVIOUS_CROPS = [
+    "Corn/Wheat", "Sorghum/Sunflower", "Soybean", "Fallow",
+    "Alfalfa", "Red Clover", "Sweet Clover"
+]
+PREVIOUS_CROP_CONDITIONS = {
+    "Alfalfa": ["Excellent Stand", "Good Stand", "Fair Stand", "Poor Stand"],
+    "Red Clover": ["Excellent Stand", "Good Stand", "Poor Stand"],
+    "Sweet Clover": ["Excellent Stand", "Good Stand", "Poor Stand"],
+    "Fallow": ["Without Profile N Test", "With Profile N Test"]
+}
+CONDITIONS = sorted({c for options in PREVIOUS_CROP_CONDITIONS.values() for c in options})
+
+SUFFICIENCY_CROPS = [
+    "Corn", "Wheat", "Grain Sorghum", "Soybean", "Sunflower", "Oats",
+    "Corn Silage", "Sorghum Silage", "Brome and Fescue", "New Brome and Fescue",
+    "Bermudagrass", "New Bermudagrass", "Alfalfa and Clover", "New Alfalfa and Clover"
+]
+BUILD_CROPS = [
+    "Corn", "Wheat", "Grain Sorghum", "Soybean", "Sunflower", "Oats",
+    "Corn Silage", "Sorghum Silage", "Alfalfa and Clover"
+]
+
+SULFUR_CROPS = [
+    "Corn", "Grain Sorghum", "Corn Silage", "Sorghum Silage", "Wheat",
+    "Soybean", "Sunflower", "Brome", "Fescue", "Bermudagrass", "Alfalfa"
+]
+
+REMOVAL_CROPS = [
+    "Alfalfa & Clover", "Bermudagrass", "Bromegrass", "Fescue, tall",
+    "Corn", "Corn silage", "Grain sorghum", "Sorghum silage",
+    "Wheat", "Sunflowers", "Oats", "Soybeans", "Native grass"
+]
+REMOVAL_NUTRIENTS = ["Phosphorus (P₂O₅)", "Potassium (K₂O)"]
+
+LIME_TARGETS = ["Target pH 6.8", "Target pH 6.0", "Target pH 5.5"]
+
+# Expected yield units per crop, as labelled in each module
+NITROGEN_YIELD_UNITS = {
+    "Corn": "bu/a", "Grain Sorghum": "bu/a", "Wheat": "bu/a", "Sunflower": "bu/a",
+    "Oats": "bu/a", "Corn Silage": "ton/a", "Sorghum Silage": "ton/a",
+    "Brome": "ton/a", "Fescue": "ton/a", "Bermudagrass": "ton/a"
+}
+SUFFICIENCY_YIELD_UNITS = {
+    "Corn": "bu/a", "Wheat": "bu/a", "Grain Sorghum": "bu/a", "Soybean": "bu/a",
+    "Sunflower": "lb/a", "Oats": "bu/a", "Corn Silage": "ton/a", "Sorghum Silage": "ton/a",
+    "Brome and Fescue": "ton/a", "New Brome and Fescue": "ton/a",
+    "Bermudagrass": "ton/a", "New Bermudagrass": "ton/a",
+    "Alfalfa and Clover": "ton/a", "New Alfalfa and Clover": "ton/a"
+}
+SULFUR_YIELD_UNITS = {
+    "Corn": "bu/a", "Grain Sorghum": "bu/a", "Corn Silage": "ton/a", "Sorghum Silage": "ton/a",
+    "Wheat": "bu/a", "Soybean": "bu/a", "Sunflower": "lb/a", "Brome": "ton/a",
+    "Fescue": "ton/a", "Bermudagrass": "ton/a", "Alfalfa": "ton/a"
+}
+REMOVAL_YIELD_UNITS = {
+    "Alfalfa & Clover": "ton/a", "Bermudagrass": "ton/a", "Bromegrass": "ton/a",
+    "Fescue, tall": "ton/a", "Corn": "bu/a", "Corn silage": "ton/a",
+    "Grain sorghum": "bu/a", "Sorghum silage": "ton/a", "Wheat": "bu/a",
+    "Sunflowers": "lb/a", "Oats": "bu/a", "Soybeans": "bu/a", "Native grass": "ton/a"
+}
+
+# Expected yield: about 105% of the field's average over the past three to five years (General Guide)
+EXPECTED_YIELD_FACTOR = 1.05
+EXPECTED_YIELD_YEARS = (3, 5)
+
+# Nitrogen
+INTERNAL_EFFICIENCY = {"Corn": 0.84, "Grain Sorghum": 1.20, "Wheat": 1.45}
+FORAGE_N = {2: 80, 4: 160, 6: 240, 8: 320, 10: 400}
+NEW_SEEDING_N = 20
+
+# crop: (lb N per unit yield, or None to use ie/fe; lb N per % OM; manure credited; tillage credited)
+NITROGEN_FACTORS = {
+    "Corn": (None, 20, True, False),
+    "Grain Sorghum": (None, 20, True, False),
+    "Wheat": (None, 10, True, True),
+    "Sunflower": (0.075, 20, True, False),
+    "Oats": (1.3, 10, False, True),
+    "Corn Silage": (10.67, 20, True, False),
+    "Sorghum Silage": (10.67, 20, True, False),
+}
+
+# Nitrogen credits. Manure analyses are lb N per ton (solid) or per 1,000 gal (liquid),
+# applied at tons or 1,000 gal per acre. Typical first-year availability of the organic N
+# by manure type, and the share of ammonium N kept by each application method; a field's
+# own availability can be given instead.
+MANURE_ORGANIC_N_AVAILABILITY = {
+    "Beef Solid": 0.25,
+    "Dairy Solid": 0.30,
+    "Dairy Liquid": 0.35,
+    "Swine Liquid": 0.35,
+    "Poultry Litter": 0.55,
+}
+MANURE_TYPES = list(MANURE_ORGANIC_N_AVAILABILITY)
+MANURE_AMMONIUM_RETENTION = {
+    "Injected": 0.98,
+    "Incorporated within 1 day": 0.75,
+    "Incorporated within 4 days": 0.50,
+    "Surface, not incorporated": 0.30,
+}
+# lb N/a per ppm nitrate-N per inch of irrigation water (1 acre-inch weighs 226,000 lb)
+IRRIGATION_N_FACTOR = 0.226
+
+# Previous crop adjustments (lb N/a) for wheat and oats, and for all other crops
+SMALL_GRAIN_CROPS = ["Wheat", "Oats"]
+PREVIOUS_CROP_ADJUSTMENTS_SMALL_GRAIN = {
+    "Corn/Wheat": 0,
+    "Sorghum/Sunflower": 30,
+    "Soybean": 0,
+    "Fallow": {"With Profile N Test": 0, "Without Profile N Test": -20},
+    "Alfalfa": {"Excellent Stand": -60, "Good Stand": -40, "Fair Stand": -20, "Poor Stand": 0},
+    "Red Clover": {"Excellent Stand": -40, "Good Stand": -20, "Poor Stand": 0},
+    "Sweet Clover": {"Excellent Stand": -55, "Good Stand": -30, "Poor Stand": 0}
+}
+PREVIOUS_CROP_ADJUSTMENTS = {
+    "Corn/Wheat": 0,
+    "Sorghum/Sunflower": 0,
+    "Soybean": -40,
+    "Fallow": {"With Profile N Test": 0, "Without Profile N Test": -20},
+    "Alfalfa": {"Excellent Stand": -120, "Good Stand": -80, "Fair Stand": -40, "Poor Stand": 0},
+    "Red Clover": {"Excellent Stand": -80, "Good Stand": -40, "Poor Stand": 0},
+    "Sweet Clover": {"Excellent Stand": -110, "Good Stand": -60, "Poor Stand": 0}
+}
+
+
+# Rotation planning: crops grown without N fertilizer, and the previous crop each
+# rotation crop counts as the year after (other crops count as Corn/Wheat)
+NO_N_CROPS = ["Soybean", "Fallow", "Alfalfa", "Red Clover", "Sweet Clover"]
+ROTATION_CROPS = NITROGEN_CROPS + NO_N_CROPS
+ROTATION_PREVIOUS_CROPS = {
+    **{crop: "Corn/Wheat" for crop in NITROGEN_CROPS},
+    "Grain Sorghum": "Sorghum/Sunflower", "Sorghum Silage": "Sorghum/Sunflower", "Sunflower": "Sorghum/Sunflower",
+    **{crop: crop for crop in NO_N_CROPS},
+}
+
+
+def previous_crop_adjustment(crop, previous_crop, condition):
+    table = PREVIOUS_CROP_ADJUSTMENTS_SMALL_GRAIN if crop in SMALL_GRAIN_CROPS else PREVIOUS_CROP_ADJUSTMENTS
+    adjustment = table.get(previous_crop, 0)
+    if isinstance(adjustment, dict):
+        adjustment = adjustment.get(condition, 0)
+    return adjustment
+
+
+# Soil test extraction methods (General Guide) and the factor that puts each
+# on the Mehlich-3 scale the P and K calculators interpret
+P_TEST_METHODS = {"Mehlich-3": 1.0, "Bray P1": 1.0, "Olsen": 1.6}
+K_TEST_METHODS = {"Mehlich-3": 1.0, "Ammonium Acetate": 1.0}
+
+# Phosphorus and potassium sufficiency: Rec = a + b·Y + c·STP + d·Y·STP
+P_SUFFICIENCY = {
+    "Corn": (50, 0.2, -2.5, -0.01),
+    "Wheat": (46, 0.42, -2.3, -0.021),
+    "Grain Sorghum": (50, 0.16, -2.5, -0.008),
+    "Soybean": (56, 0.51, -2.8, -0.0257),
+    "Sunflower": (42, 0.01, -2.1, -0.0005),
+    "Oats": (47, 0.25, -2.3, -0.013),
+    "Corn Silage": (56, 1.12, -2.8, -0.056),
+    "Sorghum Silage": (48, 1.19, -2.38, -0.0594),
+    "Brome and Fescue": (44, 6.3, -2.2, -0.315),
+    "New Brome and Fescue": (68, 11.2, -2.2, -0.315),
+    "Bermudagrass": (64, 5.3, -2.56, -0.21),
+    "New Bermudagrass": (64, 9.1, -2.56, -0.21),
+    "Alfalfa and Clover": (73, 4.56, -2.92, -0.18),
+    "New Alfalfa and Clover": (84, 12, -3.37, -0.48),
+}
+K_SUFFICIENCY = {
+    "Corn": (73, 0.21, -0.565, -0.0016),
+    "Wheat": (62, 0.24, -0.48, -0.0018),
+    "Grain Sorghum": (80, 0.17, -0.616, -0.0013),
+    "Soybean": (60, 0.628, -0.46, -0.0048),
+    "Sunflower": (88, 0.008, -0.622, -0.00006),
+    "Oats": (62, 0.221, -0.48, -0.0017),
+    "Corn Silage": (74, 1.50, -0.567, -0.0115),
+    "Sorghum Silage": (73, 1.8, -0.56, -0.0139),
+    "Brome and Fescue": (41, 5.85, -0.315, -0.045),
+    "New Brome and Fescue": (91, 15, -0.7, -0.116),
+    "Bermudagrass": (75, 5.3, -2.56, -0.21),
+    "New Bermudagrass": (105, 15, -0.7, -0.1),
+    "Alfalfa and Clover": (84, 5.24, -0.56, -0.035),
+    "New Alfalfa and Clover": (105, 15, -0.7, -0.1),
+}
+HIGH_CSTV_CROPS = ["Bermudagrass", "New Bermudagrass", "Alfalfa and Clover", "New Alfalfa and Clover"]
+P_CSTV = (20, 25)
+K_CSTV = (130, 150)
+P_BUILD_FACTOR = 18
+K_BUILD_FACTOR = 9
+
+# Sulfur: Rec = factor·Y − 2.5·OM − profile S − other S
+SULFUR_FACTORS = {
+    "Corn": 0.2,
+    "Grain Sorghum": 0.2,
+    "Corn Silage": 1.33,
+    "Sorghum Silage": 1.33,
+    "Wheat": 0.6,
+    "Soybean": 0.4,
+    "Sunflower": 0.005,
+    "Brome": 5.0,
+    "Fescue": 5.0,
+    "Bermudagrass": 5.0,
+    "Alfalfa": 6.0
+}
+SULFUR_OM_FACTOR = 2.5
+
+# Micronutrients: soil test classes per ppm column, lowest first. Each limit is
+# the upper end of a class and whether it is included in it; each class rates
+# round(intercept + slope·ppm), at least the minimum, in lb/a. Iron has classes
+# only (DTPA critical levels, Lindsay and Norvell 1978): no soil rate is given.
+MICRONUTRIENT_CLASSES = {
+    "cl_ppm": (["Low", "Medium", "High"], [(4.0, False), (6.0, True)], [(20, 0, 0), (10, 0, 0), (0, 0, 0)]),
+    "b_ppm": (["Low", "Medium", "High"], [(0.5, False), (1.0, True)], [(2, 0, 0), (1, 0, 0), (0, 0, 0)]),
+    "zn_ppm": (["Low", "High"], [(1.0, True)], [(11.5, -11.25, 1), (0, 0, 0)]),
+    "fe_ppm": (["Low", "Marginal", "Adequate"], [(2.5, False), (4.5, True)], None),
+}
+
+# Lime: Rec = (a + b·BpH + BpH²·c) × depth, lb ECC/a
+LIME_EQUATIONS = {
+    "Target pH 6.8": (28300, -7100, 449),
+    "Target pH 6.0": (14100, -3540, 224),
+    "Target pH 5.5": (7060, -1770, 112),
+}
+# Sampled layers of the layered lime calculator (0–6 and 6–12 inch cores)
+LIME_SAMPLE_LAYERS = 2
+
+# Crop removal (lb per unit of yield)
+CROP_REMOVAL = {
+    # crop: (unit, moisture, P2O5, K2O)
+    "Alfalfa & Clover": ("Ton", "15%", 12, 60),
+    "Bermudagrass": ("Ton", "15%", 12, 40),
+    "Bromegrass": ("Ton", "15%", 12, 40),
+    "Fescue, tall": ("Ton", "15%", 12, 40),
+    "Corn": ("Bushel", "15.5%", 0.33, 0.26),
+    "Corn silage": ("Ton", "65%", 3.20, 8.70),
+    "Grain sorghum": ("Bushel", "15.5%", 0.40, 0.26),
+    "Sorghum silage": ("Ton", "65%", 3.20, 8.70),
+    "Wheat": ("Bushel", "13.5%", 0.50, 0.40),
+    "Sunflowers": ("Pound", "10%", 0.015, 0.006),
+    "Oats": ("Bushel", "14%", 0.25, 0.20),
+    "Soybeans": ("Bushel", "13%", 0.80, 1.40),
+    "Native grass": ("Ton", "15%", 5.40, 30),
+}
+
+# Fertilizer products for the blend engine: guaranteed analysis (% by weight)
+# and price in $/ton. Prices are placeholders; pass a local catalog to blend.
+BLEND_NUTRIENTS = ["n", "p2o5", "k2o", "s", "zn", "cl", "b", "ecc"]
+FERTILIZER_PRODUCTS = {
+    "urea": ({"n": 46}, 550),
+    "uan32": ({"n": 32}, 400),
+    "map": ({"n": 11, "p2o5": 52}, 750),
+    "dap": ({"n": 18, "p2o5": 46}, 700),
+    "potash": ({"k2o": 60, "cl": 46}, 420),
+    "ammonium_sulfate": ({"n": 21, "s": 24}, 450),
+    "zinc_sulfate": ({"zn": 35.5, "s": 17.5}, 1800),
+}
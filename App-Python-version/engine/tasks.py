@@ -0,0 +1,82 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pandas as pd
+
+from engine.batch import CALCULATORS
+from engine.incremental import IncrementalRun
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Process-wide executor for heavy calculations.
+
+    Sized by $FERTRECKS_TASK_WORKERS (default: up to 4 CPUs). Set
+    $FERTRECKS_TASK_POOL=thread to run in threads instead of processes.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = int(os.environ.get("FERTRECKS_TASK_WORKERS", 0)) or min(4, os.cpu_count() or 1)
+            if os.environ.get("FERTRECKS_TASK_POOL", "process") == "thread":
+                _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fertrecks-task")
+            else:
+                # Spawned, not forked: the server process has live threads and an event loop
+                _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _run_chunk(calculator, chunk):
+    return CALCULATORS[calculator][0](chunk)
+
+
+async def run_batch(calculator, frame, chunk_rows=20000, on_progress=None, cache_dir=None):
+    """Run a batch calculator on the task pool without blocking the event loop.
+
+    The frame is split into ``chunk_rows`` chunks that run in parallel;
+    ``on_progress(done, total)`` is called on the event loop as chunks finish.
+    Cancelling the awaiting task cancels the chunks that have not started.
+
+    With ``cache_dir`` (default $FERTRECKS_CACHE_DIR) rows already in that
+    incremental store are reused and new results are added to it. Every
+    server process on the machine can share the same store.
+    """
+    cache_dir = cache_dir or os.environ.get("FERTRECKS_CACHE_DIR")
+    if not cache_dir:
+        return await _run_chunks(calculator, frame, chunk_rows, on_progress)
+
+    run = await asyncio.to_thread(IncrementalRun, calculator, frame, cache_dir)
+    reused, progress = run.reused, None
+    if on_progress is not None:
+        def progress(done, total):
+            on_progress(reused + done * (len(frame) - reused) // max(total, 1), len(frame))
+        progress(0, len(run.pending))
+    computed = await _run_chunks(calculator, run.pending, chunk_rows, progress)
+    result, _ = await asyncio.to_thread(run.finish, computed)
+    return result
+
+
+async def _run_chunks(calculator, frame, chunk_rows, on_progress):
+    if len(frame) == 0:
+        return _run_chunk(calculator, frame)
+    loop = asyncio.get_running_loop()
+    pool = get_pool()
+    futures = [
+        loop.run_in_executor(pool, _run_chunk, calculator, frame.iloc[start:start + chunk_rows])
+        for start in range(0, len(frame), chunk_rows)
+    ]
+    try:
+        done = 0
+        for finished in asyncio.as_completed(futures):
+            done += len(await finished)
+            if on_progress is not None:
+                on_progress(done, len(frame))
+        return pd.concat([future.result() for future in futures])
+    finally:
+        for future in futures:
+            future.cancel()
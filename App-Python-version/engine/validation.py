@@ -0,0 +1,382 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from engine import tables
+
+# Per-column error codes; a row's code is the bitwise OR of its columns (0 = valid)
+OK = 0
+MISSING = 1
+NOT_NUMERIC = 2
+OUT_OF_RANGE = 4
+UNKNOWN_CATEGORY = 8
+UNIT_MISMATCH = 16
+
+Validation = namedtuple("Validation", ["values", "codes", "column_codes", "factorized"])
+
+
+def number(low=None, high=None, low_inclusive=True, choices=None, label=None,
+           required=True, default=None, default_by=None, only_for=None, units=None, at_most=None):
+    return {
+        "kind": "number", "low": low, "high": high, "low_inclusive": low_inclusive,
+        "choices": choices, "label": label, "required": required, "default": default,
+        "default_by": default_by, "only_for": only_for, "units": units, "at_most": at_most
+    }
+
+
+def choice(choices, label=None, required=True, default=None, only_for=None):
+    return {
+        "kind": "choice", "choices": list(choices), "label": label, "required": required,
+        "default": default, "default_by": None, "only_for": only_for
+    }
+
+
+# Input specs. ``only_for`` limits a column to rows whose (column, values) match;
+# ``units`` maps the crop column to the expected "<name>_unit" of each row and
+# ``default_by`` maps it to a per-row default for a missing optional value;
+# ``at_most`` names an earlier column of the spec the value may not exceed.
+NITROGEN_INPUTS = {
+    "crop": choice(tables.NITROGEN_CROPS, label="Crop"),
+    "yield": number(0, 100000, label="Expected yield", only_for=("crop", tables.GRAIN_CROPS),
+                    units=("crop", tables.NITROGEN_YIELD_UNITS)),
+    "om": number(0, 100, label="Soil organic matter", only_for=("crop", tables.GRAIN_CROPS)),
+    "profile_n": number(0, 1000, label="Profile nitrate-N", only_for=("crop", tables.GRAIN_CROPS)),
+    "manure_n": number(0, 1000, label="Manure N", required=False, default=0),
+    "other_n": number(0, 1000, label="Other N adjustments", required=False, default=0),
+    "tillage": number(choices=tables.TILLAGE_CREDITS, label="Tillage system", required=False, default=0),
+    "previous_crop": choice(tables.PREVIOUS_CROPS, label="Previous crop", required=False,
+                            default="Corn/Wheat"),
+    "previous_crop_condition": choice(tables.CONDITIONS + [""], label="Crop condition",
+                                      required=False, default=""),
+    "ie": number(0, 5, low_inclusive=False, label="Internal crop efficiency", required=False,
+                 default_by=("crop", tables.INTERNAL_EFFICIENCY), only_for=("crop", tables.EFFICIENCY_CROPS)),
+    "fe": number(0, 1, low_inclusive=False, label="Fertilizer efficiency", required=False,
+                 default=0.55, only_for=("crop", tables.EFFICIENCY_CROPS)),
+    "se": number(0, 1, low_inclusive=False, label="Soil nitrate-N efficiency", required=False,
+                 default=1.0, only_for=("crop", tables.EFFICIENCY_CROPS)),
+    "forage_yield": number(choices=tables.FORAGE_YIELDS, label="Expected forage yield",
+                           only_for=("crop", tables.FORAGE_CROPS)),
+    "new_seeding": choice([True, False], label="New seeding", required=False, default=False),
+}
+
+# Manure N and irrigation-water N credits, for rows that give a manure analysis or irrigation water
+_MANURED = ("manure_type", tables.MANURE_TYPES)
+MANURE_INPUTS = {
+    "manure_type": choice(tables.MANURE_TYPES, label="Manure type", required=False),
+    "manure_total_n": number(0, 1000, label="Manure total N", only_for=_MANURED),
+    "manure_nh4_n": number(0, 1000, label="Manure ammonium N", required=False, default=0, only_for=_MANURED,
+                           at_most="manure_total_n"),
+    "manure_rate": number(0, 100000, label="Manure application rate", only_for=_MANURED),
+    "manure_application": choice(tables.MANURE_AMMONIUM_RETENTION, label="Manure application method",
+                                 required=False, default="Surface, not incorporated", only_for=_MANURED),
+    "manure_availability": number(0, 1, label="Organic N availability", required=False,
+                                  default_by=("manure_type", tables.MANURE_ORGANIC_N_AVAILABILITY),
+                                  only_for=_MANURED),
+}
+IRRIGATION_INPUTS = {
+    "irrigation_no3_n": number(0, 100, label="Irrigation water nitrate-N", required=False, default=0),
+    "irrigation_inches": number(0, 60, label="Irrigation water applied", required=False, default=0),
+}
+N_CREDIT_INPUTS = {**MANURE_INPUTS, **IRRIGATION_INPUTS}
+
+# The nitrogen batch calculator works the credits out itself when these columns are given
+NITROGEN_BATCH_INPUTS = {**NITROGEN_INPUTS, **N_CREDIT_INPUTS}
+
+PHOSPHORUS_INPUTS = {
+    "crop": choice(tables.SUFFICIENCY_CROPS, label="Crop"),
+    "yield": number(0, 100000, label="Expected yield",
+                    units=("crop", tables.SUFFICIENCY_YIELD_UNITS)),
+    "mehlich": number(0, 1000, label="Mehlich-3 P"),
+}
+
+POTASSIUM_INPUTS = {
+    "crop": choice(tables.SUFFICIENCY_CROPS, label="Crop"),
+    "yield": number(0, 100000, label="Expected yield",
+                    units=("crop", tables.SUFFICIENCY_YIELD_UNITS)),
+    "mehlich_k": number(0, 5000, label="Mehlich-3 K"),
+}
+
+BUILD_INPUTS = {
+    "crop": choice(tables.BUILD_CROPS, label="Crop"),
+    "current": number(0, 5000, label="Current soil test"),
+    "years": number(0, 50, label="Timeframe to build"),
+    "removal": number(0, 1000, label="Annual crop removal"),
+}
+
+SULFUR_INPUTS = {
+    "crop": choice(tables.SULFUR_CROPS, label="Crop"),
+    "expected_yield": number(0, 100000, label="Expected yield",
+                             units=("crop", tables.SULFUR_YIELD_UNITS)),
+    "om": number(0, 100, label="Soil organic matter"),
+    "profile_s": number(0, 1000, label="Profile sulfur"),
+    "other_s": number(0, 1000, label="Other sulfur credits", required=False, default=0),
+}
+
+CHLORIDE_INPUTS = {"cl_ppm": number(0, 1000, label="Profile soil chloride")}
+BORON_INPUTS = {"b_ppm": number(0, 100, label="Extractable boron")}
+ZINC_INPUTS = {"zn_ppm": number(0, 100, label="Extractable zinc")}
+IRON_INPUTS = {"fe_ppm": number(0, 1000, label="Extractable iron")}
+MICRONUTRIENT_INPUTS = {
+    name: dict(spec, required=False)
+    for inputs in (CHLORIDE_INPUTS, BORON_INPUTS, ZINC_INPUTS, IRON_INPUTS)
+    for name, spec in inputs.items()
+}
+
+LIME_INPUTS = {
+    "target": choice(tables.LIME_TARGETS, label="Target pH"),
+    "buffer_ph": number(0, 14, label="Buffer pH"),
+    "depth": number(2, 12, label="Incorporation depth"),
+}
+
+
+def lime_layer_inputs(layers):
+    """Inputs of the layered lime calculator: buffer pH and depth (inches) per sampled layer."""
+    spec = {"target": choice(tables.LIME_TARGETS, label="Target pH", required=False)}
+    for layer in range(1, layers + 1):
+        spec[f"buffer_ph_{layer}"] = number(0, 14, label=f"Layer {layer} buffer pH", required=layer == 1)
+        spec[f"depth_{layer}"] = number(0, 12, low_inclusive=False, label=f"Layer {layer} depth",
+                                        required=layer == 1)
+    return spec
+
+
+LIME_LAYER_INPUTS = lime_layer_inputs(tables.LIME_SAMPLE_LAYERS)
+
+CROP_REMOVAL_INPUTS = {
+    "nutrient": choice(tables.REMOVAL_NUTRIENTS, label="Nutrient"),
+    "crop": choice(tables.REMOVAL_CROPS, label="Crop"),
+    "yield": number(0, 100000, low_inclusive=False, label="Yield",
+                    units=("crop", tables.REMOVAL_YIELD_UNITS)),
+}
+
+
+def _factorize(raw):
+    # Categorical checks run on the (few) distinct values, then broadcast back
+    codes, uniques = pd.factorize(_text_array(raw), use_na_sentinel=True)
+    return codes, np.asarray(uniques, dtype=object)
+
+
+def _text_array(raw):
+    # Text columns are factorized on their backing object array: about twice as
+    # fast as going through the pandas string array, with the same result.
+    # Arrow-backed text is dictionary-encoded by Arrow itself, faster still.
+    if isinstance(raw.dtype, pd.ArrowDtype) or getattr(raw.dtype, "storage", None) == "pyarrow":
+        return raw
+    if raw.dtype == object or pd.api.types.is_string_dtype(raw.dtype):
+        array = np.asarray(raw.array)
+        if array.dtype == object:
+            return array
+    return raw
+
+
+def _normalize(uniques):
+    return np.array([str(u).strip().lower() for u in uniques], dtype=object)
+
+
+def _coerce_choices(raw, choices, factorized=None):
+    # " corn" and "CORN" are read as "Corn"; done on the distinct values only
+    codes, uniques = factorized or _factorize(raw)
+    canonical = {str(c).strip().lower(): c for c in choices if isinstance(c, str)}
+    coerced = np.array([canonical.get(u.strip().lower(), u.strip()) if isinstance(u, str) else u
+                        for u in uniques], dtype=object)
+    if len(coerced) == len(uniques) and all(a is b or a == b for a, b in zip(coerced, uniques)):
+        return raw, (codes, uniques)
+    # Distinct raw values may now coincide, so factorize the coerced uniques again
+    merged, coerced = pd.factorize(coerced, use_na_sentinel=True)
+    codes = np.append(merged, -1)[codes]
+    coerced = np.asarray(coerced, dtype=object)
+    return pd.Series(np.append(coerced, None)[codes], index=raw.index, dtype=object), (codes, coerced)
+
+
+def _is_blank(raw):
+    if raw.dtype != object and not pd.api.types.is_string_dtype(raw.dtype):
+        return np.array(raw.isna())
+    codes, uniques = _factorize(raw)
+    blank_uniques = np.append(_normalize(uniques) == "", True)
+    return blank_uniques[codes]
+
+
+def _parse_number(raw):
+    return pd.to_numeric(raw, errors="coerce").astype(float), _is_blank(raw)
+
+
+def _check_number(raw, spec, parsed=None):
+    values, blank = parsed or _parse_number(raw)
+    array = values.to_numpy()
+    codes = np.zeros(len(array), dtype=np.uint8)
+    codes[blank] = MISSING
+    codes[np.isnan(array) & ~blank] = NOT_NUMERIC
+
+    present = ~np.isnan(array)
+    bad = np.zeros(len(array), dtype=bool)
+    if spec["choices"] is not None:
+        bad |= ~np.isin(array, spec["choices"])
+    if spec["low"] is not None:
+        bad |= array < spec["low"] if spec["low_inclusive"] else array <= spec["low"]
+    if spec["high"] is not None:
+        bad |= array > spec["high"]
+    codes[present & bad] = OUT_OF_RANGE
+    return values, codes
+
+
+def _known(factorized, choices):
+    codes, uniques = factorized
+    return np.append(pd.Series(uniques, dtype=object).isin(choices).to_numpy(), False)[codes]
+
+
+def _check_choice(raw, spec, factorized):
+    codes, uniques = factorized
+    blank = np.append(_normalize(uniques) == "", True)[codes]
+    known = _known(factorized, spec["choices"])
+    column_codes = np.zeros(len(raw), dtype=np.uint8)
+    column_codes[blank] = MISSING
+    column_codes[~blank & ~known] = UNKNOWN_CATEGORY
+    return raw, column_codes
+
+
+def _check_units(frame, name, spec, codes, factorize):
+    unit_column = f"{name}_unit"
+    if spec.get("units") is None or unit_column not in frame:
+        return
+    crop_column, units = spec["units"]
+    crop_codes, crops = factorize(crop_column)
+    unit_codes, given = factorize(unit_column)
+    given = _normalize(given)
+
+    # Compare unit ids instead of strings: -1 = no expectation, -2 = blank unit
+    ids = {unit: i for i, unit in enumerate(dict.fromkeys(given))}
+    given_ids = np.append([ids[unit] if unit else -2 for unit in given], -2)[unit_codes]
+    expected = [str(units[crop]).lower() if crop in units else None for crop in crops]
+    expected_ids = np.append([ids.get(unit, len(ids)) if unit else -1 for unit in expected], -1)[crop_codes]
+
+    mismatch = (expected_ids >= 0) & (given_ids != -2) & (expected_ids != given_ids)
+    codes[mismatch & (codes == OK)] = UNIT_MISMATCH
+
+
+def validate(spec, frame, parsed=None):
+    """Coerce and check a batch of inputs in one vectorized pass.
+
+    ``frame`` is a DataFrame (or a mapping of columns). Rows never raise: each
+    gets a bitmask in ``codes`` and each column its own ``column_codes`` array,
+    so a batch keeps its valid rows. ``values`` holds the coerced columns with
+    defaults filled in for optional inputs; ``factorized`` keeps the
+    (codes, uniques) of untouched categorical columns for reuse. Pass the same
+    ``parsed`` dict when validating one frame against several specs, and each
+    column is parsed and factorized only once.
+    """
+    if not isinstance(frame, pd.DataFrame):
+        frame = pd.DataFrame(frame)
+    n = len(frame)
+    values = {}
+    column_codes = {}
+    codes = np.zeros(n, dtype=np.uint8)
+
+    # Categorical columns (crop, units, ...) are factorized once per call; choice
+    # columns are coerced to their canonical spelling first
+    parsed = {} if parsed is None else parsed
+
+    def raw_factorized(name):
+        if ("text", name) not in parsed:
+            parsed[("text", name)] = _factorize(frame[name])
+        return parsed[("text", name)]
+
+    factorized = {}
+    coerced = {}
+    for name, field in spec.items():
+        if field["kind"] == "choice" and name in frame:
+            coerced[name], factorized[name] = _coerce_choices(frame[name], field["choices"], raw_factorized(name))
+
+    def factorize(name):
+        if name not in factorized:
+            factorized[name] = raw_factorized(name)
+        return factorized[name]
+
+    for name, field in spec.items():
+        if field["kind"] == "number":
+            if name in frame:
+                if ("number", name) not in parsed:
+                    parsed[("number", name)] = _parse_number(frame[name])
+                column, column_code = _check_number(frame[name], field, parsed[("number", name)])
+            else:
+                column, column_code = _check_number(pd.Series(np.nan, index=frame.index), field)
+            if field.get("units") is not None:
+                _check_units(frame, name, field, column_code, factorize)
+        else:
+            raw = coerced[name] if name in frame else pd.Series(None, index=frame.index, dtype=object)
+            column, column_code = _check_choice(raw, field, factorize(name) if name in frame else _factorize(raw))
+
+        missing = column_code == MISSING
+        if not field["required"]:
+            column_code[missing] = OK
+            if field["default_by"] is not None and missing.any():
+                key, table = field["default_by"]
+                if key in frame:
+                    key_codes, uniques = factorize(key)
+                    fill = np.array([table.get(u, np.nan) for u in uniques] + [np.nan], dtype=float)[key_codes]
+                    column = column.where(~missing, fill)
+            if field["default"] is not None and missing.any():
+                column = column.where(~missing, field["default"])
+                factorized.pop(name, None)
+
+        if field.get("at_most") in values:
+            over = column.to_numpy(dtype=float) > values[field["at_most"]].to_numpy(dtype=float)
+            column_code[over & (column_code == OK)] = OUT_OF_RANGE
+
+        if field["only_for"] is not None:
+            key, allowed = field["only_for"]
+            applies = _known(factorize(key), allowed) if key in frame else np.zeros(n, dtype=bool)
+            column_code[~applies] = OK
+
+        values[name] = column
+        column_codes[name] = column_code
+        codes |= column_code
+
+    # Columns are kept as they are, not consolidated into one block (a copy of every column)
+    return Validation(pd.DataFrame(values, index=frame.index, copy=False), codes, column_codes, factorized)
+
+
+def describe(spec, column_codes, row=0):
+    """User-facing message for the first problem in one row, or None."""
+    codes = {name: int(column_codes[name][row]) for name in spec}
+    if any(code & (MISSING | UNKNOWN_CATEGORY) for code in codes.values()):
+        return "Please complete all input fields."
+    for name, code in codes.items():
+        field = spec[name]
+        label = field["label"] or name
+        if code & NOT_NUMERIC:
+            return f"{label} must be a number."
+        if code & OUT_OF_RANGE:
+            if field["choices"] is not None:
+                return f"{label} must be one of {', '.join(str(c) for c in field['choices'])}."
+            low, high = field["low"], field["high"]
+            if field.get("at_most") is not None:
+                bound = spec[field["at_most"]]["label"] or field["at_most"]
+                return f"{label} must be between {low} and {high} and no more than {bound}."
+            if not field["low_inclusive"]:
+                return f"{label} must be greater than {low} and at most {high}."
+            return f"{label} must be between {low} and {high}."
+        if code & UNIT_MISMATCH:
+            return f"{label} unit does not match the selected crop."
+    return None
+
+
+def check_inputs(spec, inputs):
+    """Validate one set of interactive inputs with the same rules as a batch.
+
+    Returns ``(values, message)``: the coerced values as a dict and a
+    user-facing message, which is None when the inputs are valid.
+    """
+    result = validate(spec, pd.DataFrame([{name: inputs.get(name) for name in spec}], dtype=object))
+    values = {name: _scalar(result.values[name].iloc[0], inputs.get(name)) for name in spec}
+    return values, describe(spec, result.column_codes)
+
+
+def _scalar(value, raw):
+    # Keep numbers the widgets already typed (e.g. int years) as they were
+    if isinstance(raw, (int, float)) and not isinstance(raw, bool) and raw == value:
+        return raw
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
@@ -0,0 +1,201 @@
+"""Expected yields from yield records, for the batch calculators.
+
+The General Guide sets a field's expected yield at about 105% of its average
+yield over the past three to five years. ``YieldHistory`` reads yield
+records (``field_id``, ``crop``, ``year``, ``yield``) chunk by chunk and keeps
+only the latest five years of each field and crop, so multi-year files of
+any length are streamed. Fields with fewer than three years get no estimate.
+``fill_expected_yields`` then fills the yield column of a calculator's input
+where it is blank; yields that were typed in are kept.
+
+    python -m engine.yields yield_history.csv expected_yields.csv --before 2025
+    python -m engine.batch nitrogen fields.csv results.csv --yield-history yield_history.csv
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from engine import tables
+from engine.validation import _factorize, _is_blank, _normalize
+
+# Yield column of each calculator that takes an expected (or, for crop removal, harvested) yield
+YIELD_COLUMNS = {
+    "nitrogen": ["yield"],
+    "phosphorus": ["yield"],
+    "potassium": ["yield"],
+    "sulfur": ["expected_yield"],
+    "crop_removal": ["yield"],
+    "all": ["yield", "expected_yield"],
+}
+
+
+# Group keys are field * _CROPS + crop, over the distinct fields and crops seen so far
+_CROPS = 1 << 20
+
+
+def _field_ids(uniques):
+    # 12, 12.0 (a numeric column with blanks) and " 12" are the same field
+    return np.array([str(int(u)) if isinstance(u, float) and u.is_integer() else str(u).strip() for u in uniques],
+                    dtype=object)
+
+
+def _key_codes(frame, column):
+    # (per-row codes, distinct keys, first spelling of each): fields as text, crops case-folded, -1 for blanks
+    codes, uniques = _factorize(frame[column])
+    names = _field_ids(uniques) if column == "field_id" else _normalize(uniques)
+    merged, keys = pd.factorize(names)
+    keys = np.asarray(keys, dtype=object)
+    spellings = np.array([str(u).strip() for u in uniques[np.unique(merged, return_index=True)[1]]], dtype=object)
+    merged = np.where(keys[merged] == "", -1, merged) if len(merged) else merged
+    return np.append(merged, -1)[codes], keys, spellings
+
+
+class YieldHistory:
+    """Latest yields of each field and crop, built up over chunks of yield records.
+
+    ``update(chunk)`` takes a chunk with ``field_id``, ``crop``, ``year`` and
+    ``yield`` columns; rows may come in any order. Several records of one
+    field, crop and year (split harvests, say) are averaged. Only the last
+    ``years`` years of each field and crop are kept, and with ``before``
+    only the years before it, to estimate a past season.
+    """
+
+    def __init__(self, years=tables.EXPECTED_YIELD_YEARS[1], before=None):
+        self.years = years
+        self.before = before
+        self.keys = {"field_id": pd.Index([], dtype=object), "crop": pd.Index([], dtype=object)}
+        self.spellings = {"field_id": [], "crop": []}
+        self.group = np.zeros(0, dtype=np.int64)
+        self.year = np.zeros(0, dtype=np.int64)
+        self.total = np.zeros(0)
+        self.count = np.zeros(0)
+
+    def _positions(self, chunk, column):
+        # Row positions in the vocabulary of ``column``, which grows with each new key
+        codes, keys, spellings = _key_codes(chunk, column)
+        known = self.keys[column]
+        positions = known.get_indexer(keys)
+        new = positions < 0
+        if new.any():
+            positions[new] = len(known) + np.arange(int(new.sum()))
+            self.keys[column] = known.append(pd.Index(keys[new], dtype=object))
+            self.spellings[column].extend(spellings[new])
+        return np.append(positions, -1)[codes]
+
+    def update(self, chunk):
+        fields = self._positions(chunk, "field_id")
+        crops = self._positions(chunk, "crop")
+        year = pd.to_numeric(chunk["year"], errors="coerce").to_numpy(dtype=float)
+        value = pd.to_numeric(chunk["yield"], errors="coerce").to_numpy(dtype=float)
+        keep = (fields >= 0) & (crops >= 0) & (year == np.floor(year)) & (value >= 0)
+        if self.before is not None:
+            keep &= year < self.before
+
+        group = np.concatenate([self.group, fields[keep] * _CROPS + crops[keep]])
+        year = np.concatenate([self.year, year[keep].astype(np.int64)])
+        total = np.concatenate([self.total, value[keep]])
+        count = np.concatenate([self.count, np.ones(int(keep.sum()))])
+
+        # One entry per field, crop and year, latest year first within each group
+        order = np.lexsort((-year, group))
+        group, year = group[order], year[order]
+        starts = np.flatnonzero(np.r_[True, (group[1:] != group[:-1]) | (year[1:] != year[:-1])]) \
+            if len(group) else np.zeros(0, dtype=np.intp)
+        total = np.add.reduceat(total[order], starts) if len(starts) else total
+        count = np.add.reduceat(count[order], starts) if len(starts) else count
+        group, year = group[starts], year[starts]
+
+        group_starts = _starts(group)
+        rank = np.arange(len(group)) - np.repeat(group_starts, np.diff(np.r_[group_starts, len(group)]))
+        latest = rank < self.years
+        self.group, self.year = group[latest], year[latest]
+        self.total, self.count = total[latest], count[latest]
+        return self
+
+    def result(self, min_years=tables.EXPECTED_YIELD_YEARS[0]):
+        """One row per field and crop: years on record, their average and the expected yield."""
+        # Entries are sorted by group and then by year, latest first
+        starts = _starts(self.group)
+        ends = np.r_[starts[1:], len(self.group)]
+        years = ends - starts
+        with np.errstate(divide="ignore", invalid="ignore"):
+            average = np.add.reduceat(self.total / self.count, starts) / years if len(starts) else np.zeros(0)
+        field, crop = np.divmod(self.group[starts], _CROPS)
+        return pd.DataFrame({
+            "field_id": np.array(self.spellings["field_id"], dtype=object)[field],
+            "crop": np.array(self.spellings["crop"], dtype=object)[crop],
+            "years": years, "first_year": self.year[ends - 1], "last_year": self.year[starts],
+            "average_yield": np.round(average, 1),
+            "expected_yield": np.where(years >= min_years,
+                                       np.round(tables.EXPECTED_YIELD_FACTOR * average, 1), np.nan),
+        })
+
+
+def _starts(group):
+    return np.flatnonzero(np.r_[True, group[1:] != group[:-1]]) if len(group) else np.zeros(0, dtype=np.intp)
+
+
+def expected_yields(path, chunk_rows=500000, before=None):
+    """Expected yield per field and crop from a CSV of yield records, read chunk by chunk."""
+    history = YieldHistory(before=before)
+    for chunk in pd.read_csv(path, chunksize=chunk_rows,
+                             usecols=["field_id", "crop", "year", "yield"], dtype={"field_id": str}):
+        history.update(chunk)
+    return history.result()
+
+
+def fill_expected_yields(frame, expected, calculator):
+    """Fill ``calculator``'s blank yields in ``frame`` from an ``expected`` table (or keep them blank).
+
+    Rows are matched on ``field_id`` and ``crop`` (case and surrounding
+    spaces ignored); crops must be spelled as the calculator expects them.
+    """
+    if calculator not in YIELD_COLUMNS:
+        raise ValueError(f"the {calculator} calculator takes no yield")
+    if "field_id" not in frame:
+        raise ValueError("a field_id column is needed to match fields with their yield history")
+    known = np.zeros(len(expected), dtype=np.int64)
+    wanted = np.zeros(len(frame), dtype=np.int64)
+    for column in ("field_id", "crop"):
+        # Each frame key is looked up among the table's keys once
+        known_codes, known_keys, _ = _key_codes(expected, column)
+        codes, keys, _ = _key_codes(frame, column)
+        positions = np.append(pd.Index(known_keys).get_indexer(keys), -1)[codes]
+        known = np.where((known < 0) | (known_codes < 0), -1, known * _CROPS + known_codes)
+        wanted = np.where((wanted < 0) | (positions < 0), -1, wanted * _CROPS + positions)
+    lookup = pd.Series(expected["expected_yield"].to_numpy(dtype=float), index=known)
+    lookup = lookup[(lookup.index >= 0) & ~lookup.index.duplicated()]
+    estimate = lookup.reindex(wanted).to_numpy()
+    found = ~np.isnan(estimate)
+    filled = {}
+    for column in YIELD_COLUMNS[calculator]:
+        if column not in frame:
+            filled[column] = estimate
+            continue
+        raw = frame[column]
+        use = _is_blank(raw) & found
+        if not use.any():
+            continue
+        if pd.api.types.is_numeric_dtype(raw.dtype) and not pd.api.types.is_bool_dtype(raw.dtype):
+            filled[column] = np.where(use, estimate, raw.to_numpy(dtype=float, na_value=np.nan))
+        else:
+            values = raw.to_numpy(dtype=object, copy=True)
+            values[use] = estimate[use]
+            filled[column] = values
+    return frame.assign(**filled) if filled else frame
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Expected yields (105% of the 3-5 year average) from yield records.")
+    parser.add_argument("input", help="CSV with field_id, crop, year and yield columns")
+    parser.add_argument("output")
+    parser.add_argument("--before", type=int, help="only use years before this one")
+    parser.add_argument("--chunk-rows", type=int, default=500000)
+    args = parser.parse_args(argv)
+    expected_yields(args.input, args.chunk_rows, args.before).to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
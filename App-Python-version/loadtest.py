@@ -0,0 +1,307 @@
+"""Drive simulated browser sessions against a local copy of the app.
+
+Each session opens the app's websocket, sends the same messages a browser
+would (change crop, enter yield, click calculate on the Nitrogen,
+Phosphorus, Potassium and Lime tabs) and times each click until its result
+arrives. Runs at several concurrency levels and prints calculation latency
+percentiles, server messages per second and server memory.
+
+    python loadtest.py --sessions 1 10 50 --duration 20
+    python loadtest.py --url http://127.0.0.1:8000 --pid 12345
+    python loadtest.py --flows lime --batch-rows 100000
+
+Without --url the app is started on a free local port with a throwaway
+history database. Everything runs on localhost.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import websockets
+
+HERE = Path(__file__).resolve().parent
+
+# Input values as the browser sends them on connect (the UI defaults)
+INITIAL_INPUTS = {
+    "field_id": "",
+    "nitro-crop": "Corn", "nitro-yield": 150, "nitro-om": 2.1, "nitro-profile_n": 30, "nitro-manure_n": 0,
+    "nitro-other_n": 0, "nitro-tillage": "0", "nitro-previous_crop_main": "Corn/Wheat",
+    "nitro-previous_crop_condition": None, "nitro-ie_input": "0.84", "nitro-fertilizer": "0.55",
+    "nitro-texture": "1.0", "nitro-forage_yield": "6", "nitro-new_seeding": False,
+    "p-mode": "Sufficiency", "p-crop": "Corn", "p-yield": 150, "p-mehlich": 10, "p-crop_bm": "Corn",
+    "p-current_p": 10, "p-years": 4, "p-removal": 60,
+    "k-mode": "Sufficiency", "k-crop": "Corn", "k-yield": 150, "k-mehlich_k": 100, "k-crop_bm": "Corn",
+    "k-current_k": 100, "k-years": 4, "k-removal": 80,
+    "lime-target": "Target pH 6.8", "lime-buffer_ph": 6.5, "lime-depth": 6,
+    "batch-calculator": "nitrogen",
+}
+BUTTONS = ["nitro-calc", "p-calc", "k-calc", "lime-calc", "batch-run"]
+OUTPUTS = ["nitro-result", "p-result", "k-result", "lime-result", "batch-status"]
+
+NITROGEN_IE = {"Corn": "0.84", "Grain Sorghum": "1.20", "Wheat": "1.45"}
+SUFFICIENCY_CROPS = ["Corn", "Wheat", "Grain Sorghum", "Soybean", "Sunflower", "Oats"]
+
+# Tab: (module namespace, steps before clicking calculate). Each step returns the inputs it changes.
+FLOWS = {
+    "nitrogen": ("nitro", [
+        lambda r: (lambda crop: {"nitro-crop": crop, "nitro-ie_input": NITROGEN_IE[crop]})(r.choice(list(NITROGEN_IE))),
+        lambda r: {"nitro-yield": r.randint(80, 250)},
+        lambda r: {"nitro-om": round(r.uniform(0.5, 4), 1)},
+    ]),
+    "phosphorus": ("p", [
+        lambda r: {"p-crop": r.choice(SUFFICIENCY_CROPS)},
+        lambda r: {"p-yield": r.randint(40, 250)},
+        lambda r: {"p-mehlich": r.randint(2, 30)},
+    ]),
+    "potassium": ("k", [
+        lambda r: {"k-crop": r.choice(SUFFICIENCY_CROPS)},
+        lambda r: {"k-yield": r.randint(40, 250)},
+        lambda r: {"k-mehlich_k": r.randint(40, 200)},
+    ]),
+    "lime": ("lime", [
+        lambda r: {"lime-target": r.choice(["Target pH 6.8", "Target pH 6.0", "Target pH 5.5"])},
+        lambda r: {"lime-buffer_ph": round(r.uniform(5.5, 7.0), 1)},
+    ]),
+}
+
+
+def client_data(port):
+    return {
+        ".clientdata_url_protocol": "http:", ".clientdata_url_hostname": "127.0.0.1",
+        ".clientdata_url_port": str(port), ".clientdata_url_pathname": "/", ".clientdata_url_search": "",
+        ".clientdata_url_hash_initial": "", ".clientdata_url_hash": "", ".clientdata_pixelratio": 1,
+        ".clientdata_singletons": "", ".clientdata_allowDataUriScheme": True,
+        **{f".clientdata_output_{name}_hidden": False for name in OUTPUTS},
+    }
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.batch_seconds = []
+        self.messages = 0
+        self.timeouts = 0
+
+
+class Session:
+    """One simulated browser tab."""
+
+    def __init__(self, url, port, stats, seed, think=0.2, timeout=30, flows=None):
+        self.ws_url = url.replace("http", "ws", 1).rstrip("/") + "/websocket/"
+        self.url = url.rstrip("/")
+        self.port = port
+        self.stats = stats
+        self.rng = random.Random(seed)
+        self.think = think
+        self.timeout = timeout
+        self.flows = list(flows or FLOWS)
+        self.clicks = dict.fromkeys(BUTTONS, 0)
+        self.waiting = {}
+        self.responses = {}
+
+    async def _read(self, ws):
+        async for raw in ws:
+            self.stats.messages += 1
+            message = json.loads(raw)
+            for name, value in message.get("values", {}).items():
+                future = self.waiting.get(name)
+                if future is not None and not future.done() and self._finished(name, value):
+                    future.set_result(time.perf_counter())
+            if "response" in message and message["response"]["tag"] in self.responses:
+                self.responses.pop(message["response"]["tag"]).set_result(message["response"].get("value"))
+
+    @staticmethod
+    def _finished(name, value):
+        if name != "batch-status":
+            return True
+        html = value.get("html", "") if isinstance(value, dict) else ""
+        return "rows calculated" in html or "failed" in html
+
+    async def _send(self, ws, method, data):
+        await ws.send(json.dumps({"method": method, "data": data}))
+
+    async def _click(self, ws, button, output):
+        """Press a button and wait for ``output`` to be re-rendered; returns seconds or None."""
+        self.clicks[button] += 1
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[output] = future
+        start = time.perf_counter()
+        await self._send(ws, "update", {f"{button}:shiny.action": self.clicks[button]})
+        try:
+            return await asyncio.wait_for(future, self.timeout) - start
+        except asyncio.TimeoutError:
+            self.stats.timeouts += 1
+            return None
+        finally:
+            self.waiting.pop(output, None)
+
+    async def _connect(self, ws):
+        inputs = dict(INITIAL_INPUTS, **client_data(self.port))
+        inputs.update({f"{button}:shiny.action": 0 for button in BUTTONS})
+        await self._send(ws, "init", inputs)
+
+    async def run(self, until):
+        async with websockets.connect(self.ws_url, max_size=None) as ws:
+            reader = asyncio.create_task(self._read(ws))
+            await self._connect(ws)
+            try:
+                while time.perf_counter() < until:
+                    namespace, steps = FLOWS[self.rng.choice(self.flows)]
+                    for step in steps:
+                        await self._send(ws, "update", step(self.rng))
+                        await asyncio.sleep(self.rng.expovariate(1 / self.think) if self.think else 0)
+                    latency = await self._click(ws, f"{namespace}-calc", f"{namespace}-result")
+                    if latency is not None:
+                        self.stats.latencies.append(latency)
+            finally:
+                reader.cancel()
+
+    async def run_batches(self, until, rows):
+        """Upload a ``rows``-row nitrogen file on the Batch tab and run it repeatedly."""
+        rng = np.random.default_rng(0)
+        data = pd.DataFrame({
+            "crop": "Corn", "yield": rng.integers(80, 250, rows), "om": 2.0, "profile_n": 20, "ie": 0.84
+        }).to_csv(index=False).encode()
+        async with websockets.connect(self.ws_url, max_size=None) as ws:
+            reader = asyncio.create_task(self._read(ws))
+            await self._connect(ws)
+            try:
+                upload = self.responses[1] = asyncio.get_running_loop().create_future()
+                await ws.send(json.dumps({"method": "uploadInit", "tag": 1, "args": [
+                    [{"name": "loadtest.csv", "size": len(data), "type": "text/csv"}]
+                ]}))
+                job = await upload
+                request = urllib.request.Request(f"{self.url}/{job['uploadUrl']}", data=data, method="POST")
+                await asyncio.to_thread(urllib.request.urlopen, request)
+                await ws.send(json.dumps({"method": "uploadEnd", "tag": 2, "args": [job["jobId"], "batch-upload"]}))
+                while time.perf_counter() < until:
+                    seconds = await self._click(ws, "batch-run", "batch-status")
+                    if seconds is not None:
+                        self.stats.batch_seconds.append(seconds)
+            finally:
+                reader.cancel()
+
+
+def rss_mb(pid):
+    """Resident memory of a process and its children in MB (Linux only)."""
+    total, pids = 0, [pid]
+    while pids:
+        current = pids.pop()
+        try:
+            status = Path(f"/proc/{current}/status").read_text()
+            total += int(next(line.split()[1] for line in status.splitlines() if line.startswith("VmRSS:")))
+            for task in Path(f"/proc/{current}/task").iterdir():
+                pids.extend(int(child) for child in (task / "children").read_text().split())
+        except (OSError, StopIteration):
+            continue
+    return total / 1024 if total else None
+
+
+async def run_level(url, port, pid, sessions, duration, think, batch_rows, seed, flows=None):
+    stats = Stats()
+    until = time.perf_counter() + duration
+    clients = [Session(url, port, stats, seed + i, think=think, flows=flows).run(until) for i in range(sessions)]
+    if batch_rows:
+        clients.append(Session(url, port, stats, seed - 1).run_batches(until, batch_rows))
+
+    peak = 0.0
+
+    async def sample_memory():
+        nonlocal peak
+        while True:
+            peak = max(peak, rss_mb(pid) or 0.0)
+            await asyncio.sleep(0.5)
+
+    sampler = asyncio.create_task(sample_memory()) if pid else None
+    start = time.perf_counter()
+    await asyncio.gather(*clients)
+    elapsed = time.perf_counter() - start
+    if sampler:
+        sampler.cancel()
+    return stats, elapsed, peak
+
+
+def start_server(port, app="app.py"):
+    scratch = Path(tempfile.mkdtemp(prefix="fertrecks-loadtest-"))
+    env = dict(os.environ, FERTRECKS_DB=str(scratch / "history.db"), FERTRECKS_JOBS_DIR=str(scratch / "jobs"), PYTHONPATH=os.pathsep.join(filter(None, [str(HERE), os.environ.get("PYTHONPATH")])))
+    server = subprocess.Popen([sys.executable, "-m", "shiny", "run", str(app), "--port", str(port)], cwd=HERE, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    server.scratch = scratch
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1)
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("the app did not start within 60 seconds")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the app with simulated sessions on localhost.")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 5, 10, 25],
+                        help="concurrency levels to run (default: 1 5 10 25)")
+    parser.add_argument("--duration", type=float, default=15, help="seconds per level (default: 15)")
+    parser.add_argument("--think", type=float, default=0.2, help="mean pause between inputs in seconds (default: 0.2)")
+    parser.add_argument("--flows", nargs="+", choices=list(FLOWS), default=list(FLOWS),
+                        help="tabs the sessions use (default: all of them)")
+    parser.add_argument("--batch-rows", type=int, default=0,
+                        help="also keep one session running batch uploads of this many rows")
+    parser.add_argument("--url", help="test an already running app instead of starting one")
+    parser.add_argument("--pid", type=int, help="server process to measure memory of when using --url")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.url:
+        url, pid = args.url, args.pid
+        parts = urllib.parse.urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+    else:
+        port = free_port()
+        server = start_server(port)
+        url, pid = f"http://127.0.0.1:{port}", server.pid
+
+    try:
+        print(f"{'sessions':>8} {'calcs':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'msgs/s':>8} {'RSS MB':>8}"
+              + ("  batch s" if args.batch_rows else ""))
+        for sessions in args.sessions:
+            stats, elapsed, peak = asyncio.run(
+                run_level(url, port, pid, sessions, args.duration, args.think, args.batch_rows, args.seed, args.flows)
+            )
+            ms = np.percentile(np.array(stats.latencies) * 1000, [50, 95, 99]) if stats.latencies else [np.nan] * 3
+            line = (f"{sessions:>8} {len(stats.latencies):>7} {ms[0]:>8.1f} {ms[1]:>8.1f} {ms[2]:>8.1f} "
+                    f"{stats.messages / elapsed:>8.0f} {peak or float('nan'):>8.1f}")
+            if args.batch_rows:
+                line += f"  {np.mean(stats.batch_seconds) if stats.batch_seconds else float('nan'):>7.2f}"
+            if stats.timeouts:
+                line += f"  ({stats.timeouts} timed out)"
+            print(line, flush=True)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+from shiny import module, ui
+from htmltools import TagList
+
+CALCULATOR_CHOICES = {
+    "nitrogen": "Nitrogen",
+    "phosphorus": "Phosphorus (Sufficiency)",
+    "phosphorus_build": "Phosphorus (Build & Maintenance)",
+    "potassium": "Potassium (Sufficiency)",
+    "potassium_build": "Potassium (Build & Maintenance)",
+    "sulfur": "Sulfur",
+    "micronutrients": "Micronutrients",
+    "lime": "Lime",
+    "lime_layers": "Lime (Sampled Layers)",
+    "crop_removal": "Crop Removal",
+}
+
+@module.ui
+def batch_ui():
+    return TagList(
+        ui.h2("Batch Calculations"),
+        ui.p("Upload a CSV file with one row per field to calculate many recommendations at once. "
+             "Column names match the batch command line tool (for example crop, yield, om, profile_n for nitrogen). "
+             "P and K soil tests may also be given by method (p_test with p_method, or olsen_p, bray_p1, "
+             "ammonium_acetate_k); they are converted to the Mehlich-3 scale. "
+             "Runs are queued and calculated in the background, so the other tabs stay responsive "
+             "and a run keeps going if the page is closed."),
+
+        ui.input_select("calculator", "Calculator:", choices=CALCULATOR_CHOICES),
+        ui.input_file("upload", "CSV File:", accept=[".csv"]),
+
+        ui.input_task_button("run", "Run Batch"),
+        ui.input_action_button("cancel", "Cancel"),
+        ui.br(), ui.br(),
+        ui.output_ui("status"),
+        ui.br(), ui.br(), ui.br()
+    )
+
+
+from shiny import module, ui, render, reactive
+from engine import jobs
+from modules import resume
+
+@module.server
+def batch_server(input, output, session, resume_token=None):
+    message = reactive.Value("")
+    latest = reactive.Value(None)
+    queue = jobs.get_queue()
+    # Jobs run on the server's own worker unless separate workers are configured
+    jobs.ensure_worker()
+
+    def owner():
+        return resume.current(resume_token) or session.id
+
+    # A resumed session picks up its latest job again, finished or not
+    @reactive.Effect
+    def restore():
+        token = resume.current(resume_token)
+        if token is None:
+            return
+        with reactive.isolate():
+            if latest() is None:
+                recent = queue.jobs(owner=token, limit=1)
+                if recent:
+                    latest.set(recent[0].id)
+
+    @reactive.Effect
+    @reactive.event(input.run)
+    def start():
+        upload = input.upload()
+        if not upload:
+            message.set("Please upload a CSV file first.")
+            return
+        try:
+            job_id = queue.submit(input.calculator(), upload[0]["datapath"], name=upload[0]["name"], owner=owner())
+        except jobs.QueueFull as error:
+            message.set(str(error))
+            return
+        message.set("")
+        latest.set(job_id)
+
+    @reactive.Effect
+    @reactive.event(input.cancel)
+    def cancel():
+        if latest() is not None:
+            queue.cancel(latest())
+
+    def current():
+        return queue.get(latest()) if latest() is not None else None
+
+    @output
+    @render.ui
+    def status():
+        if message():
+            return ui.p(message())
+        job = current()
+        if job is None:
+            return None
+        if job.status in jobs.ACTIVE:
+            reactive.invalidate_later(0.5)
+            if job.rows:
+                return TagList(ui.p(jobs.describe(queue, job)),
+                               ui.tags.progress(value=job.done_rows, max=job.rows))
+            return ui.p(jobs.describe(queue, job))
+        if job.status == jobs.DONE:
+            return TagList(
+                ui.p(jobs.describe(queue, job)),
+                # Only offered once there is a result to download
+                ui.download_button("download", "Download Results"),
+            )
+        return ui.p(jobs.describe(queue, job))
+
+    def finished():
+        # The last job of this session, if it finished with results
+        job = current()
+        return job if job is not None and job.status == jobs.DONE else None
+
+    # Named after the calculator that was run, not whatever is selected now
+    @render.download_button(filename=lambda: f"{getattr(finished(), 'calculator', 'batch')}_results.csv")
+    def download():
+        job = finished()
+        if job is None:
+            raise ValueError("No batch run has finished yet")
+        return str(queue.result_path(job.id))
@@ -23,7 +23,7 @@ def crop_removal_ui():
             ]
         ),
 
-        ui.output_ui("yield_label"),
+        ui.input_numeric("yield", "Enter Yield (Ton/a at 15%):", value=1, min=0),
 
         ui.input_action_button("calc", "Calculate Crop Removal"),
         ui.br(), ui.br(),
@@ -41,71 +41,39 @@ def crop_removal_ui():
     )
 
 from shiny import module, ui, render, reactive
-import pandas as pd
+from engine import calculators, tables
+from engine.store import record_in_background
+from modules import resume
+from modules.results import result_html
 
-@module.server
-def crop_removal_server(input, output, session):
-    # Create crop data DataFrame
-    crop_data = pd.DataFrame({
-        "crop": [
-            "Alfalfa & Clover", "Bermudagrass", "Bromegrass", "Fescue, tall",
-            "Corn", "Corn silage", "Grain sorghum", "Sorghum silage",
-            "Wheat", "Sunflowers", "Oats", "Soybeans", "Native grass"
-        ],
-        "unit": [
-            "Ton", "Ton", "Ton", "Ton", "Bushel", "Ton", "Bushel", "Ton",
-            "Bushel", "Pound", "Bushel", "Bushel", "Ton"
-        ],
-        "moisture": [
-            "15%", "15%", "15%", "15%", "15.5%", "65%", "15.5%", "65%",
-            "13.5%", "10%", "14%", "13%", "15%"
-        ],
-        "P2O5": [12, 12, 12, 12, 0.33, 3.20, 0.40, 3.20, 0.50, 0.015, 0.25, 0.80, 5.40],
-        "K2O": [60, 40, 40, 40, 0.26, 8.70, 0.26, 8.70, 0.40, 0.006, 0.20, 1.40, 30],
-    })
+WIDGETS = {"nutrient": "radio", "crop": "select", "yield": "numeric"}
 
+@module.server
+def crop_removal_server(input, output, session, field_id=None, resume_token=None):
     # Result holder
-    result_text = reactive.Value("")
+    last_result = reactive.Value(None)
+    save_state = resume.track("removal", input, WIDGETS, resume_token, last_result)
 
-    @output
-    @render.ui
-    def yield_label():
-        crop = input.crop()
-        row = crop_data[crop_data["crop"] == crop].iloc[0]
-        label = f"Enter Yield ({row.unit}/a at {row.moisture}):"
-        return ui.input_numeric("yield", label, value=1, min=0)
+    # The yield input is created once in the UI; crop changes only relabel it
+    @reactive.Effect
+    @reactive.event(input.crop)
+    def update_yield_label():
+        unit, moisture, _, _ = tables.CROP_REMOVAL[input.crop()]
+        ui.update_numeric("yield", label=f"Enter Yield ({unit}/a at {moisture}):")
 
     @output
     @render.ui
     def result():
-        return ui.HTML(result_text())
+        return result_html(last_result())
 
     @reactive.Effect
     @reactive.event(input.calc)
     def calculate_removal():
-        if (
-            "yield" not in input
-            or input["yield"]() is None
-            or input["yield"]() <= 0
-            or input.crop() is None
-            or input.nutrient() is None
-        ):
-            result_text.set("Recommendation is not available. Please complete all input fields.")
-            return
-
-        crop = input.crop()
-        nutrient = input.nutrient()
-        yield_val = input["yield"]()
-
-        row = crop_data[crop_data["crop"] == crop].iloc[0]
-        coeff = row["P2O5"] if nutrient == "Phosphorus (P₂O₅)" else row["K2O"]
-        removal = max(int(round(yield_val * coeff)), 0)
-
-        result_text.set(
-            f"Crop: {row.crop}<br/>"
-            f"Unit: {row.unit} at {row.moisture}<br/>"
-            f"Nutrient: {nutrient}<br/>"
-            f"Removal Estimate: {removal} lb/a"
-        )
-
-
+        rec = calculators.crop_removal({
+            "nutrient": input.nutrient(),
+            "crop": input.crop(),
+            "yield": input["yield"](),
+        })
+        last_result.set(rec)
+        save_state(rec)
+        record_in_background(rec, field_id=field_id() if field_id else None)
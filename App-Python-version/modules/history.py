@@ -0,0 +1,56 @@
+from shiny import module, ui
+from htmltools import TagList
+
+@module.ui
+def history_ui():
+    return TagList(
+        ui.h2("Recommendation History"),
+        ui.p("Every recommendation calculated in the app or by a batch run is saved locally. "
+             "Filter by field, crop or nutrient to review past recommendations."),
+
+        ui.input_text("field", "Field ID:", value=""),
+        ui.input_text("crop", "Crop:", value=""),
+        ui.input_select("nutrient", "Nutrient:", choices={
+            "": "All", "N": "Nitrogen", "P2O5": "Phosphorus (P₂O₅)", "K2O": "Potassium (K₂O)",
+            "S": "Sulfur", "Cl": "Chloride", "B": "Boron", "Zn": "Zinc", "ECC": "Lime (ECC)"
+        }),
+        ui.input_numeric("limit", "Show most recent:", value=100, min=1),
+
+        ui.input_action_button("refresh", "Show History"),
+        ui.br(), ui.br(),
+        ui.output_ui("table"),
+        ui.br(), ui.br(), ui.br()
+    )
+
+
+import asyncio
+
+from shiny import module, ui, render, reactive
+from engine.store import get_store
+
+@module.server
+def history_server(input, output, session):
+    @output
+    @render.ui
+    @reactive.event(input.refresh)
+    async def table():
+        # Read on a worker thread, so a slow query does not hold up other sessions
+        df = await asyncio.to_thread(
+            get_store().history,
+            field_id=input.field() or None,
+            crop=input.crop() or None,
+            nutrient=input.nutrient() or None,
+            limit=input.limit() or 100
+        )
+        if df.empty:
+            return ui.p("No recommendations found.")
+
+        df = df.drop(columns=["details"])
+        html = df.to_html(
+            index=False,
+            border=0,
+            classes="table table-bordered table-sm",
+            justify="left",
+            na_rep=""
+        )
+        return ui.HTML(html)
@@ -1,5 +1,9 @@
 from shiny import module, ui, render, reactive
 from htmltools import TagList
+from engine import calculators
+from engine.store import record_in_background
+from modules import resume
+from modules.results import result_html
 
 @module.ui
 def lime_ui():
@@ -57,34 +61,26 @@ def lime_ui():
         ui.tags.img(src="lime_table.png", width="60%", alt="Lime Recommendation Table")
     )
 
+WIDGETS = {"target": "radio", "buffer_ph": "numeric", "depth": "numeric"}
+
 @module.server
-def lime_server(input, output, session):
-    result_text = reactive.Value("")
+def lime_server(input, output, session, field_id=None, resume_token=None):
+    last_result = reactive.Value(None)
+    save_state = resume.track("lime", input, WIDGETS, resume_token, last_result)
 
     @output
     @render.ui
     def result():
-        return ui.HTML(result_text())
+        return result_html(last_result())
 
     @reactive.Effect
     @reactive.event(input.calc)
     def calculate():
-        target = input.target()
-        buffer_ph = input.buffer_ph()
-        depth = input.depth()
-
-        if buffer_ph is None or depth is None:
-            result_text.set("Recommendation is not available. Please complete all input fields.")
-            return
-
-        formula = {
-            "Target pH 6.8": lambda bpH, d: (28300 - (7100 * bpH) + (bpH * bpH * 449)) * d,
-            "Target pH 6.0": lambda bpH, d: (14100 - (3540 * bpH) + (bpH * bpH * 224)) * d,
-            "Target pH 5.5": lambda bpH, d: (7060 - (1770 * bpH) + (bpH * bpH * 112)) * d,
-        }
-
-        calc_func = formula.get(target)
-        lime_rec = calc_func(buffer_ph, depth) if calc_func else 0
-        lime_rec = max(int(round(lime_rec)), 0)
-
-        result_text.set(f"Lime Recommendation: {lime_rec} lb ECC/a")
+        rec = calculators.lime({
+            "target": input.target(),
+            "buffer_ph": input.buffer_ph(),
+            "depth": input.depth(),
+        })
+        last_result.set(rec)
+        save_state(rec)
+        record_in_background(rec, field_id=field_id() if field_id else None)
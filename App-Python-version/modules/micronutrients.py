@@ -79,16 +79,23 @@ def micronutrients_ui():
     )
 
 from shiny import module, ui, render, reactive
+from engine import calculators
+from engine.store import record_in_background
+from modules import resume
+from modules.results import result_html
 
 
+WIDGETS = {"nutrient": "radio", "cl_ppm": "numeric", "b_ppm": "numeric", "zn_ppm": "numeric"}
+
 @module.server
-def micronutrients_server(input, output, session):
-    result_text = reactive.Value("")
+def micronutrients_server(input, output, session, field_id=None, resume_token=None):
+    last_result = reactive.Value(None)
+    save_state = resume.track("micro", input, WIDGETS, resume_token, last_result)
 
     @output
     @render.ui
     def result():
-        return ui.HTML(result_text())
+        return result_html(last_result())
 
     @reactive.Effect
     @reactive.event(input.calc)
@@ -97,45 +104,14 @@ def micronutrients_server(input, output, session):
 
         # Validate required inputs
         if nutrient is None:
-            result_text.set("Recommendation is not available. Please complete all input fields.")
+            last_result.set("Recommendation is not available. Please complete all input fields.")
+            return
+        if nutrient not in calculators.MICRONUTRIENT_SPECS:
+            last_result.set(f"Recommendation for {nutrient}: Unknown nutrient selection.")
             return
 
-        if nutrient == "Chloride":
-            if "cl_ppm" not in input or input["cl_ppm"]() is None:
-                result_text.set("Recommendation is not available. Please complete all input fields.")
-                return
-            ppm = input["cl_ppm"]()
-            if ppm < 4:
-                recommendation = "20 lb Cl/a"
-            elif ppm <= 6:
-                recommendation = "10 lb Cl/a"
-            else:
-                recommendation = "No chloride needed"
-
-        elif nutrient == "Boron":
-            if "b_ppm" not in input or input["b_ppm"]() is None:
-                result_text.set("Recommendation is not available. Please complete all input fields.")
-                return
-            ppm = input["b_ppm"]()
-            if ppm < 0.5:
-                recommendation = "2 lb B/a"
-            elif ppm <= 1.0:
-                recommendation = "1 lb B/a"
-            else:
-                recommendation = "No boron needed"
-
-        elif nutrient == "Zinc":
-            if "zn_ppm" not in input or input["zn_ppm"]() is None:
-                result_text.set("Recommendation is not available. Please complete all input fields.")
-                return
-            ppm = input["zn_ppm"]()
-            if ppm > 1.0:
-                recommendation = "No zinc needed"
-            else:
-                rate = max(1, int(round(11.5 - 11.25 * ppm)))
-                recommendation = f"{rate} lb Zn/a"
-
-        else:
-            recommendation = "Unknown nutrient selection."
-
-        result_text.set(f"Recommendation for {nutrient}: {recommendation}")
+        (name,) = calculators.MICRONUTRIENT_SPECS[nutrient]
+        rec = calculators.micronutrient(nutrient, {name: input[name]() if name in input else None})
+        last_result.set(rec)
+        save_state(rec)
+        record_in_background(rec, field_id=field_id() if field_id else None)
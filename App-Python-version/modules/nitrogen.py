@@ -1,21 +1,31 @@
+import json
+
 from shiny import module, ui
 from htmltools import TagList
+from engine import tables
+
+# Internal efficiency choices and default per crop
+IE_CHOICES = {
+    "Corn": ({"0.84": "Irrigated (0.84 lbs/bu)", "0.88": "Non-Irrigated (0.88 lbs/bu)"}, "0.84"),
+    "Grain Sorghum": ({"1.20": "Default (1.20 lbs/bu)"}, "1.20"),
+    "Wheat": ({"1.45": "Default (1.45 lbs/bu)"}, "1.45"),
+}
 
 @module.ui
 def nitrogen_ui():
     return TagList(
         ui.h2("Nitrogen Fertilizer Recommendation"),
 
-        ui.input_select("crop", "Crop:", choices=[
-            "Corn", "Grain Sorghum", "Wheat", "Sunflower", "Oats",
-            "Corn Silage", "Sorghum Silage", "Brome", "Fescue", "Bermudagrass"
-        ]),
+        ui.input_select("crop", "Crop:", choices=tables.NITROGEN_CROPS),
 
         # Efficiency inputs for select crops
         ui.panel_conditional(
-            "['Corn','Grain Sorghum','Wheat'].includes(input.crop)",
+            f"{json.dumps(tables.EFFICIENCY_CROPS)}.includes(input.crop)",
             TagList(
-                ui.output_ui("ie_input_ui"),
+                ui.input_select(
+                    "ie_input", "Internal Crop Efficiency (ie):",
+                    choices=IE_CHOICES["Corn"][0], selected=IE_CHOICES["Corn"][1]
+                ),
                 ui.input_select(
                     "fertilizer", "Fertilizer Efficiency (fe):",
                     choices={
@@ -37,9 +47,9 @@ def nitrogen_ui():
 
         # Standard input panel (non-forage crops)
         ui.panel_conditional(
-            "!['Brome','Fescue','Bermudagrass'].includes(input.crop)",
+            f"!{json.dumps(tables.FORAGE_CROPS)}.includes(input.crop)",
             TagList(
-                ui.output_ui("yield_label"),
+                ui.input_numeric("yield", "Expected Yield (bu/a):", value=150),
                 ui.input_numeric("om", "Soil Organic Matter (%):", value=2.1, step=0.1, min=0),
                 ui.input_numeric("profile_n", "Profile Nitrate-N (lb/a):", value=30, min=0),
                 ui.input_numeric("manure_n", "Manure N (lb/a):", value=0, min=0),
@@ -54,20 +64,20 @@ def nitrogen_ui():
                 ),
 
 
-                ui.input_select("previous_crop_main", "Previous Crop Adjustment:", choices=[
-                    "Corn/Wheat", "Sorghum/Sunflower", "Soybean", "Fallow",
-                    "Alfalfa", "Red Clover", "Sweet Clover"
-                ]),
-                ui.output_ui("previous_crop_detail")
+                ui.input_select("previous_crop_main", "Previous Crop Adjustment:", choices=tables.PREVIOUS_CROPS),
+                ui.panel_conditional(
+                    f"{json.dumps(list(tables.PREVIOUS_CROP_CONDITIONS))}.includes(input.previous_crop_main)",
+                    ui.input_select("previous_crop_condition", "Crop Condition or Management:", choices=[])
+                )
             )
         ),
 
         # Forage-specific panel
         ui.panel_conditional(
-            "['Brome','Fescue','Bermudagrass'].includes(input.crop)",
+            f"{json.dumps(tables.FORAGE_CROPS)}.includes(input.crop)",
             TagList(
                 ui.input_select("forage_yield", "Expected Yield (ton/a):",
-                                choices=[2, 4, 6, 8, 10], selected=6),
+                                choices=tables.FORAGE_YIELDS, selected=6),
                 ui.input_checkbox("new_seeding", "New Seeding? (+20 lb N/a)", value=False)
             )
         ),
@@ -83,155 +93,76 @@ def nitrogen_ui():
 
 
 from shiny import module, ui, render, reactive
+from engine import calculators
+from engine.store import record_in_background
+from modules import resume
+from modules.results import result_html
+
+# Inputs saved for session resume; the ie and crop condition choices depend on other inputs
+WIDGETS = {
+    "crop": "select", "ie_input": ("select", lambda values: IE_CHOICES.get(values.get("crop"), ({},))[0]),
+    "fertilizer": "select", "texture": "select", "yield": "numeric", "om": "numeric", "profile_n": "numeric",
+    "manure_n": "numeric", "other_n": "numeric", "tillage": "select", "previous_crop_main": "select",
+    "previous_crop_condition": ("select", lambda values: tables.PREVIOUS_CROP_CONDITIONS.get(
+        values.get("previous_crop_main"), [])),
+    "forage_yield": "select", "new_seeding": "checkbox",
+}
 
 @module.server
-def nitrogen_server(input, output, session):
-    result_text = reactive.Value("")
+def nitrogen_server(input, output, session, field_id=None, resume_token=None):
+    last_result = reactive.Value(None)
+    restoring = {}
+    save_state = resume.track("nitro", input, WIDGETS, resume_token, last_result, restoring)
 
-    @output
-    @render.ui
-    def yield_label():
-        crop = input.crop()
-        label = {
-            "Corn": "Expected Yield (bu/a):",
-            "Grain Sorghum": "Expected Yield (bu/a):",
-            "Wheat": "Expected Yield (bu/a):",
-            "Sunflower": "Expected Yield (bu/a):",
-            "Oats": "Expected Yield (bu/a):",
-            "Corn Silage": "Expected Yield (ton/a):",
-            "Sorghum Silage": "Expected Yield (ton/a):",
-            "Brome": "Expected Yield (ton/a):",
-            "Fescue": "Expected Yield (ton/a):",
-            "Bermudagrass": "Expected Yield (ton/a):"
-        }.get(crop, "Expected Yield:")
-        return ui.input_numeric("yield", label, value=150)
-
-    # Internal efficiency
-    @output
-    @render.ui
-    def ie_input_ui():
+    # Inputs are created once in the UI; crop changes only relabel them
+    @reactive.Effect
+    @reactive.event(input.crop)
+    def update_crop_inputs():
         crop = input.crop()
+        unit = tables.NITROGEN_YIELD_UNITS.get(crop)
+        ui.update_numeric("yield", label=f"Expected Yield ({unit}):" if unit else "Expected Yield:")
+        if crop in IE_CHOICES:
+            choices, selected = IE_CHOICES[crop]
+            # A restored session keeps its own choice
+            if restoring.get("ie_input") in choices:
+                selected = restoring.pop("ie_input")
+            ui.update_select("ie_input", choices=choices, selected=selected)
 
-        if crop == "Corn":
-            choices = {
-                "0.84": "Irrigated (0.84 lbs/bu)",
-                "0.88": "Non-Irrigated (0.88 lbs/bu)"
-            }
-            selected = "0.84"
-        elif crop == "Grain Sorghum":
-            choices = {
-                "1.20": "Default (1.20 lbs/bu)"
-            }
-            selected = "1.20"
-        elif crop == "Wheat":
-            choices = {
-                "1.45": "Default (1.45 lbs/bu)"
-            }
-            selected = "1.45"
-        else:
-            return None
-
-        return ui.input_select(
-            "ie_input",
-            "Internal Crop Efficiency (ie):",
-            choices=choices,
-            selected=selected
-        )
-
-    @output
-    @render.ui
-    def previous_crop_detail():
-        main = input.previous_crop_main()
-        crop_options = {
-            "Alfalfa": ["Excellent Stand", "Good Stand", "Fair Stand", "Poor Stand"],
-            "Red Clover": ["Excellent Stand", "Good Stand", "Poor Stand"],
-            "Sweet Clover": ["Excellent Stand", "Good Stand", "Poor Stand"],
-            "Fallow": ["Without Profile N Test", "With Profile N Test"]
-        }
-        options = crop_options.get(main)
+    @reactive.Effect
+    @reactive.event(input.previous_crop_main)
+    def update_previous_crop_condition():
+        options = tables.PREVIOUS_CROP_CONDITIONS.get(input.previous_crop_main())
         if options:
-            return ui.input_select("previous_crop_condition", "Crop Condition or Management:",
-                                   choices=options, selected="Good Stand" if "Good Stand" in options else options[0])
-        return None
+            selected = "Good Stand" if "Good Stand" in options else options[0]
+            if restoring.get("previous_crop_condition") in options:
+                selected = restoring.pop("previous_crop_condition")
+            ui.update_select("previous_crop_condition", choices=options, selected=selected)
 
     @output
     @render.ui
     def result():
-        return ui.HTML(result_text())
+        return result_html(last_result())
 
     @reactive.Effect
     @reactive.event(input.calc)
     def calculate():
-        crop = input.crop()
-        EY = input["yield"]()
-        OM = input.om()
-        profile_n = input.profile_n()
-        manure_n = input.manure_n()
-        other_n = input.other_n()
-        main = input.previous_crop_main()
-        cond = input["previous_crop_condition"]() if "previous_crop_condition" in input else ""
-        print("DEBUG: cond =", cond)
-
-        tillage_adj = int(input.tillage()) if crop in ["Wheat", "Oats"] else 0
-
-        ie = float(input.ie_input()) if crop in ["Corn", "Grain Sorghum", "Wheat"] else None
-        fe = float(input.fertilizer()) if crop in ["Corn", "Grain Sorghum", "Wheat"] else None
-        se = float(input.texture()) if crop in ["Corn", "Grain Sorghum", "Wheat"] else None
-
-
-        prev_crop_adj = 0
-        if crop in ["Wheat", "Oats"]:
-            prev_crop_adj = {
-                "Corn/Wheat": 0,
-                "Sorghum/Sunflower": 30,
-                "Soybean": 0,
-                "Fallow": {"With Profile N Test": 0, "Without Profile N Test": -20}.get(cond, 0),
-                "Alfalfa": {"Excellent Stand": -60, "Good Stand": -40, "Fair Stand": -20, "Poor Stand": 0}.get(cond, 0),
-                "Red Clover": {"Excellent Stand": -40, "Good Stand": -20, "Poor Stand": 0}.get(cond, 0),
-                "Sweet Clover": {"Excellent Stand": -55, "Good Stand": -30, "Poor Stand": 0}.get(cond, 0)
-            }.get(main, 0)
-        else:
-            prev_crop_adj = {
-                "Corn/Wheat": 0,
-                "Sorghum/Sunflower": 0,
-                "Soybean": -40,
-                "Fallow": {"With Profile N Test": 0, "Without Profile N Test": -20}.get(cond, 0),
-                "Alfalfa": {"Excellent Stand": -120, "Good Stand": -80, "Fair Stand": -40, "Poor Stand": 0}.get(cond, 0),
-                "Red Clover": {"Excellent Stand": -80, "Good Stand": -40, "Poor Stand": 0}.get(cond, 0),
-                "Sweet Clover": {"Excellent Stand": -110, "Good Stand": -60, "Poor Stand": 0}.get(cond, 0)
-            }.get(main, 0)
-
-        forage_n_base = {2: 80, 4: 160, 6: 240, 8: 320, 10: 400}.get(int(input.forage_yield()), 0)
-        forage_n_extra = 20 if input.new_seeding() else 0
-
-        try:
-            if crop == "Corn":
-                n = (ie / fe) * EY - se * profile_n - (OM * 20) - manure_n - other_n + prev_crop_adj
-            elif crop == "Grain Sorghum":
-                n = (ie / fe) * EY - se * profile_n - (OM * 20) - manure_n - other_n + prev_crop_adj
-            elif crop == "Wheat":
-                n = (ie / fe) * EY - se * profile_n - (OM * 10) - manure_n - other_n + prev_crop_adj + tillage_adj
-            elif crop == "Sunflower":
-                n = (EY * 0.075) - (OM * 20) - profile_n - manure_n - other_n + prev_crop_adj
-            elif crop == "Oats":
-                n = (EY * 1.3) - (OM * 10) - profile_n - other_n + prev_crop_adj + tillage_adj
-            elif crop in ["Corn Silage", "Sorghum Silage"]:
-                n = (EY * 10.67) - (OM * 20) - profile_n - manure_n - other_n + prev_crop_adj
-            elif crop in ["Brome", "Fescue", "Bermudagrass"]:
-                n = forage_n_base + forage_n_extra
-            else:
-                n = None
-        except:
-            n = None
-
-        if n is None:
-            result_text.set("Nitrogen recommendation is not available. Please complete all input fields.")
-        else:
-            n_final = max(0, round(n))
-            if n_final == 0:
-                result_text.set(
-                    "Recommended Nitrogen Rate: 0 lb/a<br/>"
-                    "Note: A minimum fertilizer N application of 30 lb N/a is recommended for early crop growth and development."
-                )
-            else:
-                result_text.set(f"Recommended Nitrogen Rate: {n_final} lb/a")
+        rec = calculators.nitrogen({
+            "crop": input.crop(),
+            "yield": input["yield"](),
+            "om": input.om(),
+            "profile_n": input.profile_n(),
+            "manure_n": input.manure_n(),
+            "other_n": input.other_n(),
+            "tillage": input.tillage(),
+            "previous_crop": input.previous_crop_main(),
+            "previous_crop_condition": input.previous_crop_condition()
+            if input.previous_crop_main() in tables.PREVIOUS_CROP_CONDITIONS else "",
+            "ie": input.ie_input(),
+            "fe": input.fertilizer(),
+            "se": input.texture(),
+            "forage_yield": input.forage_yield(),
+            "new_seeding": input.new_seeding(),
+        })
+        last_result.set(rec)
+        save_state(rec)
+        record_in_background(rec, field_id=field_id() if field_id else None)
@@ -34,7 +34,7 @@ def phosphorus_ui():
                 "Corn Silage", "Sorghum Silage", "Brome and Fescue", "New Brome and Fescue",
                 "Bermudagrass", "New Bermudagrass", "Alfalfa and Clover", "New Alfalfa and Clover"
             ]),
-            ui.output_ui("yield_label"),
+            ui.input_numeric("yield", "Expected Yield (bu/a):", value=150, min=0),
             ui.input_numeric("mehlich", "Mehlich-3 P (ppm):", value=10, min=0)
         ),
 
@@ -72,37 +72,30 @@ def phosphorus_ui():
     )
 
 from shiny import module, ui, render, reactive
+from engine import calculators, tables
+from engine.store import record_in_background
+from modules import resume
+from modules.results import result_html
+
+WIDGETS = {"mode": "radio", "crop": "select", "yield": "numeric", "mehlich": "numeric", "crop_bm": "select",
+           "current_p": "numeric", "years": "numeric", "removal": "numeric"}
 
 @module.server
-def phosphorus_server(input, output, session):
-    result_text = reactive.Value("")
+def phosphorus_server(input, output, session, field_id=None, resume_token=None):
+    last_result = reactive.Value(None)
+    save_state = resume.track("p", input, WIDGETS, resume_token, last_result)
 
-    @output
-    @render.ui
-    def yield_label():
-        crop = input.crop()
-        unit = {
-            "Corn": "Expected Yield (bu/a):",
-            "Wheat": "Expected Yield (bu/a):",
-            "Grain Sorghum": "Expected Yield (bu/a):",
-            "Soybean": "Expected Yield (bu/a):",
-            "Sunflower": "Expected Yield (lb/a):",
-            "Oats": "Expected Yield (bu/a):",
-            "Corn Silage": "Expected Yield (ton/a):",
-            "Sorghum Silage": "Expected Yield (ton/a):",
-            "Brome and Fescue": "Expected Yield (ton/a):",
-            "New Brome and Fescue": "Expected Yield (ton/a):",
-            "Bermudagrass": "Expected Yield (ton/a):",
-            "New Bermudagrass": "Expected Yield (ton/a):",
-            "Alfalfa and Clover": "Expected Yield (ton/a):",
-            "New Alfalfa and Clover": "Expected Yield (ton/a):"
-        }.get(crop, "Expected Yield:")
-        return ui.input_numeric("yield", unit, value=150, min=0)
+    # The yield input is created once in the UI; crop changes only relabel it
+    @reactive.Effect
+    @reactive.event(input.crop)
+    def update_yield_label():
+        unit = tables.SUFFICIENCY_YIELD_UNITS.get(input.crop())
+        ui.update_numeric("yield", label=f"Expected Yield ({unit}):" if unit else "Expected Yield:")
 
     @output
     @render.ui
     def result():
-        return ui.HTML(result_text())
+        return result_html(last_result())
 
     @reactive.Effect
     @reactive.event(input.calc)
@@ -110,60 +103,21 @@ def phosphorus_server(input, output, session):
         mode = input.mode()
 
         if mode == "Sufficiency":
-            crop = input.crop()
-            yield_val = input["yield"]()
-            p = input.mehlich()
-
-            if crop is None or yield_val is None or p is None:
-                result_text.set("Phosphorus recommendation is not available. Please complete all input fields.")
-                return
-
-            cstv = 25 if crop in ["Bermudagrass", "New Bermudagrass", "Alfalfa and Clover", "New Alfalfa and Clover"] else 20
-
-            if p >= cstv:
-                p_rec = 0
-            else:
-                formulas = {
-                    "Corn": lambda y, p: 50 + (y * 0.2) + (p * -2.5) + (y * p * -0.01),
-                    "Wheat": lambda y, p: 46 + (y * 0.42) + (p * -2.3) + (y * p * -0.021),
-                    "Grain Sorghum": lambda y, p: 50 + (y * 0.16) + (p * -2.5) + (y * p * -0.008),
-                    "Soybean": lambda y, p: 56 + (y * 0.51) + (p * -2.8) + (y * p * -0.0257),
-                    "Sunflower": lambda y, p: 42 + (y * 0.01) + (p * -2.1) + (y * p * -0.0005),
-                    "Oats": lambda y, p: 47 + (y * 0.25) + (p * -2.3) + (y * p * -0.013),
-                    "Corn Silage": lambda y, p: 56 + (y * 1.12) + (p * -2.8) + (y * p * -0.056),
-                    "Sorghum Silage": lambda y, p: 48 + (y * 1.19) + (p * -2.38) + (y * p * -0.0594),
-                    "Brome and Fescue": lambda y, p: 44 + (y * 6.3) + (p * -2.2) + (y * p * -0.315),
-                    "New Brome and Fescue": lambda y, p: 68 + (y * 11.2) + (p * -2.2) + (y * p * -0.315),
-                    "Bermudagrass": lambda y, p: 64 + (y * 5.3) + (p * -2.56) + (y * p * -0.21),
-                    "New Bermudagrass": lambda y, p: 64 + (y * 9.1) + (p * -2.56) + (y * p * -0.21),
-                    "Alfalfa and Clover": lambda y, p: 73 + (y * 4.56) + (p * -2.92) + (y * p * -0.18),
-                    "New Alfalfa and Clover": lambda y, p: 84 + (y * 12) + (p * -3.37) + (y * p * -0.48),
-                }
-                p_rec = formulas[crop](yield_val, p)
-
-            p_rec = max(round(p_rec), 0)
-
-            result_text.set(
-                f"[Sufficiency]<br/>Recommended Phosphorus (P₂O₅) Rate: {p_rec} lb/a"
-            )
-
+            rec = calculators.phosphorus({
+                "crop": input.crop(),
+                "yield": input["yield"](),
+                "mehlich": input.mehlich(),
+            })
         elif mode == "Build & Maintenance":
-            current_p = input.current_p()
-            years = input.years()
-            removal = input.removal()
-            crop_bm = input.crop_bm()
-
-            if current_p is None or years is None or removal is None:
-                result_text.set("Phosphorus recommendation is not available. Please complete all input fields.")
-                return
-
-            cstv = 25 if crop_bm == "Alfalfa and Clover" else 20
-            build_amt = (cstv - current_p) * 18
-            total_p = max(round(build_amt + (removal * years)), 0)
-            yearly_p = round(total_p / years) if years > 0 else total_p
-
-            result_text.set(
-                f"[Build & Maintenance]<br/>"
-                f"Total Phosphorus (P₂O₅) Recommendation: {total_p} lb/a over {years} years<br/>"
-                f"→ {yearly_p} lb/a each year"
-            )
+            rec = calculators.phosphorus_build({
+                "crop": input.crop_bm(),
+                "current": input.current_p(),
+                "years": input.years(),
+                "removal": input.removal(),
+            })
+        else:
+            return
+
+        last_result.set(rec)
+        save_state(rec)
+        record_in_background(rec, field_id=field_id() if field_id else None)
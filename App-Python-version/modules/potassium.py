@@ -29,7 +29,7 @@ def potassium_ui():
                 "Corn Silage", "Sorghum Silage", "Brome and Fescue", "New Brome and Fescue",
                 "Bermudagrass", "New Bermudagrass", "Alfalfa and Clover", "New Alfalfa and Clover"
             ]),
-            ui.output_ui("yield_label"),
+            ui.input_numeric("yield", "Expected Yield (bu/a):", value=150, min=0),
             ui.input_numeric("mehlich_k", "Mehlich-3 K (ppm):", value=100, min=0)
         ),
 
@@ -66,37 +66,30 @@ def potassium_ui():
     )
 
 from shiny import module, ui, render, reactive
+from engine import calculators, tables
+from engine.store import record_in_background
+from modules import resume
+from modules.results import result_html
+
+WIDGETS = {"mode": "radio", "crop": "select", "yield": "numeric", "mehlich_k": "numeric", "crop_bm": "select",
+           "current_k": "numeric", "years": "numeric", "removal": "numeric"}
 
 @module.server
-def potassium_server(input, output, session):
-    result_text = reactive.Value("")
+def potassium_server(input, output, session, field_id=None, resume_token=None):
+    last_result = reactive.Value(None)
+    save_state = resume.track("k", input, WIDGETS, resume_token, last_result)
 
-    @output
-    @render.ui
-    def yield_label():
-        crop = input.crop()
-        unit = {
-            "Corn": "Expected Yield (bu/a):",
-            "Wheat": "Expected Yield (bu/a):",
-            "Grain Sorghum": "Expected Yield (bu/a):",
-            "Soybean": "Expected Yield (bu/a):",
-            "Sunflower": "Expected Yield (lb/a):",
-            "Oats": "Expected Yield (bu/a):",
-            "Corn Silage": "Expected Yield (ton/a):",
-            "Sorghum Silage": "Expected Yield (ton/a):",
-            "Brome and Fescue": "Expected Yield (ton/a):",
-            "New Brome and Fescue": "Expected Yield (ton/a):",
-            "Bermudagrass": "Expected Yield (ton/a):",
-            "New Bermudagrass": "Expected Yield (ton/a):",
-            "Alfalfa and Clover": "Expected Yield (ton/a):",
-            "New Alfalfa and Clover": "Expected Yield (ton/a):"
-        }.get(crop, "Expected Yield:")
-        return ui.input_numeric("yield", unit, value=150, min=0)
+    # The yield input is created once in the UI; crop changes only relabel it
+    @reactive.Effect
+    @reactive.event(input.crop)
+    def update_yield_label():
+        unit = tables.SUFFICIENCY_YIELD_UNITS.get(input.crop())
+        ui.update_numeric("yield", label=f"Expected Yield ({unit}):" if unit else "Expected Yield:")
 
     @output
     @render.ui
     def result():
-        return ui.HTML(result_text())
+        return result_html(last_result())
 
     @reactive.Effect
     @reactive.event(input.calc)
@@ -104,60 +97,21 @@ def potassium_server(input, output, session):
         mode = input.mode()
 
         if mode == "Sufficiency":
-            crop = input.crop()
-            yield_val = input["yield"]()
-            k = input.mehlich_k()
-
-            if crop is None or yield_val is None or k is None:
-                result_text.set("Potassium recommendation is not available. Please complete all input fields.")
-                return
-
-            cstv = 150 if crop in ["Bermudagrass", "New Bermudagrass", "Alfalfa and Clover", "New Alfalfa and Clover"] else 130
-
-            if k >= cstv:
-                k_rec = 0
-            else:
-                formulas = {
-                    "Corn": lambda y, k: 73 + (y * 0.21) + (k * -0.565) + (y * k * -0.0016),
-                    "Wheat": lambda y, k: 62 + (y * 0.24) + (k * -0.48) + (y * k * -0.0018),
-                    "Grain Sorghum": lambda y, k: 80 + (y * 0.17) + (k * -0.616) + (y * k * -0.0013),
-                    "Soybean": lambda y, k: 60 + (y * 0.628) + (k * -0.46) + (y * k * -0.0048),
-                    "Sunflower": lambda y, k: 88 + (y * 0.008) + (k * -0.622) + (y * k * -0.00006),
-                    "Oats": lambda y, k: 62 + (y * 0.221) + (k * -0.48) + (y * k * -0.0017),
-                    "Corn Silage": lambda y, k: 74 + (y * 1.50) + (k * -0.567) + (y * k * -0.0115),
-                    "Sorghum Silage": lambda y, k: 73 + (y * 1.8) + (k * -0.56) + (y * k * -0.0139),
-                    "Brome and Fescue": lambda y, k: 41 + (y * 5.85) + (k * -0.315) + (y * k * -0.045),
-                    "New Brome and Fescue": lambda y, k: 91 + (y * 15) + (k * -0.7) + (y * k * -0.116),
-                    "Bermudagrass": lambda y, k: 75 + (y * 5.3) + (k * -2.56) + (y * k * -0.21),
-                    "New Bermudagrass": lambda y, k: 105 + (y * 15) + (k * -0.7) + (y * k * -0.1),
-                    "Alfalfa and Clover": lambda y, k: 84 + (y * 5.24) + (k * -0.56) + (y * k * -0.035),
-                    "New Alfalfa and Clover": lambda y, k: 105 + (y * 15) + (k * -0.7) + (y * k * -0.1)
-                }
-                k_rec = formulas[crop](yield_val, k)
-
-            k_rec = max(round(k_rec), 0)
-
-            result_text.set(
-                f"[Sufficiency]<br/>Recommended Potassium (K₂O) Rate: {k_rec} lb/a"
-            )
-
+            rec = calculators.potassium({
+                "crop": input.crop(),
+                "yield": input["yield"](),
+                "mehlich_k": input.mehlich_k(),
+            })
         elif mode == "Build & Maintenance":
-            current_k = input.current_k()
-            years = input.years()
-            removal = input.removal()
-            crop_bm = input.crop_bm()
-
-            if current_k is None or years is None or removal is None:
-                result_text.set("Potassium recommendation is not available. Please complete all input fields.")
-                return
-
-            cstv = 150 if crop_bm == "Alfalfa and Clover" else 130
-            build_amt = (cstv - current_k) * 9
-            total_k = max(round(build_amt + (removal * years)), 0)
-            yearly_k = round(total_k / years) if years > 0 else total_k
-
-            result_text.set(
-                f"[Build & Maintenance]<br/>"
-                f"Total Potassium (K₂O) Recommendation: {total_k} lb/a over {years} years<br/>"
-                f"→ {yearly_k} lb/a each year"
-            )
+            rec = calculators.potassium_build({
+                "crop": input.crop_bm(),
+                "current": input.current_k(),
+                "years": input.years(),
+                "removal": input.removal(),
+            })
+        else:
+            return
+
+        last_result.set(rec)
+        save_state(rec)
+        record_in_background(rec, field_id=field_id() if field_id else None)
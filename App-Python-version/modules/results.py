@@ -0,0 +1,73 @@
+# Display text for engine Recommendations. Calculators return numbers and
+# flags only; everything a user reads is built here.
+
+from shiny import ui
+from engine.results import NOTES, NUTRIENT_NAMES
+
+NOT_AVAILABLE = {
+    "nitrogen": "Nitrogen recommendation is not available.",
+    "phosphorus": "Phosphorus recommendation is not available.",
+    "phosphorus_build": "Phosphorus recommendation is not available.",
+    "potassium": "Potassium recommendation is not available.",
+    "potassium_build": "Potassium recommendation is not available.",
+    "sulfur": "Sulfur recommendation is not available.",
+}
+
+
+def _nitrogen(rec):
+    return f"Recommended Nitrogen Rate: {rec.rate} lb/a"
+
+
+def _sufficiency(rec):
+    return f"[Sufficiency]<br/>Recommended {NUTRIENT_NAMES[rec.nutrient]} Rate: {rec.rate} lb/a"
+
+
+def _build(rec):
+    return (
+        f"[Build & Maintenance]<br/>"
+        f"Total {NUTRIENT_NAMES[rec.nutrient]} Recommendation: {rec.details['total']} lb/a "
+        f"over {rec.details['years']} years<br/>"
+        f"→ {rec.rate} lb/a each year"
+    )
+
+
+def _sulfur(rec):
+    return f"Recommended Sulfur Rate: {rec.rate} lb/a"
+
+
+def _micronutrient(rec):
+    name = NUTRIENT_NAMES[rec.nutrient]
+    amount = f"{rec.rate} lb {rec.nutrient}/a" if rec.rate else f"No {name.lower()} needed"
+    return f"Recommendation for {name}: {amount}"
+
+
+def _lime(rec):
+    return f"Lime Recommendation: {rec.rate} lb ECC/a"
+
+
+def _crop_removal(rec):
+    return (
+        f"Crop: {rec.crop}<br/>"
+        f"Unit: {rec.details['yield_unit']} at {rec.details['moisture']}<br/>"
+        f"Nutrient: {NUTRIENT_NAMES[rec.nutrient]}<br/>"
+        f"Removal Estimate: {rec.rate} lb/a"
+    )
+
+
+FORMATS = {
+    "nitrogen": _nitrogen, "phosphorus": _sufficiency, "potassium": _sufficiency,
+    "phosphorus_build": _build, "potassium_build": _build, "sulfur": _sulfur,
+    "micronutrients": _micronutrient, "lime": _lime, "crop_removal": _crop_removal,
+}
+
+
+def result_html(rec):
+    """HTML for a Recommendation, or for a plain status message."""
+    if rec is None:
+        return ui.HTML("")
+    if isinstance(rec, str):
+        return ui.HTML(rec)
+    if rec.error is not None:
+        return ui.HTML(f"{NOT_AVAILABLE.get(rec.calculator, 'Recommendation is not available.')} {rec.error}")
+    lines = [FORMATS[rec.calculator](rec)] + [NOTES[flag] for flag in rec.flags if flag in NOTES]
+    return ui.HTML("<br/>".join(lines))
@@ -0,0 +1,111 @@
+# Session resume. The browser keeps a random token for the tab (in sessionStorage,
+# so it survives a reload or a dropped connection), and each calculator tab saves
+# its inputs and last result under it. A new session started with a known token
+# puts them back: inputs are updated in place and the saved result is shown
+# again, without recalculating anything.
+
+import asyncio
+
+from shiny import reactive, ui
+from engine.results import from_json, to_json
+from engine.store import get_store, prune_snapshots_in_background, save_snapshot_in_background
+
+TOKEN_INPUT = "resume_token"
+
+TOKEN_SCRIPT = ui.tags.script("""
+$(document).on("shiny:connected", function() {
+    var token = null;
+    try {
+        token = sessionStorage.getItem("fertrecks-resume");
+        if (!token) {
+            token = window.crypto && crypto.randomUUID ? crypto.randomUUID()
+                : Date.now().toString(36) + Math.random().toString(36).slice(2);
+            sessionStorage.setItem("fertrecks-resume", token);
+        }
+    } catch (e) {
+        return;  // storage disabled: sessions start fresh
+    }
+    Shiny.setInputValue("resume_token", token);
+});
+""")
+
+UPDATES = {
+    "select": lambda id, value, choices: ui.update_select(id, selected=value, **choices),
+    "radio": lambda id, value, choices: ui.update_radio_buttons(id, selected=value, **choices),
+    "numeric": lambda id, value, choices: ui.update_numeric(id, value=value),
+    "text": lambda id, value, choices: ui.update_text(id, value=value),
+    "checkbox": lambda id, value, choices: ui.update_checkbox(id, value=bool(value)),
+}
+
+_pruned = False
+
+
+def current(token):
+    """The session's token, or None until the browser has sent one (or if it never does)."""
+    return (token() or None) if token is not None and token.is_set() else None
+
+
+def track(module, input, widgets, token, last_result=None, restoring=None):
+    """Save and restore one tab's state; returns ``save(rec)`` for its calculate effect.
+
+    ``widgets`` maps input ids to their kind ("select", "radio", "numeric",
+    "text" or "checkbox"), or to (kind, choices) where ``choices(values)``
+    gives the options of a select that depend on other inputs. Restored
+    values of those selects are also left in ``restoring``, for the effects
+    that reset them when the inputs they depend on change; they are cleared
+    once the browser has reported the restored inputs back, so a later
+    change of those inputs gets the usual defaults.
+    """
+    if token is None:
+        return lambda rec: None
+    global _pruned
+    if not _pruned:
+        # Tabs not seen for a month are forgotten, checked once per server process
+        _pruned = True
+        prune_snapshots_in_background()
+    state = {"loaded": False, "inputs": None, "result": None}
+
+    def write():
+        if current(token):
+            save_snapshot_in_background(current(token), module, {"inputs": state["inputs"], "result": state["result"]})
+
+    # Runs after the tab's own effects, which take their restored values first
+    @reactive.Effect(priority=-1)
+    async def sync():
+        if not current(token):
+            return
+        values = {id: input[id]() if id in input else None for id in widgets}
+        if state["loaded"]:
+            if restoring:
+                restoring.clear()
+            if values != state["inputs"]:
+                state["inputs"] = values
+                write()
+            return
+        # The first run after the token arrives restores instead of saving the page defaults
+        state["loaded"] = True
+        # Read on a worker thread, so a reconnect never holds up the other sessions
+        snapshot = await asyncio.to_thread(get_store().load_snapshot, current(token), module)
+        if snapshot is None:
+            state["inputs"] = values
+            write()
+            return
+        state["inputs"], state["result"] = snapshot["inputs"], snapshot["result"]
+        for id, widget in widgets.items():
+            value = state["inputs"].get(id)
+            if value is None or value == values.get(id):
+                continue
+            kind, choices = widget if isinstance(widget, tuple) else (widget, None)
+            options = {"choices": choices(state["inputs"])} if choices is not None else {}
+            if choices is not None and restoring is not None:
+                restoring[id] = value
+            UPDATES[kind](id, value, options)
+        if last_result is not None and state["result"] is not None:
+            last_result.set(from_json(state["result"]))
+
+    def save(rec):
+        state["result"] = to_json(rec)
+        write()
+
+    return save
+
@@ -1,5 +1,9 @@
 from shiny import module, ui, render, reactive
 from htmltools import TagList
+from engine import calculators, tables
+from engine.store import record_in_background
+from modules import resume
+from modules.results import result_html
 
 @module.ui
 def sulfur_ui():
@@ -15,7 +19,7 @@ def sulfur_ui():
             "Corn", "Grain Sorghum", "Corn Silage", "Sorghum Silage", "Wheat",
             "Soybean", "Sunflower", "Brome", "Fescue", "Bermudagrass", "Alfalfa"
         ]),
-        ui.output_ui("yield_label"),
+        ui.input_numeric("expected_yield", "Expected Yield (bu/a):", value=160, min=0),
         ui.input_numeric("om", "Soil Organic Matter (%):", 1.2, min=0, max=100, step=0.1),
         ui.input_numeric("profile_s", "Profile Sulfur (lb/a):", 25, min=0),
         ui.input_numeric("other_s", "Other Sulfur Credits (lb/a):", 0, min=0),
@@ -29,63 +33,36 @@ def sulfur_ui():
         ui.br(), ui.br(), ui.br()
     )
 
+WIDGETS = {"crop": "select", "expected_yield": "numeric", "om": "numeric", "profile_s": "numeric", "other_s": "numeric"}
+
 @module.server
-def sulfur_server(input, output, session):
+def sulfur_server(input, output, session, field_id=None, resume_token=None):
     # Store output result
-    result_text = reactive.Value("")
+    last_result = reactive.Value(None)
+    save_state = resume.track("s", input, WIDGETS, resume_token, last_result)
 
-    @output
-    @render.ui
-    def yield_label():
-        crop = input.crop()
-        unit = {
-            "Corn": "Expected Yield (bu/a):",
-            "Grain Sorghum": "Expected Yield (bu/a):",
-            "Corn Silage": "Expected Yield (ton/a):",
-            "Sorghum Silage": "Expected Yield (ton/a):",
-            "Wheat": "Expected Yield (bu/a):",
-            "Soybean": "Expected Yield (bu/a):",
-            "Sunflower": "Expected Yield (lb/a):",
-            "Brome": "Expected Yield (ton/a):",
-            "Fescue": "Expected Yield (ton/a):",
-            "Bermudagrass": "Expected Yield (ton/a):",
-            "Alfalfa": "Expected Yield (ton/a):"
-        }.get(crop, "Expected Yield:")
-        return ui.input_numeric("expected_yield", unit, value=160, min=0)
+    # The yield input is created once in the UI; crop changes only relabel it
+    @reactive.Effect
+    @reactive.event(input.crop)
+    def update_yield_label():
+        unit = tables.SULFUR_YIELD_UNITS.get(input.crop())
+        ui.update_numeric("expected_yield", label=f"Expected Yield ({unit}):" if unit else "Expected Yield:")
 
     @output
     @render.ui
     def result():
-        return ui.HTML(result_text())
+        return result_html(last_result())
 
     @reactive.Effect
     @reactive.event(input.calc)
     def calculate_recommendation():
-        if "expected_yield" not in input:
-            result_text.set("Waiting for yield input...")
-            return
-
-        crop = input.crop()
-        expected_yield = input["expected_yield"]()
-        om = input.om()
-        profile_s = input.profile_s()
-        other_s = input.other_s()
-
-        factors = {
-            "Corn": 0.2,
-            "Grain Sorghum": 0.2,
-            "Corn Silage": 1.33,
-            "Sorghum Silage": 1.33,
-            "Wheat": 0.6,
-            "Soybean": 0.4,
-            "Sunflower": 0.005,
-            "Brome": 5.0,
-            "Fescue": 5.0,
-            "Bermudagrass": 5.0,
-            "Alfalfa": 6.0
-        }
-
-        s_rec = factors.get(crop, 0) * expected_yield - 2.5 * om - profile_s - other_s
-        s_rec = max(int(round(s_rec)), 0)
-
-        result_text.set(f"Recommended Sulfur Rate: {s_rec} lb/a")
+        rec = calculators.sulfur({
+            "crop": input.crop(),
+            "expected_yield": input.expected_yield(),
+            "om": input.om(),
+            "profile_s": input.profile_s(),
+            "other_s": input.other_s(),
+        })
+        last_result.set(rec)
+        save_state(rec)
+        record_in_background(rec, field_id=field_id() if field_id else None)
@@ -0,0 +1,192 @@
+"""Serve the app from worker processes forked off one warm parent.
+
+The parent imports app.py (which renders the static page), the batch engine
+and the web server once, maps the coefficient tables and runs every batch
+calculator on an empty frame, then forks --workers processes that share all
+of those pages copy-on-write. Worker i listens on --port + i. A worker that
+exits is replaced by a new fork of the warm parent, which answers in
+milliseconds rather than after a full import.
+
+Shiny sessions live in one process, and uploads and downloads must reach
+the worker that holds the websocket, so put a proxy with sticky sessions
+(shiny-server, or nginx ``ip_hash``) in front of the worker ports.
+
+    python serve.py --workers 4 --port 8000
+    python serve.py --benchmark --workers 4
+
+--benchmark starts the workers both ways, forked from this parent and as
+independent ``shiny run`` processes, and prints the time until each answers
+its first request and each worker's resident (RSS) and proportional (PSS)
+memory. Linux only.
+"""
+
+import argparse
+import gc
+import io
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+
+
+def warm(host="127.0.0.1"):
+    """Import and build everything a worker needs before its first request."""
+    sys.path.insert(0, str(HERE))
+    os.chdir(HERE)
+    import pandas as pd
+    import uvicorn
+
+    import app
+    from engine import shared, store, tasks  # noqa: F401 (imported for the workers)
+    from engine.batch import CALCULATORS
+
+    for name in shared.LOOKUP_TABLES:
+        shared.table(name)
+    for compute, spec in CALCULATORS.values():
+        compute(pd.read_csv(io.StringIO(",".join(spec) + "\n")))
+    # Loads the HTTP and websocket protocol modules the workers will use
+    uvicorn.Config(app.app, host=host, log_level="warning").load()
+    # Objects made so far are never freed, so the collector need not touch (and copy) their pages
+    gc.freeze()
+    return app.app
+
+
+def _run_worker(asgi_app, host, port):
+    import uvicorn
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    try:
+        uvicorn.run(asgi_app, host=host, port=port, log_level="warning")
+    finally:
+        os._exit(0)
+
+
+def serve(workers, host, port):
+    asgi_app = warm(host)
+    children = {}
+
+    def fork(index):
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(asgi_app, host, port + index)
+        children[pid] = index
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for index in range(workers):
+        fork(index)
+    print(f"{workers} workers on http://{host}:{port} to :{port + workers - 1}", flush=True)
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        index = children.pop(pid, None)
+        if index is not None and not stopping:
+            fork(index)
+
+
+def _first_response(port, start, timeout=120):
+    deadline = start + timeout
+    while time.perf_counter() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1).read()
+            return time.perf_counter() - start
+        except OSError:
+            time.sleep(0.01)
+    raise RuntimeError(f"nothing answered on port {port} within {timeout} seconds")
+
+
+def _memory(pid):
+    values = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines():
+        name, _, rest = line.partition(":")
+        if name in ("Rss", "Pss"):
+            values[name] = int(rest.split()[0]) / 1024
+    return values
+
+
+def _children(pid):
+    return [int(child) for task in Path(f"/proc/{pid}/task").iterdir()
+            for child in (task / "children").read_text().split()]
+
+
+def _report(label, seconds, pids, parent=None):
+    # The total includes the parent, which holds its own share of the pages it preloaded
+    memory = [_memory(pid) for pid in pids]
+    total = sum(m["Pss"] for m in memory) + (_memory(parent)["Pss"] if parent else 0)
+    print(f"{label:>8} {max(seconds):>12.2f} {sum(seconds) / len(seconds):>12.2f} "
+          f"{sum(m['Rss'] for m in memory) / len(memory):>9.1f} {sum(m['Pss'] for m in memory) / len(memory):>9.1f} "
+          f"{total:>10.1f}", flush=True)
+
+
+def benchmark(workers, port):
+    db = Path(tempfile.mkdtemp(prefix="fertrecks-serve-")) / "history.db"
+    env = dict(os.environ, FERTRECKS_DB=str(db))
+    print(f"{'':>8} {'all ready s':>12} {'mean first s':>12} {'RSS MB':>9} {'PSS MB':>9} {'total PSS':>10}")
+
+    start = time.perf_counter()
+    spawned = [subprocess.Popen([sys.executable, "-m", "shiny", "run", "app.py", "--port", str(port + i)],
+                                cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+               for i in range(workers)]
+    try:
+        seconds = [_first_response(port + i, start) for i in range(workers)]
+        _report("spawn", seconds, [p.pid for p in spawned])
+    finally:
+        for process in spawned:
+            process.terminate()
+            process.wait()
+
+    start = time.perf_counter()
+    parent = subprocess.Popen([sys.executable, str(HERE / "serve.py"), "--workers", str(workers),
+                               "--port", str(port)], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        seconds = [_first_response(port + i, start) for i in range(workers)]
+        pids = _children(parent.pid)
+        _report("prefork", seconds, pids, parent=parent.pid)
+
+        # A replacement worker comes from the warm parent
+        restart = time.perf_counter()
+        os.kill(pids[0], signal.SIGKILL)
+        while Path(f"/proc/{pids[0]}").exists():
+            time.sleep(0.001)
+        seconds = max(_first_response(port + i, restart) for i in range(workers))
+        print(f"replacing a killed worker: {seconds:.2f} s", flush=True)
+    finally:
+        parent.terminate()
+        parent.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the app from preforked worker processes.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000, help="port of the first worker (default: 8000)")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="compare forked and independently started workers instead of serving")
+    args = parser.parse_args(argv)
+    if args.benchmark:
+        benchmark(args.workers, args.port)
+    else:
+        serve(args.workers, args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+# The Nitrogen tab on its own, for tests/test_crop_switch.py.
+
+from shiny import App, ui
+
+from modules.nitrogen import nitrogen_server, nitrogen_ui
+
+app = App(ui.page_fluid(nitrogen_ui("nitro")), lambda input, output, session: nitrogen_server("nitro"))
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The app is run from App-Python-version, so tests import engine/ and modules/ the same way
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from engine.aggregate import ACCURACY, DemandAggregator, aggregate_csv
+from engine.batch import nitrogen_batch
+
+
+def _results(n=20000):
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame({
+        "county": rng.choice(["Riley", "Finney", "Sedgwick"], n), "crop": rng.choice(["Corn", "Wheat"], n),
+        "n_rate": rng.integers(0, 220, n).astype(float), "ecc_rate": rng.uniform(0, 12000, n).round(),
+        "acres": rng.uniform(20, 160, n),
+    })
+    frame.loc[::97, "n_rate"] = np.nan
+    return frame
+
+
+def test_chunked_totals_match_the_whole_table():
+    frame = _results()
+    aggregator = DemandAggregator(by=["county", "crop"], quantiles=[0.5, 0.9])
+    for start in range(0, len(frame), 3000):
+        aggregator.update(frame.iloc[start:start + 3000])
+    result = aggregator.result()
+
+    valid = frame.dropna(subset=["n_rate"])
+    groups = valid.groupby(["county", "crop"])
+    np.testing.assert_allclose(result["n_total_lb"], groups.apply(lambda g: (g.n_rate * g.acres).sum()), atol=0.1)
+    np.testing.assert_allclose(result["n_mean"],
+                               groups.apply(lambda g: (g.n_rate * g.acres).sum() / g.acres.sum()), atol=0.1)
+    assert result["n_fields"].tolist() == groups.size().tolist()
+    for q in (0.5, 0.9):
+        exact = groups["n_rate"].quantile(q, interpolation="lower")
+        np.testing.assert_allclose(result[f"n_p{round(q * 100)}"], exact, rtol=ACCURACY, atol=0.05)
+
+
+def test_calculator_inputs_are_aggregated_chunk_by_chunk(tmp_path):
+    path = tmp_path / "fields.csv"
+    fields = pd.DataFrame({"region": ["NE", "NE", "SW", "SW"], "crop": ["Corn", "Corn", "Wheat", "Corn"],
+                           "yield": [150, 180, 50, 200], "om": 2.0, "profile_n": 20})
+    fields.to_csv(path, index=False)
+    result = aggregate_csv(path, ["region", "crop"], calculator="nitrogen", chunk_rows=3)
+
+    rates = nitrogen_batch(fields)["n_rate"]
+    assert result.loc[("NE", "Corn"), "n_total_lb"] == rates[:2].sum()
+    assert result.loc[("SW", "Wheat"), "n_fields"] == 1
+    assert abs(result.loc[("SW", "Corn"), "n_p50"] - rates[3]) <= ACCURACY * rates[3] + 0.05
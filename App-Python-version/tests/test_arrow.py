@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+from engine import arrow, fused  # noqa: E402
+from engine.batch import CALCULATORS, phosphorus_batch  # noqa: E402
+
+
+def _address(column):
+    return np.asarray(column).ctypes.data
+
+
+def test_numeric_columns_are_read_in_place():
+    batch = pa.record_batch({"crop": pa.array(["Corn", " wheat", None]), "yield": [150.0, 60.0, 100.0],
+                             "mehlich": pa.array([10, 30, 5], pa.int64())})
+    frame = arrow.to_frame(batch)
+    assert _address(frame["yield"]) == batch.column("yield").buffers()[1].address
+    assert _address(frame["mehlich"]) == batch.column("mehlich").buffers()[1].address
+    assert isinstance(frame["crop"].dtype, pd.StringDtype) or isinstance(frame["crop"].dtype, pd.ArrowDtype)
+
+
+def test_results_match_the_pandas_path():
+    fields = fused.sample_fields(500)
+    fields.loc[::9, "mehlich"] = np.nan
+    table = pa.Table.from_pandas(fields, preserve_index=False)
+    table = pa.Table.from_batches(table.to_batches(max_chunksize=128))
+    for calculator in ("nitrogen", "phosphorus", "potassium", "sulfur", "micronutrients", "lime", "crop_removal"):
+        result = arrow.run(calculator, table)
+        assert isinstance(result, pa.Table) and result.num_rows == len(fields)
+        expected = CALCULATORS[calculator][0](fields)
+        for name in expected:
+            got = result.column(name).to_pandas()
+            if isinstance(expected[name].dtype, pd.CategoricalDtype):
+                assert got.astype(object).where(got.notna(), None).tolist() == \
+                    expected[name].astype(object).where(expected[name].notna(), None).tolist()
+            else:
+                np.testing.assert_array_equal(got.to_numpy(dtype=float), expected[name].to_numpy(dtype=float))
+    assert arrow.run("all", table).num_rows == len(fields)
+
+
+def test_rates_are_returned_without_copying():
+    frame = pd.DataFrame({"crop": ["Corn", "Corn"], "yield": [150.0, 150.0], "mehlich": [10.0, "x"]})
+    result = phosphorus_batch(frame)
+    batch = arrow.to_arrow(result)
+    assert batch.column("p2o5_rate").buffers()[1].address == _address(result["p2o5_rate"])
+    assert batch.column("p2o5_rate").null_count == 1
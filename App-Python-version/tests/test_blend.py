@@ -0,0 +1,86 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from engine import blend as blend_module
+from engine import tables
+from engine.blend import blend, load_catalog
+
+RATES = ["n_rate", "p2o5_rate", "k2o_rate", "s_rate", "zn_rate", "cl_rate"]
+
+
+def _least_costs(catalog, demand):
+    # Every vertex of the feasible region, checked one basis at a time
+    a = catalog.analysis[:demand.shape[1]]
+    m, n = a.shape
+    columns = np.hstack([a, -np.eye(m)])
+    costs = np.append(catalog.prices / 2000, np.zeros(m))
+    best = np.full(len(demand), np.inf)
+    for basis in itertools.combinations(range(n + m), m):
+        matrix = columns[:, basis]
+        if abs(np.linalg.det(matrix)) < 1e-9:
+            continue
+        x = demand @ np.linalg.inv(matrix).T
+        cost = np.where((x >= -1e-9).all(axis=1), x @ costs[list(basis)], np.inf)
+        best = np.minimum(best, cost)
+    return best
+
+
+def test_blends_are_least_cost_and_meet_every_rate():
+    catalog = load_catalog()
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame({"n_rate": rng.integers(0, 200, 500), "p2o5_rate": rng.integers(0, 80, 500),
+                          "k2o_rate": rng.integers(0, 90, 500), "s_rate": rng.integers(0, 30, 500),
+                          "zn_rate": rng.choice([0, 5, 10], 500), "cl_rate": rng.choice([0, 10, 20], 500)})
+    result = blend(frame, catalog, chunk_rows=128)
+    amounts = result[[f"{p}_lb" for p in catalog.products]].to_numpy()
+    demand = frame[RATES].to_numpy(dtype=float)
+
+    assert (amounts @ catalog.analysis[:6].T >= demand).all()
+    exact = _least_costs(catalog, demand)
+    # Amounts are rounded up to 0.1 lb
+    assert (result["cost"] >= exact - 0.01).all()
+    assert (result["cost"] <= exact + 0.01 + 0.05 * catalog.prices.sum() / 2000).all()
+
+
+def test_nitrogen_only_uses_the_cheapest_source():
+    result = blend(pd.DataFrame({"n_rate": [46, 0, None]}))
+    assert result["urea_lb"].tolist() == [100, 0, 0]
+    assert result["cost"].tolist() == [27.5, 0, 0]
+
+
+def test_local_catalog_and_unsupplied_nutrients(tmp_path):
+    path = tmp_path / "products.csv"
+    pd.DataFrame({"product": ["ag_lime", "uan28"], "price_per_ton": [30, 350],
+                  "n": [0, 28], "ecc": [60, 0]}).to_csv(path, index=False)
+    result = blend(pd.DataFrame({"n_rate": [28, 0], "ecc_rate": [6000, 0], "b_rate": [1, 0]}), load_catalog(path))
+    assert result[["ag_lime_lb", "uan28_lb"]].values.tolist() == [[10000, 100], [0, 0]]
+    assert result["unmet"].tolist() == ["b", ""]
+
+
+def test_rows_no_basis_solves_are_flagged(monkeypatch):
+    # Keep only the basis that buys nothing: rows needing N are left unsolved
+    plan = blend_module._plan
+
+    def surplus_only(catalog, nutrients):
+        full = plan(catalog, nutrients)
+        return full._replace(bases=[b for b in full.bases if (b[0] >= len(catalog.products)).all()])
+
+    monkeypatch.setattr(blend_module, "_plans", {})
+    monkeypatch.setattr(blend_module, "_plan", surplus_only)
+    result = blend(pd.DataFrame({"n_rate": [46, 0]}))
+    assert result["solved"].tolist() == [False, True]
+    assert np.isnan(result["urea_lb"][0]) and np.isnan(result["cost"][0])
+    assert result["cost"][1] == 0
+
+
+def test_catalog_size_is_checked():
+    products = {f"product{i}": ({n: 10 for n in tables.BLEND_NUTRIENTS}, 100 + i) for i in range(12)}
+    catalog = load_catalog()._replace(
+        products=list(products), prices=np.array([p[1] for p in products.values()], dtype=float),
+        analysis=np.full((len(tables.BLEND_NUTRIENTS), len(products)), 0.1))
+    frame = pd.DataFrame({column: [1] for column in blend_module.RATE_COLUMNS.values()})
+    with pytest.raises(ValueError, match="too large"):
+        blend(frame, catalog)
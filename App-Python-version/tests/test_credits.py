@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+from engine import fused
+from engine.batch import nitrogen_batch
+from engine.credits import credits_batch
+from engine import validation
+from engine.validation import MISSING, OUT_OF_RANGE, UNKNOWN_CATEGORY
+
+
+def _fields():
+    return pd.DataFrame({
+        "crop": "Corn", "yield": 180, "om": 2.0, "profile_n": 20, "manure_n": [0, 30, 30, 0, 0, 0],
+        "manure_type": ["Swine Liquid", "", "beef solid", "Horse", "Dairy Solid", None],
+        "manure_total_n": [40, None, 12, 10, 11, None], "manure_nh4_n": [30, None, None, None, 4, None],
+        "manure_rate": [5, None, 20, 10, None, None],
+        "manure_application": ["Injected", None, None, None, None, None],
+        "manure_availability": [None, None, 0.4, None, None, None],
+        "irrigation_no3_n": [10, 10, None, None, None, 5], "irrigation_inches": [8, 8, None, None, None, 12],
+    })
+
+
+def test_credits_from_analyses_and_water():
+    credits = credits_batch(_fields())
+    # 5 × (30 × 0.98 + 10 × 0.35); 20 × 12 × 0.4 with the field's own availability
+    assert credits["manure_n"][0] == 164.5 and credits["manure_n"][2] == 96.0
+    assert np.isnan(credits["manure_n"][1]) and np.isnan(credits["manure_n"][5])
+    assert credits["irrigation_n"].tolist()[:3] == [18.1, 18.1, 0.0] and credits["irrigation_n"][5] == 13.6
+    assert credits["code"][3] == UNKNOWN_CATEGORY and credits["code"][4] == MISSING
+
+
+def test_nitrogen_uses_the_credits():
+    fields = _fields()
+    result = nitrogen_batch(fields)
+    by_hand = fields[["crop", "yield", "om", "profile_n"]].assign(
+        manure_n=[164.5, 30, 96.0, 0, 0, 0], other_n=[18.1, 18.1, 0, 0, 0, 13.6])
+    expected = nitrogen_batch(by_hand)["n_rate"]
+    valid = result["code"] == 0
+    assert valid.tolist() == [True, True, True, False, False, True]
+    assert result["n_rate"][valid].equals(expected[valid])
+    assert result["n_rate"][~valid].isna().all()
+
+    together = fused.evaluate(fields)
+    assert together["n_rate"].equals(result["n_rate"])
+    assert together["nitrogen_code"].tolist() == result["code"].tolist()
+
+
+def test_more_ammonium_than_total_n_is_rejected():
+    fields = pd.DataFrame({"manure_type": ["Swine Liquid", "Swine Liquid", None], "manure_total_n": [30, 40, None],
+                           "manure_nh4_n": [40, 30, 50], "manure_rate": [5, 5, None]})
+    checked = validation.validate(validation.MANURE_INPUTS, fields)
+    assert checked.codes.tolist() == [OUT_OF_RANGE, 0, 0]
+    assert credits_batch(fields)["code"].tolist() == [OUT_OF_RANGE, 0, 0]
+    assert validation.describe(validation.MANURE_INPUTS, checked.column_codes) == \
+        "Manure ammonium N must be between 0 and 1000 and no more than Manure total N."
@@ -0,0 +1,67 @@
+import asyncio
+import json
+
+import pytest
+
+websockets = pytest.importorskip("websockets")
+loadtest = pytest.importorskip("loadtest")
+
+# Outputs of both versions of the Nitrogen tab, all visible as in a browser
+OUTPUTS = ["nitro-result", "nitro-yield_label", "nitro-ie_input_ui", "nitro-previous_crop_detail"]
+INPUTS = {name: value for name, value in loadtest.INITIAL_INPUTS.items() if name.startswith("nitro-")}
+
+
+async def _quiet(ws, seconds=0.5):
+    """Messages received until the server has been silent for ``seconds``."""
+    messages = []
+    while True:
+        try:
+            messages.append(await asyncio.wait_for(ws.recv(), seconds))
+        except asyncio.TimeoutError:
+            return messages
+
+
+async def _crop_switch_messages(port):
+    inputs = {**INPUTS, **loadtest.client_data(port), **{f".clientdata_output_{o}_hidden": False for o in OUTPUTS}}
+    inputs["nitro-calc:shiny.action"] = 0
+    async with websockets.connect(f"ws://127.0.0.1:{port}/websocket/") as ws:
+        await ws.send(json.dumps({"method": "init", "data": inputs}))
+        await _quiet(ws)
+        await ws.send(json.dumps({"method": "update", "data": {"nitro-crop": "Corn Silage"}}))
+        return await _quiet(ws)
+
+
+def _measure(app):
+    port = loadtest.free_port()
+    server = loadtest.start_server(port, app=app)
+    try:
+        return asyncio.run(_crop_switch_messages(port))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def test_crop_switch_updates_inputs_in_place():
+    before = _measure("tests/apps/rerender_nitrogen.py")
+    after = _measure("tests/apps/inplace_nitrogen.py")
+    print(f"crop switch: {len(before)} messages ({sum(map(len, before))} bytes) re-rendering, "
+          f"{len(after)} messages ({sum(map(len, after))} bytes) in place")
+
+    # Before: the yield input came back as a freshly rendered widget
+    assert any("nitro-yield_label" in json.loads(m).get("values", {}) for m in before)
+    # After: no output is re-rendered, the label is changed by an input message
+    assert not any(json.loads(m).get("values") for m in after)
+    assert any("ton/a" in m and "inputMessages" in m for m in after)
+    assert len(after) < len(before)
+    assert sum(map(len, after)) < sum(map(len, before)) / 2
+
+
+def test_nitrogen_tab_choices_come_from_the_tables():
+    from engine import tables
+    from modules import nitrogen
+
+    html = str(nitrogen.nitrogen_ui("nitro"))
+    for choice in tables.NITROGEN_CROPS + tables.PREVIOUS_CROPS:
+        assert f'<option value="{choice}"' in html
+    for crops in (tables.EFFICIENCY_CROPS, tables.FORAGE_CROPS, list(tables.PREVIOUS_CROP_CONDITIONS)):
+        assert json.dumps(crops).replace('"', "&quot;") in html
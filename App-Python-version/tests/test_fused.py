@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+
+from engine import fused
+
+
+def test_fused_pass_matches_the_separate_calculators():
+    frame = fused.sample_fields(2000)
+    # Forage and efficiency crops, blanks and bad entries, each affecting only its calculators
+    frame["crop"] = frame["crop"].astype(object)
+    frame.loc[::7, "crop"] = "Bermudagrass"
+    frame.loc[::11, "crop"] = "Oats"
+    frame["forage_yield"] = np.where(frame["crop"] == "Bermudagrass", 4, np.nan)
+    frame["mehlich"] = frame["mehlich"].astype(object)
+    frame.loc[::13, "mehlich"] = "n/a"
+    frame.loc[::17, "zn_ppm"] = np.nan
+    frame.loc[::19, "target"] = None
+
+    expected = fused.sequential(frame)
+    for chunk_rows in (7, 512, 100000):
+        pd.testing.assert_frame_equal(fused.evaluate(frame, chunk_rows=chunk_rows), expected)
+    assert (expected["phosphorus_code"] != 0).any() and expected["p2o5_starter_only"].any()
+
+
+def test_empty_frame():
+    result = fused.evaluate(fused.sample_fields(0))
+    assert result.empty and "n_rate" in result and "fe_level" in result
@@ -0,0 +1,65 @@
+import io
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from engine import incremental
+from engine.batch import phosphorus_batch
+from engine.incremental import run_incremental
+
+
+def _frame(n=2000):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "crop": np.array(["Corn", "Wheat", "Soybean"], dtype=object)[rng.integers(0, 3, n)],
+        "yield": rng.integers(40, 250, n).astype(float),
+        "mehlich": rng.integers(1, 40, n).astype(float),
+    })
+
+
+def test_only_changed_rows_are_recomputed(tmp_path):
+    frame = _frame()
+    first, stats = run_incremental("phosphorus", frame, tmp_path)
+    assert stats["reused"] == 0 and first.equals(phosphorus_batch(frame))
+
+    changed = frame.copy()
+    changed.loc[[3, 7], "mehlich"] = [0.5, 99.5]
+    result, stats = run_incremental("phosphorus", changed, tmp_path)
+    assert stats == {"rows": len(frame), "computed": 2, "reused": len(frame) - 2}
+    assert result.equals(phosphorus_batch(changed))
+
+
+def test_equivalent_files_hash_alike(tmp_path):
+    frame = _frame()
+    run_incremental("phosphorus", frame, tmp_path)
+    round_trip = pd.read_csv(io.StringIO(frame.to_csv(index=False)))
+    retyped = frame.astype({"yield": int}).assign(crop=" " + frame["crop"].str.upper())
+    shuffled = frame.sample(frac=1, random_state=1)
+    for other in (round_trip, retyped, shuffled):
+        result, stats = run_incremental("phosphorus", other, tmp_path)
+        assert stats["computed"] == 0
+        assert result.equals(phosphorus_batch(other))
+
+
+def test_invalid_rows_are_not_confused(tmp_path):
+    frame = pd.DataFrame({"crop": "Corn", "yield": 150, "mehlich": ["abc", "", None, "0"]})
+    result, _ = run_incremental("phosphorus", frame, tmp_path)
+    assert result["code"].tolist() == [2, 1, 1, 0]
+
+
+def test_new_engine_version_recomputes(tmp_path, monkeypatch):
+    frame = _frame(100)
+    run_incremental("phosphorus", frame, tmp_path)
+    monkeypatch.setattr(incremental, "VERSION", "changed tables")
+    assert run_incremental("phosphorus", frame, tmp_path)[1]["reused"] == 0
+
+
+def test_engine_version_covers_the_modules_batch_uses(tmp_path, monkeypatch):
+    version = incremental._engine_version()
+    credits = tmp_path / "credits.py"
+    credits.write_bytes(Path(incremental.__file__).with_name("credits.py").read_bytes() + b"\n# changed\n")
+    read_bytes = Path.read_bytes
+    monkeypatch.setattr(Path, "read_bytes",
+                        lambda path: read_bytes(credits if path.name == "credits.py" else path))
+    assert incremental._engine_version() != version
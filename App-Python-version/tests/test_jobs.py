@@ -0,0 +1,99 @@
+import asyncio
+
+import pandas as pd
+import pytest
+
+from engine import jobs, store
+from engine.batch import nitrogen_batch
+from engine.jobs import JobQueue, QueueFull
+
+
+@pytest.fixture(autouse=True)
+def history(tmp_path, monkeypatch):
+    # Finished jobs are recorded in the history store; keep it out of the working directory
+    monkeypatch.setattr(store, "_store", store.ResultStore(tmp_path / "history.db"))
+
+
+def _csv(tmp_path, rows=50):
+    path = tmp_path / "fields.csv"
+    pd.DataFrame({"crop": "Corn", "yield": range(100, 100 + rows), "om": 2.0, "profile_n": 20}).to_csv(path, index=False)
+    return path
+
+
+def test_full_queue_refuses_jobs(tmp_path):
+    queue = JobQueue(tmp_path / "jobs", capacity=2)
+    path = _csv(tmp_path)
+    first = queue.submit("nitrogen", path)
+    queue.submit("nitrogen", path)
+    with pytest.raises(QueueFull):
+        queue.submit("nitrogen", path)
+    queue.cancel(first)
+    assert queue.get(first).status == jobs.CANCELLED
+    third = queue.submit("nitrogen", path)
+    assert queue.input_path(third).read_bytes() == path.read_bytes()
+    assert not list(queue.directory.glob("*.part"))
+
+
+def test_jobs_of_dead_workers_are_requeued(tmp_path):
+    queue = JobQueue(tmp_path / "jobs")
+    job_id = queue.submit("nitrogen", _csv(tmp_path))
+    assert queue.claim().id == job_id and queue.claim() is None
+    assert queue.requeue_orphans() == 0  # this process is alive
+
+    with queue._db:
+        queue._db.execute("UPDATE jobs SET worker = ? WHERE id = ?", (2 ** 22 + 1, job_id))
+    reopened = JobQueue(tmp_path / "jobs")
+    assert reopened.requeue_orphans() == 1
+    assert reopened.get(job_id).status == jobs.QUEUED
+
+
+def test_worker_runs_jobs_to_results(tmp_path):
+    queue = JobQueue(tmp_path / "jobs")
+    path = _csv(tmp_path)
+    done = queue.submit("nitrogen", path)
+    failed = queue.submit("no_such_calculator", path)
+    cancelled = queue.submit("nitrogen", path)
+    queue.cancel(cancelled)
+
+    asyncio.run(jobs.work(queue, concurrency=2, poll=0.05, until_empty=True))
+
+    job = queue.get(done)
+    assert job.status == jobs.DONE and job.done_rows == job.rows == 50 and job.invalid_rows == 0
+    result = pd.read_csv(queue.result_path(done))
+    expected = nitrogen_batch(pd.read_csv(path))
+    assert result["n_rate"].equals(expected["n_rate"])
+    assert "rows calculated" in jobs.describe(queue, job)
+    assert queue.get(failed).status == jobs.FAILED and queue.get(failed).error
+    assert queue.get(cancelled).status == jobs.CANCELLED
+    assert not queue.result_path(cancelled).exists()
+
+
+def test_running_job_is_cancelled(tmp_path):
+    queue = JobQueue(tmp_path / "jobs")
+    job_id = queue.submit("nitrogen", _csv(tmp_path, rows=200000))
+
+    async def scenario():
+        worker = asyncio.create_task(jobs.work(queue, poll=0.05, until_empty=True))
+        while queue.get(job_id).status != jobs.RUNNING:
+            await asyncio.sleep(0.01)
+        queue.cancel(job_id)
+        await asyncio.wait_for(worker, 60)
+
+    asyncio.run(scenario())
+    assert queue.get(job_id).status == jobs.CANCELLED
+    assert not queue.result_path(job_id).exists()
+
+
+def test_stopped_worker_returns_its_job(tmp_path):
+    queue = JobQueue(tmp_path / "jobs")
+    job_id = queue.submit("nitrogen", _csv(tmp_path, rows=200000))
+
+    async def scenario():
+        worker = asyncio.create_task(jobs.work(queue, poll=0.05))
+        while queue.get(job_id).status != jobs.RUNNING:
+            await asyncio.sleep(0.01)
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert queue.get(job_id).status == jobs.QUEUED
@@ -0,0 +1,38 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+pytest.importorskip("websockets")
+loadtest = pytest.importorskip("loadtest")
+
+BATCH_ROWS = 100000
+# Lime results come back in about 10-20 ms with a batch running in the
+# background; a batch run on the event loop pushed p95 past 100 ms
+P95_LIMIT = 0.1
+
+
+def _lime_latencies(port, batch_rows, duration=8):
+    stats, _, _ = asyncio.run(loadtest.run_level(
+        f"http://127.0.0.1:{port}", port, None, sessions=1, duration=duration, think=0.05,
+        batch_rows=batch_rows, seed=1, flows=["lime"]))
+    assert not stats.timeouts
+    return stats
+
+
+def test_lime_latency_stays_flat_during_batch():
+    port = loadtest.free_port()
+    server = loadtest.start_server(port)
+    try:
+        idle = _lime_latencies(port, 0, duration=4)
+        busy = _lime_latencies(port, BATCH_ROWS)
+    finally:
+        server.terminate()
+        server.wait()
+
+    idle_p95, busy_p95 = np.percentile(idle.latencies, 95), np.percentile(busy.latencies, 95)
+    # The batch really ran alongside the lime clicks
+    assert busy.batch_seconds
+    assert busy_p95 < P95_LIMIT, (
+        f"lime p95: {idle_p95 * 1000:.1f} ms idle, {busy_p95 * 1000:.1f} ms during {BATCH_ROWS:,}-row batches "
+        f"({len(busy.batch_seconds)} batches finished)")
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+from engine import validation
+from engine.batch import lime_batch, lime_layers_batch
+
+
+def test_layers_match_the_single_depth_calculator():
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame({"buffer_ph_1": rng.uniform(5.5, 7.0, 200).round(2), "depth_1": 6.0,
+                          "buffer_ph_2": rng.uniform(5.5, 7.0, 200).round(2), "depth_2": 6.0})
+    result = lime_layers_batch(frame)
+    for target in ("Target pH 6.8", "Target pH 6.0", "Target pH 5.5"):
+        column = "ecc_ph" + target.split()[-1].replace(".", "")
+        for layer in (1, 2):
+            single = lime_batch(pd.DataFrame({"target": target, "buffer_ph": frame[f"buffer_ph_{layer}"],
+                                              "depth": 6.0}))
+            assert result[f"{column}_{layer}"].tolist() == single["ecc_rate"].tolist()
+        assert result[column].tolist() == (result[f"{column}_1"] + result[f"{column}_2"]).tolist()
+    assert result["ecc_rate"].isna().all()
+
+
+def test_blank_lower_layer_and_chosen_target():
+    frame = pd.DataFrame({"target": ["Target pH 6.0", "Target pH 6.0", "Target pH 6.0"],
+                          "buffer_ph_1": [6.5, 6.5, 6.5], "depth_1": [6, 6, 6],
+                          "buffer_ph_2": [None, 6.4, 6.4], "depth_2": [None, 6, None]})
+    result = lime_layers_batch(frame)
+    assert result["ecc_rate"].iloc[0] == result["ecc_ph60_1"].iloc[0] == result["ecc_ph60"].iloc[0]
+    assert result["ecc_rate"].iloc[1] == result["ecc_ph60_1"].iloc[1] + result["ecc_ph60_2"].iloc[1]
+    # A layer with a buffer pH but no depth is incomplete
+    assert result["code"].tolist()[2] == validation.MISSING
+    assert np.isnan(result["ecc_ph60"].iloc[2])
@@ -0,0 +1,25 @@
+import numpy as np
+import pandas as pd
+
+from engine import calculators
+from engine.batch import micronutrients_batch
+
+
+def test_batch_rates_match_the_calculator_at_every_threshold():
+    ppm = np.round(np.arange(0, 8.005, 0.01), 2)
+    frame = pd.DataFrame({"cl_ppm": ppm, "b_ppm": ppm / 4, "zn_ppm": ppm / 4})
+    result = micronutrients_batch(frame)
+    for nutrient, column, rate in (("Chloride", "cl_ppm", "cl_rate"), ("Boron", "b_ppm", "b_rate"),
+                                   ("Zinc", "zn_ppm", "zn_rate")):
+        expected = [calculators.micronutrient(nutrient, {column: value}).rate for value in frame[column]]
+        assert result[rate].tolist() == expected
+
+
+def test_classes_include_iron_and_skip_blank_columns():
+    frame = pd.DataFrame({"cl_ppm": [4, 6, 6.01, None], "fe_ppm": [2.4, 2.5, 4.5, 4.6]})
+    result = micronutrients_batch(frame)
+    assert result["cl_level"].tolist()[:3] == ["Medium", "Medium", "High"]
+    assert np.isnan(result["cl_rate"].iloc[3])
+    assert result["fe_level"].tolist() == ["Low", "Marginal", "Marginal", "Adequate"]
+    assert "fe_rate" not in result
+    assert result["zn_level"].isna().all()
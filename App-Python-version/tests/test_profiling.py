@@ -0,0 +1,64 @@
+import asyncio
+import csv
+import json
+import time
+
+import pytest
+
+from engine import profiling
+
+websockets = pytest.importorskip("websockets")
+loadtest = pytest.importorskip("loadtest")
+
+OUTPUTS = ["nitro-result"]
+INPUTS = {name: value for name, value in loadtest.INITIAL_INPUTS.items() if name.startswith("nitro-")}
+
+
+async def _calculate_nitrogen(port):
+    inputs = {**INPUTS, **loadtest.client_data(port), **{f".clientdata_output_{o}_hidden": False for o in OUTPUTS}}
+    inputs["field_id"] = ""
+    inputs["nitro-calc:shiny.action"] = 0
+    async with websockets.connect(f"ws://127.0.0.1:{port}/websocket/") as ws:
+        await ws.send(json.dumps({"method": "init", "data": inputs}))
+        await ws.send(json.dumps({"method": "update", "data": {"nitro-calc:shiny.action": 1}}))
+        while True:
+            message = json.loads(await asyncio.wait_for(ws.recv(), 30))
+            if "nitro-result" in message.get("values", {}):
+                return
+
+
+def _session(directory, monkeypatch):
+    monkeypatch.setenv(profiling.ENV, str(directory))
+    port = loadtest.free_port()
+    server = loadtest.start_server(port)
+    try:
+        asyncio.run(_calculate_nitrogen(port))
+        # Files are written when the server sees the session end
+        deadline = time.time() + 10
+        while not list(directory.glob("*.csv")) and time.time() < deadline:
+            time.sleep(0.1)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def test_profiled_session_exports_nodes(tmp_path, monkeypatch):
+    profiling.main(["on", "--dir", str(tmp_path)])
+    _session(tmp_path, monkeypatch)
+
+    [summary] = tmp_path.glob("*.csv")
+    with open(summary, newline="") as f:
+        nodes = {row["node"]: row for row in csv.DictReader(f)}
+    assert "output nitro-result" in nodes
+    assert int(nodes["output nitro-result"]["runs"]) >= 1
+    folded = summary.with_suffix(".folded").read_text()
+    assert any(line.startswith("output nitro-result;") for line in folded.splitlines())
+    assert summary.with_suffix(".pstats").exists()
+    assert "output nitro-result" in profiling.report(tmp_path)
+
+
+def test_sessions_are_not_profiled_when_off(tmp_path, monkeypatch):
+    profiling.main(["on", "--dir", str(tmp_path)])
+    profiling.main(["off", "--dir", str(tmp_path)])
+    _session(tmp_path, monkeypatch)
+    assert not list(tmp_path.glob("*.csv"))
@@ -0,0 +1,26 @@
+import pandas as pd
+
+from engine.reports import generate_reports, report_names
+from engine.results import NOTES, SPLIT_LIME, STARTER_ONLY
+
+
+def test_colliding_field_ids_get_distinct_files(tmp_path):
+    names = report_names(["A 1", "A/1", "B", "b", "C"])
+    assert len(set(n.lower() for n in names.values())) == 5
+    assert names["C"] == "C"
+
+    frame = pd.DataFrame({"field_id": ["A 1", "A/1", "B", "b"], "crop": "Corn", "yield": 150, "mehlich": 10})
+    stats = generate_reports({"phosphorus": frame}, tmp_path, workers=1)
+    assert stats["fields"] == 4
+    assert len(list(tmp_path.glob("*.html"))) == 4
+
+
+def test_notes_follow_the_calculator_flags(tmp_path):
+    p = pd.DataFrame({"field_id": ["f1"], "crop": "Corn", "yield": 150, "mehlich": 30})
+    lime = pd.DataFrame({"field_id": ["f1"], "target": "Target pH 6.8", "buffer_ph": 5.5, "depth": 7})
+    generate_reports({"phosphorus": p, "lime": lime}, tmp_path, workers=1)
+    page = (tmp_path / "f1.html").read_text()
+    assert NOTES[STARTER_ONLY] in page
+    assert NOTES[SPLIT_LIME] in page
+    # The reference table sits under its own section
+    assert page.index("<h2>Lime</h2>") < page.index("Lime Recommendation Table")
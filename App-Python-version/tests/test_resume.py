@@ -0,0 +1,123 @@
+import asyncio
+import json
+import sqlite3
+import time
+
+import pytest
+
+from engine.store import ResultStore
+
+websockets = pytest.importorskip("websockets")
+loadtest = pytest.importorskip("loadtest")
+
+TOKEN = "test-resume-token"
+OUTPUTS = {".clientdata_output_nitro-result_hidden": False}
+
+
+def test_snapshots_are_kept_per_token_and_tab(tmp_path):
+    store = ResultStore(tmp_path / "history.db")
+    store.save_snapshot("a", "nitro", {"inputs": {"crop": "Wheat"}, "result": None})
+    store.save_snapshot("a", "nitro", {"inputs": {"crop": "Corn"}, "result": None})
+    store.save_snapshot("a", "p", {"inputs": {"crop": "Soybean"}, "result": None})
+    assert store.load_snapshot("a", "nitro")["inputs"] == {"crop": "Corn"}
+    assert store.load_snapshot("b", "nitro") is None
+    store._db.execute("UPDATE snapshots SET updated = '2000-01-01T00:00:00' WHERE module = 'p'")
+    store.prune_snapshots(days=30)
+    assert store.load_snapshot("a", "p") is None and store.load_snapshot("a", "nitro") is not None
+    store.close()
+
+
+async def _read_until(ws, done, timeout=30):
+    seen = {"values": {}, "inputs": {}}
+    deadline = time.time() + timeout
+    while not done(seen):
+        message = json.loads(await asyncio.wait_for(ws.recv(), max(deadline - time.time(), 0.1)))
+        seen["values"].update(message.get("values", {}))
+        for update in message.get("inputMessages", []):
+            seen["inputs"].setdefault(update["id"], {}).update(update["message"])
+    return seen
+
+
+async def _first_session(port):
+    inputs = {**loadtest.INITIAL_INPUTS, **loadtest.client_data(port), **OUTPUTS,
+              "nitro-crop": "Wheat", "nitro-ie_input": "1.45", "nitro-yield": 55,
+              "nitro-previous_crop_main": "Alfalfa", "nitro-previous_crop_condition": "Poor Stand", "nitro-calc:shiny.action": 0}
+    async with websockets.connect(f"ws://127.0.0.1:{port}/websocket/") as ws:
+        await ws.send(json.dumps({"method": "init", "data": inputs}))
+        await ws.send(json.dumps({"method": "update", "data": {"resume_token": TOKEN}}))
+        await asyncio.sleep(0.5)
+        await ws.send(json.dumps({"method": "update", "data": {"nitro-calc:shiny.action": 1}}))
+        seen = await _read_until(ws, lambda seen: "lb/a" in str(seen["values"].get("nitro-result")))
+        await asyncio.sleep(0.5)
+        return seen["values"]["nitro-result"]
+
+
+async def _second_session(port):
+    # A reloaded page starts from the UI defaults and has not clicked Calculate
+    inputs = {**loadtest.INITIAL_INPUTS, **loadtest.client_data(port), **OUTPUTS, "nitro-calc:shiny.action": 0}
+    async with websockets.connect(f"ws://127.0.0.1:{port}/websocket/") as ws:
+        await ws.send(json.dumps({"method": "init", "data": inputs}))
+        await ws.send(json.dumps({"method": "update", "data": {"resume_token": TOKEN}}))
+        restored = await _read_until(ws, lambda seen: "lb/a" in str(seen["values"].get("nitro-result"))
+                                     and "value" in seen["inputs"].get("nitro-yield", {}))
+        # The browser then reports the restored values, which must not reset the dependent selects
+        await ws.send(json.dumps({"method": "update", "data": {
+            "nitro-crop": "Wheat", "nitro-ie_input": "1.45", "nitro-yield": 55,
+            "nitro-previous_crop_main": "Alfalfa", "nitro-previous_crop_condition": "Poor Stand"}}))
+        echoed = await _read_until(ws, lambda seen: "options" in seen["inputs"].get("nitro-previous_crop_condition", {}))
+        return restored, echoed
+
+
+async def _switch_crop_after_resume(port):
+    token = {"resume_token": "test-stale-restore"}
+    inputs = {**loadtest.INITIAL_INPUTS, **loadtest.client_data(port), **OUTPUTS, "nitro-calc:shiny.action": 0}
+    async with websockets.connect(f"ws://127.0.0.1:{port}/websocket/") as ws:
+        await ws.send(json.dumps({"method": "init", "data": {**inputs, "nitro-ie_input": "0.88"}}))
+        await ws.send(json.dumps({"method": "update", "data": token}))
+        await asyncio.sleep(0.5)
+    async with websockets.connect(f"ws://127.0.0.1:{port}/websocket/") as ws:
+        await ws.send(json.dumps({"method": "init", "data": inputs}))
+        await ws.send(json.dumps({"method": "update", "data": token}))
+        await _read_until(ws, lambda seen: seen["inputs"].get("nitro-ie_input", {}).get("value") == ["0.88"])
+        await ws.send(json.dumps({"method": "update", "data": {"nitro-ie_input": "0.88"}}))
+        await asyncio.sleep(0.5)
+        # Away from Corn and back: the restored choice is not applied a second time
+        await ws.send(json.dumps({"method": "update", "data": {"nitro-crop": "Wheat"}}))
+        await _read_until(ws, lambda seen: "1.45" in str(seen["inputs"].get("nitro-ie_input")))
+        await ws.send(json.dumps({"method": "update", "data": {"nitro-crop": "Corn"}}))
+        seen = await _read_until(ws, lambda seen: "0.84" in str(seen["inputs"].get("nitro-ie_input")))
+        return seen["inputs"]["nitro-ie_input"]["value"]
+
+
+def _recommendations(server):
+    with sqlite3.connect(server.scratch / "history.db") as db:
+        return db.execute("SELECT COUNT(*) FROM recommendations").fetchone()[0]
+
+
+def test_reconnected_session_gets_its_inputs_and_result_back():
+    port = loadtest.free_port()
+    server = loadtest.start_server(port)
+    try:
+        first = asyncio.run(_first_session(port))
+        recorded = _recommendations(server)
+        seen, echoed = asyncio.run(_second_session(port))
+        assert seen["values"]["nitro-result"] == first
+        assert seen["inputs"]["nitro-crop"]["value"] == ["Wheat"]
+        assert seen["inputs"]["nitro-yield"]["value"] == 55
+        assert seen["inputs"]["nitro-ie_input"]["value"] == ["1.45"]
+        assert seen["inputs"]["nitro-previous_crop_condition"]["value"] == ["Poor Stand"]
+        assert echoed["inputs"]["nitro-previous_crop_condition"]["value"] == ["Poor Stand"]
+        assert _recommendations(server) == recorded
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def test_restored_choice_is_not_reapplied_after_the_resume():
+    port = loadtest.free_port()
+    server = loadtest.start_server(port)
+    try:
+        assert asyncio.run(_switch_crop_after_resume(port)) == ["0.84"]
+    finally:
+        server.terminate()
+        server.wait()
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from engine import rotation
+from engine.batch import nitrogen_batch
+from engine.validation import MISSING
+
+
+def _fields():
+    return pd.DataFrame({"field_id": ["a", "b"], "om": [2.0, 3.0], "profile_n": [20, 30], "tillage": [20, 0],
+                         "previous_crop": ["Soybean", ""]})
+
+
+def test_each_year_follows_the_last():
+    planned = rotation.plan(_fields(), {"corn-soy": "Corn,Soybean", "wheat-alfalfa": "Wheat,Alfalfa:Excellent Stand"},
+                            4, default_yields={"Corn": 180, "Wheat": 60})
+    assert len(planned) == 2 * 2 * 4
+    a = planned[(planned["field_id"] == "a") & (planned["rotation"] == "wheat-alfalfa")]
+    assert a["previous_crop"].tolist() == ["Soybean", "Corn/Wheat", "Alfalfa", "Corn/Wheat"]
+    assert a["previous_crop_condition"].tolist()[2] == "Excellent Stand"
+    # Field b gave no previous crop: year 1 follows the rotation's last crop
+    b = planned[(planned["field_id"] == "b") & (planned["rotation"] == "corn-soy")]
+    assert b["previous_crop"].tolist() == ["Soybean", "Corn/Wheat", "Soybean", "Corn/Wheat"]
+
+    grown = planned["crop"].isin(["Corn", "Wheat"])
+    assert (planned.loc[~grown, "n_rate"] == 0).all() and (planned["code"] == 0).all()
+    fields = _fields().set_index("field_id")
+    by_hand = planned[grown].drop(columns=["n_rate", "code"]).join(fields[["om", "profile_n", "tillage"]], on="field_id")
+    by_hand["yield"] = by_hand["crop"].map({"Corn": 180, "Wheat": 60})
+    assert planned.loc[grown, "n_rate"].tolist() == nitrogen_batch(by_hand)["n_rate"].tolist()
+    # Wheat after an excellent alfalfa stand gets the small grain credit, and no-till only counts for wheat
+    assert a["n_rate"].tolist() == [138, 0, 78, 0]
+
+
+def test_yields_from_history_and_summary():
+    expected = pd.DataFrame({"field_id": ["a", "b"], "crop": ["corn", "Corn"], "expected_yield": [200.0, np.nan]})
+    planned = rotation.plan(_fields(), {"corn": "Corn"}, 3, expected=expected)
+    a, b = planned[planned["field_id"] == "a"], planned[planned["field_id"] == "b"]
+    assert (a["code"] == 0).all() and (b["code"] == MISSING).all() and b["n_rate"].isna().all()
+    totals = rotation.summary(planned).set_index("field_id")
+    assert totals.loc["a", "total_n"] == a["n_rate"].sum() and totals.loc["a", "years"] == 3
+    assert np.isnan(totals.loc["b", "total_n"]) and totals.loc["b", "invalid_years"] == 3
+
+
+def test_rotation_text():
+    assert rotation.parse_rotation(" corn , FALLOW:with profile n test") == (
+        ("Corn", ""), ("Fallow", "With Profile N Test"))
+    assert rotation.parse_rotation(["Wheat", "Red Clover"])[1] == ("Red Clover", "Good Stand")
+    with pytest.raises(ValueError):
+        rotation.parse_rotation("Corn,Rice")
+    with pytest.raises(ValueError):
+        rotation.parse_rotation("Soybean:Good Stand")
+
+
+def test_field_previous_crop_without_a_condition_gets_its_default():
+    fields = pd.DataFrame({"field_id": ["a", "b"], "om": 2.0, "profile_n": 20, "previous_crop": ["Alfalfa", "alfalfa"]})
+    for given in (fields, fields.assign(previous_crop_condition=["", None])):
+        planned = rotation.plan(given, {"corn": "Corn"}, 1, default_yields={"Corn": 180})
+        assert planned["previous_crop_condition"].tolist() == ["Good Stand", "Good Stand"]
+        assert planned["n_rate"].nunique() == 1
+        assert planned["n_rate"][0] < rotation.plan(fields.assign(previous_crop="Corn/Wheat"), {"corn": "Corn"}, 1,
+                                                     default_yields={"Corn": 180})["n_rate"][0]
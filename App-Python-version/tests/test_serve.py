@@ -0,0 +1,36 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+serve = pytest.importorskip("serve")
+loadtest = pytest.importorskip("loadtest")
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork") or not Path("/proc").exists(), reason="needs fork and /proc")
+
+
+def test_forked_workers_serve_and_are_replaced(tmp_path):
+    port = loadtest.free_port()
+    parent = subprocess.Popen([sys.executable, str(serve.HERE / "serve.py"), "--workers", "2", "--port", str(port)],
+                              env=dict(os.environ, FERTRECKS_DB=str(tmp_path / "history.db")),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        for i in range(2):
+            serve._first_response(port + i, time.perf_counter(), timeout=60)
+        workers = serve._children(parent.pid)
+        assert len(workers) == 2
+
+        os.kill(workers[0], signal.SIGKILL)
+        start = time.perf_counter()
+        while Path(f"/proc/{workers[0]}").exists():
+            time.sleep(0.001)
+        # The replacement is a fork of the warm parent, not a fresh import
+        assert max(serve._first_response(port + i, start) for i in range(2)) < 2
+        assert len(serve._children(parent.pid)) == 2
+    finally:
+        parent.terminate()
+        parent.wait(timeout=10)
@@ -0,0 +1,48 @@
+import asyncio
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+from engine import shared, tasks
+from engine.batch import phosphorus_batch
+from engine.incremental import run_incremental
+
+
+def test_shared_tables_hold_the_coefficients(tmp_path, monkeypatch):
+    monkeypatch.setenv("FERTRECKS_SHARED_DIR", str(tmp_path))
+    monkeypatch.setattr(shared, "_tables", {})
+    for name, (table, width) in shared.LOOKUP_TABLES.items():
+        packed = shared.table(name)
+        assert isinstance(packed.values, np.memmap)
+        for key, row in table.items():
+            expected = [np.nan if v is None else v for v in (row if width > 1 else (row,))]
+            np.testing.assert_array_equal(packed.values[packed.index[key]], expected)
+    assert (shared.shared_dir() / "tables.npy").exists()
+
+
+def test_changed_lookup_table_gets_a_new_pack(tmp_path, monkeypatch):
+    monkeypatch.setenv("FERTRECKS_SHARED_DIR", str(tmp_path))
+    before = shared.shared_dir()
+    removal, width = shared.LOOKUP_TABLES["crop_removal"]
+    monkeypatch.setitem(shared.LOOKUP_TABLES, "crop_removal", ({crop: row[:1] for crop, row in removal.items()}, 1))
+    assert shared.shared_dir() != before
+
+
+def _frame():
+    return pd.DataFrame({"crop": ["Corn", "Wheat", "Soybean"] * 1000, "yield": np.arange(3000) % 200 + 40.0,
+                         "mehlich": np.arange(3000) % 35 + 1.0})
+
+
+def test_other_workers_reuse_stored_results(tmp_path):
+    frame = _frame()
+    # Another server process fills the store
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        stats = pool.apply(run_incremental, ("phosphorus", frame, tmp_path))[1]
+    assert stats["computed"] == len(frame.drop_duplicates())
+
+    seen = []
+    result = asyncio.run(tasks.run_batch("phosphorus", frame, on_progress=lambda done, total: seen.append(done),
+                                         cache_dir=tmp_path))
+    assert result.equals(phosphorus_batch(frame))
+    assert seen[-1] == len(frame)
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+from engine.batch import phosphorus_batch, potassium_batch
+from engine.soil_tests import normalize_soil_tests
+from engine.validation import NOT_NUMERIC
+
+
+def test_methods_are_converted_to_mehlich_scale():
+    frame = pd.DataFrame({
+        "crop": "Corn", "yield": 150,
+        "p_test": [10, "5", None, 8, 12],
+        "p_method": ["Olsen", " mehlich 3", None, "unknown lab method", None],
+        "bray_p1": [None, None, 7, None, None],
+        "olsen_p": [None, None, 4, None, 3],
+    })
+    out = normalize_soil_tests(frame)
+    np.testing.assert_allclose(out["mehlich"], [16, 5, 7, np.nan, 4.8])
+    assert out["p_method"].tolist() == ["Olsen", "Mehlich-3", "Bray P1", "unknown lab method", "Olsen"]
+    # Olsen P 10 is read like Mehlich-3 P 16
+    assert phosphorus_batch(out)["p2o5_rate"][0] == phosphorus_batch(frame.assign(mehlich=16))["p2o5_rate"][0]
+
+
+def test_calculator_column_wins_and_text_is_kept_for_validation():
+    frame = pd.DataFrame({"crop": "Corn", "yield": 150, "mehlich_k": [120, None, None],
+                          "k_test": [90, "n/a", 100], "k_method": ["NH4OAc", "M3", "Ammonium acetate"]})
+    out = normalize_soil_tests(frame)
+    assert out["mehlich_k"].tolist()[0] == 120 and out["mehlich_k"].tolist()[1:] == ["n/a", 100]
+    assert out["k_method"].tolist() == ["Mehlich-3", "Mehlich-3", "Ammonium Acetate"]
+    assert potassium_batch(out)["code"].tolist() == [0, NOT_NUMERIC, 0]
+
+
+def test_files_without_lab_columns_are_unchanged():
+    frame = pd.DataFrame({"crop": ["Corn"], "yield": [150], "mehlich": [10]})
+    assert normalize_soil_tests(frame) is frame
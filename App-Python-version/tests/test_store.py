@@ -0,0 +1,67 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from engine import calculators, store
+from engine.batch import phosphorus_batch, phosphorus_build_batch
+from engine.store import ResultStore
+
+
+def test_batch_rows_keep_flags_and_build_totals(tmp_path):
+    db = ResultStore(tmp_path / "history.db")
+    frame = pd.DataFrame({"field_id": ["a", "b"], "crop": "Corn", "yield": 150, "mehlich": [10, 30]})
+    db.record_batch("phosphorus", frame, phosphorus_batch(frame))
+    frame = pd.DataFrame({"field_id": ["c"], "crop": "Corn", "current": [10], "years": [4], "removal": [60]})
+    db.record_batch("phosphorus_build", frame, phosphorus_build_batch(frame))
+
+    details = db.history().set_index("field_id")["details"]
+    assert pd.isna(details["a"])
+    assert details["b"] == '{"flags": ["starter_only"]}'
+    assert details["c"] == '{"total": 420, "years": 4}'
+
+    # The same rows saved one at a time give the same details
+    single = calculators.phosphorus_build({"crop": "Corn", "current": 10, "years": 4, "removal": 60})
+    db.record_result(single, field_id="d")
+    assert db.history(field_id="d")["details"][0] == details["c"]
+
+
+def test_background_write_does_not_wait_for_a_busy_database(tmp_path, monkeypatch):
+    path = tmp_path / "history.db"
+    db = ResultStore(path)
+    db._db.execute("PRAGMA busy_timeout = 300")
+    monkeypatch.setattr(store, "_store", db)
+
+    # Another writer (e.g. a --record batch) holds the write lock
+    other = sqlite3.connect(path)
+    other.execute("BEGIN IMMEDIATE")
+    # With the store lock held here, a write done on the calling thread would never return
+    with db._lock:
+        future = store.record_in_background(calculators.lime({"target": "Target pH 6.0", "buffer_ph": 6.0, "depth": 6}))
+        assert not future.done()
+
+    # The failed write is logged, not raised into the session
+    assert isinstance(future.exception(timeout=5), sqlite3.OperationalError)
+    other.rollback()
+    store.record_in_background(calculators.lime({"target": "Target pH 6.0", "buffer_ph": 6.0, "depth": 6})).result()
+    assert len(db.history()) == 1
+
+
+def test_batch_results_saved_in_background(tmp_path, monkeypatch):
+    db = ResultStore(tmp_path / "history.db")
+    monkeypatch.setattr(store, "_store", db)
+    frame = pd.DataFrame({"field_id": ["a", "b"], "crop": "Corn", "yield": 150, "mehlich": [10, 30]})
+    store.record_batch_in_background("phosphorus", frame, phosphorus_batch(frame)).result(timeout=5)
+    history = db.history()
+    assert sorted(history["field_id"]) == ["a", "b"]
+    assert set(history["source"]) == {"batch"}
+
+
+def test_history_reads_do_not_wait_for_a_batch_insert(tmp_path):
+    db = ResultStore(tmp_path / "history.db")
+    db.record("lime", "ECC", 1200, field_id="a")
+    assert db._db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    # record_batch holds the writer lock for the whole insert; a read waiting for it would time out
+    with db._lock, ThreadPoolExecutor(1) as reader:
+        assert list(reader.submit(db.history).result(timeout=30)["field_id"]) == ["a"]
+    db.close()
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+from engine import calculators, tables, validation
+from engine.batch import nitrogen_batch, potassium_batch
+from engine.results import STARTER_ONLY
+
+
+def test_codes_per_row():
+    frame = pd.DataFrame({
+        "crop": ["Corn", "Corn", "Corn", "Rice", "Corn"],
+        "buffer_ph": [6.5, None, "abc", 6.5, 20],
+    })
+    spec = {"crop": validation.NITROGEN_INPUTS["crop"], "buffer_ph": validation.LIME_INPUTS["buffer_ph"]}
+    result = validation.validate(spec, frame)
+    assert result.codes.tolist() == [
+        validation.OK, validation.MISSING, validation.NOT_NUMERIC, validation.UNKNOWN_CATEGORY,
+        validation.OUT_OF_RANGE,
+    ]
+
+
+def test_categories_are_stripped_and_case_folded():
+    frame = pd.DataFrame({"crop": [" Corn", "corn ", "GRAIN SORGHUM"], "yield": 150, "om": 2, "profile_n": 20})
+    result = validation.validate(validation.NITROGEN_INPUTS, frame)
+    assert result.codes.tolist() == [0, 0, 0]
+    assert result.values["crop"].tolist() == ["Corn", "Corn", "Grain Sorghum"]
+    assert nitrogen_batch(frame)["n_rate"].iloc[0] == nitrogen_batch(frame.assign(crop="Corn"))["n_rate"].iloc[0]
+
+
+def test_internal_efficiency_defaults_per_crop():
+    frame = pd.DataFrame({"crop": ["Corn", "Grain Sorghum", "Wheat", "Oats"], "yield": 100, "om": 2, "profile_n": 0})
+    result = validation.validate(validation.NITROGEN_INPUTS, frame)
+    assert result.codes.tolist() == [0, 0, 0, 0]
+    assert result.values["ie"].tolist()[:3] == [0.84, 1.20, 1.45]
+
+    given = validation.validate(validation.NITROGEN_INPUTS, frame.assign(ie=[0.88, None, None, None]))
+    assert given.values["ie"].tolist()[:2] == [0.88, 1.20]
+
+
+def test_unit_mismatch():
+    frame = pd.DataFrame({"crop": ["Corn", "Corn Silage"], "yield": 150, "yield_unit": ["bu/a", "bu/a"],
+                          "mehlich": 10})
+    result = validation.validate(validation.PHOSPHORUS_INPUTS, frame)
+    assert result.codes.tolist() == [validation.OK, validation.UNIT_MISMATCH]
+
+
+def test_interactive_and_batch_agree():
+    inputs = {"crop": "Corn", "yield": 150, "mehlich": "abc"}
+    rec = calculators.phosphorus(inputs)
+    assert rec.rate is None and rec.error == "Mehlich-3 P must be a number."
+
+    batch = validation.validate(validation.PHOSPHORUS_INPUTS, pd.DataFrame([inputs]))
+    assert validation.describe(validation.PHOSPHORUS_INPUTS, batch.column_codes) == rec.error
+    assert np.array_equal(batch.codes, [validation.NOT_NUMERIC])
+
+
+def test_interactive_and_batch_nitrogen_rates_agree():
+    rng = np.random.default_rng(1)
+    frame = pd.DataFrame({
+        "crop": rng.choice([c for c in tables.NITROGEN_CROPS if c not in tables.FORAGE_CROPS], 300),
+        "yield": rng.uniform(10, 200, 300).round(), "om": rng.uniform(0.5, 5, 300).round(1),
+        "profile_n": rng.uniform(0, 80, 300).round(), "manure_n": rng.choice([0, 25], 300),
+        "other_n": rng.choice([0, 10], 300), "tillage": rng.choice([0, 20], 300),
+    })
+    rates = [calculators.nitrogen(row).rate for row in frame.to_dict("records")]
+    assert rates == nitrogen_batch(frame)["n_rate"].tolist()
+
+
+def test_only_phosphorus_is_flagged_starter_only():
+    assert calculators.phosphorus({"crop": "Corn", "yield": 150, "mehlich": 30}).flags == (STARTER_ONLY,)
+    assert calculators.potassium({"crop": "Corn", "yield": 150, "mehlich_k": 200}).flags == ()
+    assert "starter_only" not in potassium_batch(pd.DataFrame({"crop": ["Corn"], "yield": 150, "mehlich_k": 200}))
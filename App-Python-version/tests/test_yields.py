@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from engine.batch import nitrogen_batch, sulfur_batch
+from engine.yields import YieldHistory, expected_yields, fill_expected_yields
+
+
+def _records(n=30000):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "field_id": rng.integers(0, 2000, n).astype(str), "crop": rng.choice(["Corn", "Wheat"], n),
+        "year": rng.integers(2010, 2025, n), "yield": rng.uniform(30, 250, n).round(),
+    })
+
+
+def test_chunks_match_the_whole_history():
+    records = _records()
+    history = YieldHistory()
+    for start in range(0, len(records), 7000):
+        history.update(records.iloc[start:start + 7000])
+    result = history.result().set_index(["field_id", "crop"]).sort_index()
+
+    yearly = records.groupby(["field_id", "crop", "year"])["yield"].mean().reset_index()
+    latest = yearly.sort_values("year", ascending=False).groupby(["field_id", "crop"]).head(5)
+    expected = latest.groupby(["field_id", "crop"])["yield"].agg(["mean", "size"])
+    assert result["years"].tolist() == expected["size"].tolist()
+    np.testing.assert_allclose(result["average_yield"], expected["mean"].round(1))
+    enough = expected["size"] >= 3
+    np.testing.assert_allclose(result["expected_yield"][enough], 1.05 * expected["mean"][enough], atol=0.05 + 1e-9)
+    assert result["expected_yield"][~enough].isna().all()
+
+
+def test_spellings_repeated_years_and_cutoff():
+    records = pd.DataFrame({
+        "field_id": ["7", "7", " 7", "7", "7", "7", "", "7"],
+        "crop": ["Corn", "corn", "CORN ", "Corn", "Corn", "Corn", "Corn", "Corn"],
+        "year": [2019, 2020, 2021, 2021, 2022, 2024, 2022, "n/a"],
+        "yield": [120, 140, 150, 170, 180, 400, 99, 99],
+    })
+    [row] = YieldHistory(before=2024).update(records).result().itertuples()
+    # 2021 is the mean of its two records; 2024, the blank field and the bad year are left out
+    assert (row.field_id, row.crop, row.years, row.first_year, row.last_year) == ("7", "Corn", 4, 2019, 2022)
+    assert row.average_yield == 150.0 and row.expected_yield == 157.5
+
+
+def test_blank_yields_are_filled_for_the_calculators(tmp_path):
+    path = tmp_path / "history.csv"
+    pd.DataFrame({"field_id": [1, 1, 1, 2, 2, 2], "crop": ["Corn"] * 3 + ["Wheat"] * 3,
+                  "year": [2021, 2022, 2023] * 2, "yield": [150, 160, 170, 40, 50, 60]}).to_csv(path, index=False)
+    expected = expected_yields(path, chunk_rows=2)
+
+    fields = pd.DataFrame({"field_id": [1.0, 2.0, 3.0, np.nan], "crop": ["corn", "Wheat", "Corn", "Corn"],
+                           "yield": [None, 45.0, None, None], "om": 2.0, "profile_n": 20})
+    filled = fill_expected_yields(fields, expected, "nitrogen")
+    assert filled["yield"][0] == 168.0 and filled["yield"][1] == 45.0 and filled["yield"][2:].isna().all()
+    assert nitrogen_batch(filled)["code"].tolist() == [0, 0, 1, 1]
+
+    sulfur = fill_expected_yields(fields.drop(columns="yield").assign(profile_s=10), expected, "sulfur")
+    assert sulfur["expected_yield"][0] == 168.0
+    assert sulfur_batch(sulfur)["code"][0] == 0
+
+    with pytest.raises(ValueError):
+        fill_expected_yields(fields, expected, "lime")
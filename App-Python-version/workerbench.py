@@ -0,0 +1,144 @@
+"""Measure memory per worker process and result cache hit rates across workers.
+
+Starts --workers processes, as a server running several workers per node
+would. One after another, each runs the same calculator over a --rows-row
+file in which --changed of the rows differ per worker, then all of them look
+up their whole file once more and report resident (RSS) and proportional
+(PSS) memory from /proc/self/smaps_rollup while all are alive.
+
+    python workerbench.py --workers 4 --rows 1000000
+    python workerbench.py --mode private
+
+--mode shared (the default) points every worker at one incremental store,
+whose segments are memory-mapped by all of them. --mode private gives each
+worker its own store read into its own memory, like a per-process cache.
+Linux only.
+"""
+
+import argparse
+import ctypes
+import gc
+import multiprocessing
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from engine import shared
+from engine.batch import CALCULATORS
+from engine.incremental import IncrementalRun, open_cache
+
+FIELDS = ["Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty"]
+
+
+def memory():
+    """This process's memory in MB by smaps_rollup field."""
+    values = {}
+    for line in Path("/proc/self/smaps_rollup").read_text().splitlines():
+        name, _, rest = line.partition(":")
+        if name in FIELDS:
+            values[name] = int(rest.split()[0]) / 1024
+    return values
+
+
+def _frame(rows, changed, worker):
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame({
+        "crop": np.array(["Corn", "Wheat", "Soybean", "Grain Sorghum"], dtype=object)[rng.integers(0, 4, rows)],
+        "yield": rng.uniform(40, 250, rows).round(1),
+        "mehlich": rng.uniform(1, 40, rows).round(1),
+        "mehlich_k": rng.uniform(40, 200, rows).round(),
+    })
+    # Each worker's file differs from the first in its own rows
+    if worker:
+        picked = np.random.default_rng(worker).choice(rows, int(rows * changed), replace=False)
+        frame.loc[picked, "yield"] += 0.5
+    return frame
+
+
+def _trim():
+    # Hand the run's freed heap back to the OS, so what is left is the cache
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def _private(cache):
+    # What a per-process cache costs: every worker holds its own copy of the results
+    copy = lambda entry: dict(entry, hashes=np.array(entry["hashes"]), values=np.array(entry["values"]))
+    cache.segments = [copy(segment) for segment in cache.segments]
+    cache.previous = copy(cache.previous) if cache.previous else None
+    cache._stamp = cache._current_stamp()
+
+
+def worker(index, args, store, turns, measured, reports):
+    # Baseline after imports and the (shared) coefficient tables
+    shared.table("p_sufficiency")
+    baseline = memory()
+    turns[index].wait()
+    frame = _frame(args.rows, args.changed, index)
+    run = IncrementalRun(args.calculator, frame, store)
+    result, stats = run.finish(CALCULATORS[args.calculator][0](run.pending))
+    del result, run, frame
+    if index + 1 < len(turns):
+        turns[index + 1].set()
+
+    # Serve lookups for the whole file, as repeated requests would
+    cache = open_cache(store, args.calculator)
+    if args.mode == "private":
+        _private(cache)
+    columns = list(cache.segments[-1]["columns"])
+    hashes = np.sort(np.concatenate([s["hashes"] for s in cache.segments]))
+    cache.gather(hashes, columns)
+    del hashes
+    _trim()
+    measured.wait()
+    reports.put((index, stats, baseline, memory()))
+    measured.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memory per worker and cross-worker cache hit rates.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--changed", type=float, default=0.02, help="fraction of rows each worker changes")
+    parser.add_argument("--calculator", default="phosphorus", choices=sorted(CALCULATORS))
+    parser.add_argument("--mode", choices=["shared", "private"], default="shared")
+    args = parser.parse_args(argv)
+
+    context = multiprocessing.get_context("spawn")
+    root = Path(tempfile.mkdtemp(prefix="fertrecks-workerbench-"))
+    turns = [context.Event() for _ in range(args.workers)]
+    measured = context.Barrier(args.workers + 1)
+    reports = context.Queue()
+    processes = []
+    for index in range(args.workers):
+        store = root / ("shared" if args.mode == "shared" else f"worker-{index}")
+        processes.append(context.Process(target=worker, args=(index, args, store, turns, measured, reports)))
+        processes[-1].start()
+    turns[0].set()
+    measured.wait()
+    rows = sorted(reports.get() for _ in processes)
+    measured.wait()
+    for process in processes:
+        process.join()
+
+    tables = shared.shared_dir() / "tables.npy"
+    print(f"{args.mode} store, {args.workers} workers, {args.rows:,} rows, {args.changed:.0%} changed per worker; "
+          f"packed coefficient tables: {tables.stat().st_size:,} bytes")
+    print(f"{'worker':>6} {'computed':>9} {'reused':>9} {'hit rate':>8} {'RSS MB':>8} {'PSS MB':>8} "
+          f"{'shared MB':>9} {'private MB':>10} {'base RSS':>8}")
+    for index, stats, baseline, after in rows:
+        print(f"{index:>6} {stats['computed']:>9,} {stats['reused']:>9,} {stats['reused'] / stats['rows']:>8.1%} "
+              f"{after['Rss']:>8.1f} {after['Pss']:>8.1f} {after['Shared_Clean'] + after['Shared_Dirty']:>9.1f} "
+              f"{after['Private_Clean'] + after['Private_Dirty']:>10.1f} {baseline['Rss']:>8.1f}")
+    total = sum(after["Pss"] for *_, after in rows)
+    hits = sum(stats["reused"] for _, stats, *_ in rows) / sum(stats["rows"] for _, stats, *_ in rows)
+    print(f"total PSS {total:.1f} MB, overall hit rate {hits:.1%}")
+
+
+if __name__ == "__main__":
+    main()